@@ -381,9 +381,14 @@ class LLMMonitor {
 
 	async saveData(records) {
 		try {
+			// Quote every field, empty ones included: rows read back by
+			// loadExistingData are all strings, and quoting them exactly as
+			// when they were first written keeps earlier bytes unchanged, so
+			// readers can ingest just the appended tail
 			const csvContent = stringify(records, {
 				header: true,
-				quoted_string: true,
+				quoted: true,
+				quoted_empty: true,
 			});
 			await this.s3.send(
 				new PutObjectCommand({
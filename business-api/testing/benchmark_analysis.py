@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the quantitative analysis pipeline
+
+Runs every stage of LLMPerformanceAnalyzer at several dataset sizes: load
+and parse (cold, also split into fetch, parse and type coercion; into the
+Parquet cache; from it; and memory-mapped from a local Arrow IPC file),
+calendar feature derivation, the aggregation cube and sketches (also as the
+Arrow backend's scan and aggregations), each figure's input preparation, the
+summary statistics and each figure render. Wall time and peak RSS are
+recorded per stage, keeping the fastest of --repeat runs. Data is generated
+once per size by monitor_synth (or taken from --data) and served by a local
+stand-in for S3, so no network or credentials are needed. The analyzer gets
+every source and cache setting explicitly, so the environment and `.env` do
+not change what is measured. Each size runs in a fresh process so peak
+memory is not inflated by the previous one.
+
+    python benchmark_analysis.py --sizes 10k 100k 1m --save-baseline bench_baseline.json
+    python benchmark_analysis.py --sizes 10k 100k 1m --baseline bench_baseline.json
+
+With --baseline, stages that got slower than the baseline by more than
+--tolerance are reported and the exit code is 1.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+
+BENCH_DATA_DIR = '.bench_data'
+BENCH_BUCKET = 'bench'
+
+DEFAULT_SIZES = ['10k', '100k', '1m']
+SIZE_SUFFIXES = {'k': 1_000, 'm': 1_000_000}
+
+DEFAULT_TOLERANCE = 0.2
+# Differences below this many seconds are timer noise, never regressions
+NOISE_SECONDS = 0.05
+
+
+def parse_size(text):
+    """Row count from '10k', '1m', '100M' or a plain number"""
+    text = str(text).strip().lower().replace('_', '')
+    if text[-1:] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+class LocalS3:
+    """Just enough of the boto3 S3 client to serve monitor objects from a local directory"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def _etag(self, path):
+        stat = os.stat(path)
+        return '"%s"' % hashlib.md5(f'{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()
+
+    def head_object(self, Bucket, Key):
+        path = self._path(Key)
+        return {'ETag': self._etag(path), 'ContentLength': os.path.getsize(path),
+                'LastModified': datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.utc)}
+
+    def get_object(self, Bucket, Key, Range=None, IfNoneMatch=None, **_):
+        path = self._path(Key)
+        etag = self._etag(path)
+        if IfNoneMatch is not None and IfNoneMatch == etag:
+            from botocore.exceptions import ClientError
+
+            raise ClientError({'Error': {'Code': '304', 'Message': 'Not Modified'},
+                               'ResponseMetadata': {'HTTPStatusCode': 304}}, 'GetObject')
+
+        size = os.path.getsize(path)
+        body = open(path, 'rb')
+        length = size
+        if Range:
+            first, last = Range.split('=')[1].split('-')
+            first, last = int(first), int(last) if last else size - 1
+            body.seek(first)
+            length = min(last, size - 1) - first + 1
+            body = io.BytesIO(body.read(length))
+        return {'Body': body, 'ETag': etag, 'ContentLength': length,
+                'LastModified': datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.utc)}
+
+
+def prepare_data(rows, data_dir=BENCH_DATA_DIR, seed=42):
+    """Generate (once) a synthetic monitor CSV of `rows` rows and return its file name inside data_dir"""
+    from monitor_synth import write_sample_data
+
+    os.makedirs(data_dir, exist_ok=True)
+    name = f'monitor_{rows}_{seed}.csv'
+    path = os.path.join(data_dir, name)
+    if not os.path.exists(path):
+        # A month of history whatever the size, like a monthly report
+        write_sample_data(path + '.tmp', rows, fmt='csv', start='2025-01-01', days=30, seed=seed)
+        os.replace(path + '.tmp', path)
+    return name
+
+
+def run_size(data_dir, key, profile='draft', render=True):
+    """Run every pipeline stage once on one data file and return the stage records"""
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    from monitor_arrow import cube_from_rows, scan_rows, sketches_from_rows
+    from monitor_cache import load_monitor_frame
+    from monitor_figures import FIGURES, render_figure
+    from monitor_sources import ArrowSource, CSVSource, write_arrow_file
+    from monitor_stats import add_calendar_features, build_cube, build_sketches
+    from monitor_timing import StageTimer
+    from quantitative_eval_v2 import LLMPerformanceAnalyzer
+
+    timer = StageTimer()
+    s3 = LocalS3(data_dir)
+    work_dir = tempfile.mkdtemp(prefix='bench_')
+    try:
+        with timer.stage('load_parse') as record:
+            df = load_monitor_frame(s3, BENCH_BUCKET, key, cache_dir=None, timer=timer)
+            record['rows'] = len(df)
+        del df
+
+        cache_dir = os.path.join(work_dir, 'cache')
+        with timer.stage('load_cache_store'):
+            load_monitor_frame(s3, BENCH_BUCKET, key, cache_dir=cache_dir)
+        with timer.stage('load_cache_hit'):
+            df = load_monitor_frame(s3, BENCH_BUCKET, key, cache_dir=cache_dir)
+
+        arrow_path = write_arrow_file(df, os.path.join(work_dir, 'monitor.arrow'))
+        with timer.stage('load_arrow'):
+            ArrowSource(arrow_path).load()
+
+        with timer.stage('arrow_scan') as record:
+            rows = scan_rows(CSVSource(os.path.join(data_dir, key)))
+            record['rows'] = rows.num_rows
+        with timer.stage('arrow_cube'):
+            cube_from_rows(rows)
+        with timer.stage('arrow_sketches'):
+            sketches_from_rows(rows)
+        del rows
+
+        with timer.stage('features'):
+            df = add_calendar_features(df).sort_values('timestamp')
+        with timer.stage('cube'):
+            cube = build_cube(df)
+        with timer.stage('sketches'):
+            sketches = build_sketches(df)
+
+        # Nothing is loaded through the analyzer; every setting it would read from the environment is given
+        analyzer = LLMPerformanceAnalyzer(source=CSVSource(os.path.join(data_dir, key)), backend='pandas',
+                                          timezone='UTC', rollups='', cache_dir='', max_workers=1,
+                                          headless=True, profile=profile, render_workers=1, page_format='png',
+                                          trace_memory=False, output_dir=work_dir)
+        analyzer.df, analyzer.cube, analyzer.sketches = df, cube, sketches
+
+        inputs = {}
+        for name in FIGURES:
+            with timer.stage(f'inputs.{name}'):
+                inputs[name] = analyzer.figure_inputs(name)
+
+        with timer.stage('summary'), contextlib.redirect_stdout(io.StringIO()):
+            analyzer.generate_summary_stats()
+
+        if render:
+            for name in FIGURES:
+                with timer.stage(f'render.{name}'):
+                    render_figure(name, inputs[name], profile=profile, output_dir=work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return timer.records
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Print each stage against the baseline and return the regressions"""
+    previous = {(r['size'], r['stage']): r for r in baseline.get('results', [])}
+    regressions = []
+
+    print(f"\n{'size':>10}  {'stage':<42} {'seconds':>9} {'baseline':>9} {'change':>8} {'peak MB':>8}")
+    for record in results:
+        base = previous.get((record['size'], record['stage']))
+        line = f"{record['size']:>10,}  {record['stage']:<42} {record['seconds']:>9.3f}"
+        # Parts of a stage (e.g. load/parse) are summed over chunks and have no memory figure of their own
+        peak = f"{record['peak_rss_mb']:>8.0f}" if 'peak_rss_mb' in record else f"{'-':>8}"
+        if base is None:
+            print(f"{line} {'-':>9} {'-':>8} {peak}")
+            continue
+
+        change = record['seconds'] / base['seconds'] - 1 if base['seconds'] else 0.0
+        slower = change > tolerance and record['seconds'] - base['seconds'] > NOISE_SECONDS
+        print(f"{line} {base['seconds']:>9.3f} {change:>+8.0%} {peak}{'  ⚠️ slower' if slower else ''}")
+        if slower:
+            regressions.append(record)
+
+    return regressions
+
+
+def parse_args(argv=None):
+    """Parse the command line"""
+    parser = argparse.ArgumentParser(description='Benchmark the analysis pipeline offline at several data sizes')
+    parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES,
+                        help=f"row counts such as 10k 1m 100m (default: {' '.join(DEFAULT_SIZES)})")
+    parser.add_argument('--data', help='benchmark this local monitor CSV instead of generated data')
+    parser.add_argument('--data-dir', default=BENCH_DATA_DIR, help='where generated data sets are kept')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per size; the fastest time of each stage is kept')
+    parser.add_argument('--profile', default='draft', help='figure render profile')
+    parser.add_argument('--no-render', action='store_true', help='skip the figure render stages')
+    parser.add_argument('--output', default='bench_results.json', help='where to write this run\'s results')
+    parser.add_argument('--baseline', help='compare against this results file')
+    parser.add_argument('--save-baseline', help='also write this run\'s results here as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed slowdown before a stage counts as a regression '
+                             f'(default {DEFAULT_TOLERANCE:.0%})')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the benchmark and compare it with the baseline"""
+    import numpy as np
+    import pandas as pd
+
+    args = parse_args(argv)
+    if args.data:
+        runs = [(None, os.path.dirname(os.path.abspath(args.data)), os.path.basename(args.data))]
+    else:
+        runs = []
+        for size in args.sizes:
+            rows = parse_size(size)
+            print(f"📦 Preparing {rows:,} rows...")
+            runs.append((rows, args.data_dir, prepare_data(rows, args.data_dir)))
+
+    results = []
+    for rows, data_dir, key in runs:
+        print(f"⏱️ Benchmarking {key} ({args.repeat} run(s))...")
+        best = {}
+        for _ in range(args.repeat):
+            # A fresh process per run, so each peak RSS only reflects that size
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+                records = pool.submit(run_size, data_dir, key, args.profile, not args.no_render).result()
+            for record in records:
+                # The fastest run is the least disturbed by the rest of the machine
+                if record['stage'] not in best or record['seconds'] < best[record['stage']]['seconds']:
+                    best[record['stage']] = record
+        size = rows if rows is not None else best['load_parse']['rows']
+        results.extend({'size': size, **record} for record in best.values())
+
+    report = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+        },
+        'results': results,
+    }
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results saved as '{path}'")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n❌ {len(regressions)} stage(s) slower than the baseline by more than {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
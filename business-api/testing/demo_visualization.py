@@ -4,109 +4,27 @@ Demo script to test visualization functionality with sample data
 This creates sample data that mimics the structure from your API testing
 """
 
+import argparse
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
 import seaborn as sns
-import random
-
-# Set random seed for reproducible demo
-np.random.seed(42)
-random.seed(42)
-
-def generate_sample_data():
-    """Generate sample data that mimics your API testing structure"""
-    
-    # Sample prompts and models
-    prompt_ids = ['feleenas-context-test', 'customer-greeting', 'financial-advisor', 'medical-qa']
-    models = ['gpt-4o-mini', 'llama-3.3-70b-versatile']
-    
-    # Generate data for the last 7 days
-    start_date = datetime.now() - timedelta(days=7)
-    
-    data = []
-    
-    for day in range(7):
-        current_date = start_date + timedelta(days=day)
-        
-        # Generate 3-5 test runs per hour during business hours (8-20)
-        for hour in range(8, 21):
-            runs_this_hour = random.randint(2, 4)
-            
-            for run in range(runs_this_hour):
-                for prompt_id in prompt_ids:
-                    for model in models:
-                        # Create realistic timestamp
-                        minute = random.randint(0, 59)
-                        second = random.randint(0, 59)
-                        timestamp = current_date.replace(hour=hour, minute=minute, second=second)
-                        
-                        # Generate realistic latency based on model and time patterns
-                        base_latency = 1500 if model == 'gpt-4o-mini' else 2200
-                        
-                        # Add hourly patterns (slower during peak hours)
-                        hour_factor = 1.0
-                        if 12 <= hour <= 14:  # Lunch peak
-                            hour_factor = 1.3
-                        elif 17 <= hour <= 19:  # Evening peak
-                            hour_factor = 1.2
-                        
-                        # Add day-of-week patterns (slower on Mondays)
-                        day_factor = 1.15 if current_date.weekday() == 0 else 1.0
-                        
-                        # Add some random variation
-                        noise_factor = random.uniform(0.7, 1.4)
-                        
-                        latency = int(base_latency * hour_factor * day_factor * noise_factor)
-                        
-                        # Generate response length based on prompt type
-                        base_length = {
-                            'feleenas-context-test': 150,
-                            'customer-greeting': 80,
-                            'financial-advisor': 300,
-                            'medical-qa': 250
-                        }[prompt_id]
-                        
-                        response_length = int(base_length * random.uniform(0.6, 1.8))
-                        
-                        # Token calculations (simplified)
-                        prompt_tokens = random.randint(100, 500)
-                        completion_tokens = response_length // 4  # Rough estimate
-                        total_tokens = prompt_tokens + completion_tokens
-                        
-                        record = {
-                            'timestamp': timestamp.isoformat(),
-                            'promptId': prompt_id,
-                            'model': model,
-                            'latencyMs': latency,
-                            'success': True,  # Assume all successful for demo
-                            'finishReason': 'stop',
-                            'promptTokens': prompt_tokens,
-                            'completionTokens': completion_tokens,
-                            'totalTokens': total_tokens,
-                            'responseLength': response_length,
-                            'response': f"Sample response for {prompt_id}...",
-                        }
-                        
-                        data.append(record)
-    
-    return pd.DataFrame(data)
+from monitor_loader import parse_timestamps
+from monitor_stats import DAY_NAMES, add_calendar_features, boxplot_stats, day_dates
+from monitor_sources import SyntheticSource, open_source
 
 class DemoAnalyzer:
     """Simplified version of the analyzer for demo purposes"""
     
-    def __init__(self, df):
+    def __init__(self, df, timezone='UTC'):
         self.df = df.copy()
         
-        # Convert timestamp to datetime
-        self.df['timestamp'] = pd.to_datetime(self.df['timestamp'])
+        # Convert timestamp to datetime (generated frames are already typed)
+        if not pd.api.types.is_datetime64_any_dtype(self.df['timestamp']):
+            self.df['timestamp'] = parse_timestamps(self.df['timestamp'])
         
-        # Extract time components
-        self.df['date'] = self.df['timestamp'].dt.date
-        self.df['hour'] = self.df['timestamp'].dt.hour
-        self.df['day_of_week'] = self.df['timestamp'].dt.day_name()
-        self.df['day_of_week_num'] = self.df['timestamp'].dt.dayofweek
+        # Extract time components in one integer pass
+        self.df = add_calendar_features(self.df, timezone)
     
     def create_demo_visualizations(self):
         """Create demo visualizations"""
@@ -136,10 +54,10 @@ class DemoAnalyzer:
             axes[0, 0].text(i, v + 50, f'{v:.0f}', ha='center', va='bottom', fontsize=9)
         
         # 2. Daily Latency Pattern
-        daily_latency = self.df.groupby(['day_of_week_num', 'day_of_week'])['latencyMs'].mean().reset_index()
+        daily_latency = self.df.groupby('day_of_week_num')['latencyMs'].mean().reset_index()
         daily_latency = daily_latency.sort_values('day_of_week_num')
         
-        axes[0, 1].bar(daily_latency['day_of_week'], daily_latency['mean'], 
+        axes[0, 1].bar([DAY_NAMES[d] for d in daily_latency['day_of_week_num']], daily_latency['latencyMs'], 
                       alpha=0.7, color='lightcoral')
         axes[0, 1].set_title('Average Latency by Day of Week', fontsize=14, fontweight='bold')
         axes[0, 1].set_xlabel('Day of Week')
@@ -168,19 +86,17 @@ class DemoAnalyzer:
         axes[1, 0].set_ylabel('Response Length (chars)')
         axes[1, 0].grid(True, alpha=0.3)
         
-        # 5. Latency Distribution
-        self.df.boxplot(column='latencyMs', by='model', ax=axes[1, 1])
+        # 5. Latency Distribution (Box Plot from precomputed statistics)
+        axes[1, 1].bxp(boxplot_stats(self.df, 'model', 'latencyMs'))
         axes[1, 1].set_title('Latency Distribution by Model', fontsize=14, fontweight='bold')
         axes[1, 1].set_xlabel('Model')
         axes[1, 1].set_ylabel('Latency (ms)')
-        plt.suptitle('')  # Remove automatic title
         
         # 6. Heatmap - Day vs Hour
-        pivot_data = self.df.groupby(['day_of_week', 'hour'])['latencyMs'].mean().unstack(fill_value=0)
-        day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        pivot_data = pivot_data.reindex(day_order)
+        pivot_data = self.df.groupby(['day_of_week_num', 'hour'])['latencyMs'].mean().unstack(fill_value=0)
+        pivot_data = pivot_data.reindex(range(7))
         
-        sns.heatmap(pivot_data, annot=True, fmt='.0f', cmap='YlOrRd', 
+        sns.heatmap(pivot_data, annot=True, fmt='.0f', cmap='YlOrRd', yticklabels=DAY_NAMES,
                    ax=axes[1, 2], cbar_kws={'label': 'Latency (ms)'})
         axes[1, 2].set_title('Latency Heatmap: Day vs Hour', fontsize=14, fontweight='bold')
         axes[1, 2].set_xlabel('Hour of Day')
@@ -203,7 +119,7 @@ class DemoAnalyzer:
         
         print(f"\n🔢 Dataset Overview:")
         print(f"   • Total records: {len(self.df):,}")
-        print(f"   • Date range: {self.df['date'].min()} to {self.df['date'].max()}")
+        print(f"   • Date range: {day_dates(self.df['date'].min()).date()} to {day_dates(self.df['date'].max()).date()}")
         print(f"   • Prompts tested: {', '.join(self.df['promptId'].unique())}")
         print(f"   • Models: {', '.join(self.df['model'].unique())}")
         
@@ -227,14 +143,21 @@ class DemoAnalyzer:
         
         print("="*60)
 
-def main():
+def main(argv=None):
     """Run the demo visualization"""
+    parser = argparse.ArgumentParser(description='Demo of the performance visualizations')
+    parser.add_argument('--source', metavar='LOCATION',
+                        help='monitor data to plot instead of sample data, e.g. monitor.arrow (see monitor_sources)')
+    args = parser.parse_args(argv)
+    
     print("🚀 Starting LLM Performance Analysis Demo...")
-    print("📊 Generating sample data...")
+    # Same sources as the real analyzer; by default sample data mimicking the API testing structure (see
+    # monitor_synth for larger sets), all successful for the demo
+    source = open_source(args.source) if args.source else SyntheticSource(2_000, days=7, seed=42, failure_rate=0.0)
+    print(f"📊 Loading data from {source}...")
     
-    # Generate sample data
-    sample_df = generate_sample_data()
-    print(f"✅ Generated {len(sample_df)} sample records")
+    sample_df = source.load()
+    print(f"✅ Loaded {len(sample_df)} records")
     
     # Create analyzer and run demo
     analyzer = DemoAnalyzer(sample_df)
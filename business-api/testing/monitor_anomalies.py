@@ -0,0 +1,233 @@
+"""
+Streaming latency and token anomaly detection for the monitor feed
+
+Each (promptId, model, hour-of-week) keeps an exponentially weighted mean and
+variance of latencyMs and totalTokens, updated one record at a time, so a
+slowdown is reported in the same scheduled job that recorded it. Hours of the
+week are taken in REPORT_TIMEZONE, like the report's heatmaps. Each metric
+keeps its own count, so a record missing one metric still feeds the other.
+Until a metric's hour-of-week baseline has seen MIN_SAMPLES values, it is
+scored against the pair's baseline across all hours instead.
+
+The whole state is a few floats per slot, persisted as JSON next to the
+Parquet cache together with the timestamp of the last record seen and how
+many records at that timestamp were scored. A run only loads records from
+that timestamp on: the ETag cache fetches just the appended bytes and skips
+Parquet row groups outside the window, so history is never reloaded. The
+first run seeds the baselines from existing records without reporting
+anything.
+
+Run it after `node api_tester.js`:
+
+    python monitor_anomalies.py --output anomalies.json
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+
+import numpy as np
+from dotenv import load_dotenv
+
+from monitor_cache import DEFAULT_CACHE_DIR
+from monitor_loader import make_filters
+from monitor_sources import DEFAULT_MAX_WORKERS, open_source
+from monitor_stats import add_calendar_features
+
+DETECTOR_METRICS = ['latencyMs', 'totalTokens']
+
+# Weight of the newest record in the moving baselines
+DEFAULT_ALPHA = 0.1
+# Records a baseline needs before it is trusted to score new ones
+MIN_SAMPLES = 10
+DEFAULT_THRESHOLD = 4.0
+
+STATE_FILE = 'anomaly_state.json'
+STATE_VERSION = 2
+
+# Slot key for a pair's baseline across every hour of the week
+ALL_HOURS = '*'
+
+
+def new_state(alpha=DEFAULT_ALPHA, timezone='UTC'):
+    """Empty detector state"""
+    return {'version': STATE_VERSION, 'alpha': alpha, 'timezone': timezone, 'last_timestamp': None,
+            'last_count': 0, 'baselines': {}}
+
+
+def load_state(path, alpha=DEFAULT_ALPHA, timezone='UTC'):
+    """Read persisted state; start over when it is missing or was built with other settings"""
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return new_state(alpha, timezone)
+
+    if (state.get('version'), state.get('alpha'), state.get('timezone')) != (STATE_VERSION, alpha, timezone):
+        print(f"⚠️ Anomaly state in '{path}' was built with other settings, starting new baselines")
+        return new_state(alpha, timezone)
+    return state
+
+
+def save_state(state, path):
+    """Persist state atomically so an interrupted run never leaves a truncated file"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+def _update(baseline, values, alpha):
+    """Fold one record into a [count, mean, var] per metric baseline and return each metric's z-score
+
+    The z-score compares a value to its metric's baseline before it is
+    updated; it is None for a missing value and while the baseline is still
+    warming up or has no spread yet.
+    """
+    scores = []
+    for i, value in enumerate(values):
+        count_at, mean_at, var_at = 3 * i, 3 * i + 1, 3 * i + 2
+        count = baseline[count_at]
+        if value is None:
+            scores.append(None)
+            continue
+        baseline[count_at] = count + 1
+        if count == 0:
+            baseline[mean_at], baseline[var_at] = value, 0.0
+            scores.append(None)
+            continue
+
+        diff = value - baseline[mean_at]
+        std = math.sqrt(baseline[var_at])
+        scores.append(diff / std if count >= MIN_SAMPLES and std > 0 else None)
+
+        # Plain running averages until 1/n drops below alpha, so young baselines are not biased towards zero spread
+        weight = max(alpha, 1 / (count + 1))
+        increment = weight * diff
+        baseline[mean_at] += increment
+        baseline[var_at] = (1 - weight) * (baseline[var_at] + diff * increment)
+    return scores
+
+
+def score_records(state, df, threshold=DEFAULT_THRESHOLD):
+    """Update the baselines with new records in time order and return the anomalies found, O(1) per record"""
+    alpha = state['alpha']
+    baselines = state['baselines']
+    empty = [0, 0.0, 0.0] * len(DETECTOR_METRICS)
+
+    df = add_calendar_features(df, state['timezone']).sort_values('timestamp', kind='stable')
+    hours_of_week = (df['day_of_week_num'].astype('int16') * 24 + df['hour']).to_numpy()
+    columns = [df[m].astype('float64').to_numpy() for m in DETECTOR_METRICS]
+
+    anomalies = []
+    for i, (timestamp, prompt_id, model) in enumerate(zip(df['timestamp'], df['promptId'], df['model'])):
+        values = [None if math.isnan(column[i]) else float(column[i]) for column in columns]
+        pair = f'{prompt_id}|{model}'
+        slot = baselines.setdefault(f'{pair}|{hours_of_week[i]}', list(empty))
+        overall = baselines.setdefault(f'{pair}|{ALL_HOURS}', list(empty))
+
+        # Score each metric against its hour-of-week baseline once that is warm, the pair's baseline until then
+        hourly = [slot[3 * j] >= MIN_SAMPLES for j in range(len(DETECTOR_METRICS))]
+        before = [list((slot if warm else overall)[3 * j + 1:3 * j + 3]) for j, warm in enumerate(hourly)]
+        slot_scores = _update(slot, values, alpha)
+        overall_scores = _update(overall, values, alpha)
+
+        for j, (metric, value) in enumerate(zip(DETECTOR_METRICS, values)):
+            z = slot_scores[j] if hourly[j] else overall_scores[j]
+            if z is not None and abs(z) >= threshold:
+                mean, var = before[j]
+                anomalies.append({
+                    'timestamp': timestamp.isoformat(),
+                    'promptId': prompt_id,
+                    'model': model,
+                    'hourOfWeek': int(hours_of_week[i]) if hourly[j] else ALL_HOURS,
+                    'metric': metric,
+                    'value': value,
+                    'baselineMean': round(mean, 2),
+                    'baselineStd': round(math.sqrt(var), 2),
+                    'z': round(z, 2),
+                })
+
+    if len(df):
+        last = df['timestamp'].iloc[-1].isoformat()
+        # Records sharing the last timestamp are told apart by count, as load_new_records skips them
+        at_last = int((df['timestamp'] == df['timestamp'].iloc[-1]).sum())
+        if last == state['last_timestamp']:
+            at_last += state['last_count']
+        state['last_timestamp'], state['last_count'] = last, at_last
+    return anomalies
+
+
+def load_new_records(source, since=None, scored=0):
+    """Successful records of a data source (see monitor_sources) from `since` on (every record when None)
+
+    The first `scored` records at exactly `since` were scored by the last run
+    and are skipped; records recorded later in the same instant are kept.
+    """
+    filters = make_filters(since=since)
+    df = source.load(filters=filters)
+
+    if since is not None and len(df):
+        # The time filter is inclusive; the feed is append-only, so the scored records at the mark come first
+        df = df.sort_values('timestamp', kind='stable')
+        at_mark = (df['timestamp'] == filters['since']).to_numpy()
+        df = df[~(at_mark & (np.cumsum(at_mark) <= scored))]
+    return df
+
+
+def parse_args(argv=None):
+    """Parse the command line"""
+    parser = argparse.ArgumentParser(description='Score newly recorded monitor rows against streaming baselines')
+    parser.add_argument('--output', default='anomalies.json', help='where to write the JSON list of anomalies')
+    parser.add_argument('--state', help=f'state file (default: {STATE_FILE} in MONITOR_CACHE_DIR)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'absolute z-score that counts as an anomaly (default {DEFAULT_THRESHOLD})')
+    parser.add_argument('--alpha', type=float, default=DEFAULT_ALPHA,
+                        help=f'weight of the newest record in the baselines (default {DEFAULT_ALPHA})')
+    parser.add_argument('--timezone', help='timezone for hours of the week (REPORT_TIMEZONE, default UTC)')
+    parser.add_argument('--source', metavar='LOCATION',
+                        help='monitor data location (MONITOR_SOURCE, default: S3_BUCKET/S3_KEY, see monitor_sources)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Score the records added since the last run and write the anomalies found"""
+    load_dotenv()
+    args = parse_args(argv)
+    cache_dir = os.getenv('MONITOR_CACHE_DIR', DEFAULT_CACHE_DIR)
+    state_path = args.state or os.path.join(cache_dir or '.', STATE_FILE)
+    timezone = args.timezone or os.getenv('REPORT_TIMEZONE', 'UTC')
+
+    try:
+        state = load_state(state_path, args.alpha, timezone)
+        source = open_source(args.source, cache_dir=cache_dir,
+                             max_workers=int(os.getenv('S3_MAX_WORKERS', DEFAULT_MAX_WORKERS)))
+        df = load_new_records(source, since=state['last_timestamp'], scored=state['last_count'])
+        print(f"📥 {len(df)} new record(s) since {state['last_timestamp'] or 'the beginning'}")
+
+        # The first run only learns the baselines from history; alerts start with the next run
+        seeding = state['last_timestamp'] is None
+        anomalies = score_records(state, df, args.threshold)
+        if seeding:
+            print(f"📚 Seeded baselines for {len(state['baselines'])} slot(s) from existing records")
+            anomalies = []
+        save_state(state, state_path)
+    except Exception as e:
+        print(f"💥 Anomaly detection failed: {e}")
+        return 1
+
+    for anomaly in anomalies:
+        print(f"⚠️ {anomaly['promptId']} / {anomaly['model']}: {anomaly['metric']} {anomaly['value']:.0f} "
+              f"vs {anomaly['baselineMean']:.0f} ± {anomaly['baselineStd']:.0f} (z {anomaly['z']:+.1f}) "
+              f"at {anomaly['timestamp']}")
+    with open(args.output, 'w') as f:
+        json.dump(anomalies, f, indent=2)
+    print(f"✅ {len(anomalies)} anomaly(ies) saved as '{args.output}'")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
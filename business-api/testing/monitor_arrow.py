@@ -0,0 +1,305 @@
+"""
+PyArrow compute backend for the aggregated tables
+
+The pandas path parses every row into a DataFrame, derives the calendar keys
+and groups the rows on one core. This backend runs the same work as Arrow
+query plans instead:
+
+- a pyarrow.dataset scan of the local CSV (or its Parquet cache), Arrow IPC
+  or Parquet data reads only the columns the aggregates need, evaluates the
+  row filters inside the scan (Parquet row groups outside the time window are
+  skipped by their statistics) and computes the calendar keys and latency
+  sketch buckets as projected expressions;
+- Acero hash aggregations over the scanned rows build the cube and sketch
+  tables of monitor_stats.
+
+Scanning and aggregation run on Arrow's thread pool. Only the aggregated
+tables are converted to pandas; the raw rows stay in Arrow memory until a
+figure that draws individual runs asks for them (see rows_frame). Every
+hourly, daily, heatmap, prompt x model and summary view is a roll-up of the
+cube and sketches, so they match the pandas path up to the order in which
+floating-point sums are taken. Sources that are not local files (S3,
+synthetic) are loaded through their own loader first and aggregated here.
+"""
+
+import csv
+import math
+import time
+
+import pandas as pd
+
+from monitor_loader import (FILTER_COLUMNS, MONITOR_SCHEMA, conform_frame, detect_generation, generation_column,
+                            parquet_filters)
+from monitor_sources import ArrowSource, CSVSource
+from monitor_stats import (CUBE_KEYS, CUBE_METRICS, EPOCH_WEEKDAY, NS_PER_DAY, NS_PER_HOUR, SKETCH_KEYS,
+                           SKETCH_RELATIVE_ACCURACY, ZERO_BUCKET)
+from monitor_timing import NULL_TIMER
+
+# Raw columns the aggregates and the per-run figures read
+ROW_COLUMNS = ['timestamp', 'promptId', 'model'] + CUBE_METRICS + ['generation']
+
+# Key columns that are categoricals in the pandas frames
+CATEGORY_KEYS = ['promptId', 'model']
+
+# csv-stringify writes true as "1" and false as an empty field, which Arrow reads as null
+CSV_TRUE_VALUES = ['1', 'true', 'True']
+CSV_FALSE_VALUES = ['0', 'false', 'False']
+
+# log(gamma) of the sketches' bucket width
+LOG_GAMMA = math.log((1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY))
+
+
+def _arrow_type(dtype):
+    """Arrow type a column of a MONITOR_SCHEMA dtype is parsed into"""
+    import pyarrow as pa
+
+    return {
+        'datetime64[ns, UTC]': pa.timestamp('ns', tz='UTC'),
+        'category': pa.dictionary(pa.int32(), pa.string()),
+        'float64': pa.float64(),
+        'Int32': pa.int32(),
+        'bool': pa.bool_(),
+    }.get(dtype, pa.string())
+
+
+def _csv_dataset(path):
+    """A dataset over a monitor CSV with the declared column types; columns nothing reads are never converted"""
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.dataset as ds
+
+    with open(path, newline='', encoding='utf-8') as f:
+        header = next(csv.reader(f), [])
+    schema = pa.schema([(col, _arrow_type(MONITOR_SCHEMA.get(col))) for col in header])
+    file_format = ds.CsvFileFormat(
+        # The quoted response text may span several lines
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(true_values=CSV_TRUE_VALUES, false_values=CSV_FALSE_VALUES),
+    )
+    return ds.dataset(path, format=file_format, schema=schema)
+
+
+def open_dataset(source, filters=None, timer=NULL_TIMER):
+    """A pyarrow dataset over a source's rows
+
+    Local CSV, Arrow IPC and Parquet files are scanned in place; a CSV with a
+    cache is scanned through its Parquet parts, whose row groups outside the
+    time window are skipped. Any other source is loaded as usual, with the
+    filters applied, and its frame wrapped.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    if isinstance(source, CSVSource):
+        parts = source.cached_parts(timer)
+        return ds.dataset(parts, format='parquet') if parts else _csv_dataset(source.path)
+    if isinstance(source, ArrowSource):
+        return ds.dataset(source.path, format=source.format,
+                          partitioning='hive' if source.format == 'parquet' else None)
+
+    df = source.load(filters=filters, timer=timer, columns=ROW_COLUMNS)
+    return ds.dataset(pa.Table.from_pandas(df, preserve_index=False))
+
+
+def filter_expression(filters, names, successful_only=True):
+    """Row filters (see monitor_loader.make_filters) as an Arrow expression over the columns in `names`"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    expression = pc.scalar(True)
+    if successful_only and 'success' in names:
+        expression &= pc.field('success') == True  # noqa: E712 (an Arrow expression, not a Python comparison)
+    if not filters:
+        return expression
+
+    # Like the pandas path, a value filter on a column the data lacks matches nothing
+    if any(name in filters and column not in names for name, column in FILTER_COLUMNS.items()):
+        return pc.scalar(False)
+    for column, op, value in parquet_filters(filters, names) or []:
+        if op == 'in':
+            expression &= pc.field(column).isin(value)
+            continue
+        bound = pa.scalar(value.value, pa.timestamp('ns', tz='UTC'))
+        expression &= pc.field(column) >= bound if op == '>=' else pc.field(column) <= bound
+    return expression
+
+
+def _row_projection(names, tz='UTC'):
+    """Expressions for the scanned columns plus calendar keys (as add_calendar_features) and latency buckets"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    projection = {col: pc.field(col) for col in ROW_COLUMNS if col in names}
+
+    timestamps = pc.field('timestamp')
+    if tz and tz != 'UTC':
+        timestamps = pc.local_timestamp(timestamps.cast(pa.timestamp('ns', tz=tz)))
+    # Integer division truncates, which is the floor for every timestamp after 1970
+    ns = timestamps.cast(pa.int64())
+    days = pc.divide(ns, NS_PER_DAY)
+    weekdays = pc.add(days, EPOCH_WEEKDAY)
+    projection['date'] = days.cast(pa.int32())
+    projection['hour'] = pc.subtract(pc.divide(ns, NS_PER_HOUR), pc.multiply(days, 24)).cast(pa.int8())
+    projection['day_of_week_num'] = pc.subtract(weekdays, pc.multiply(pc.divide(weekdays, 7), 7)).cast(pa.int8())
+
+    # Sketch bucket of each latency
+    projection['bucket'] = _bucket_expression(pc.field('latencyMs'))
+    return projection
+
+
+def _bucket_expression(values):
+    """Sketch bucket of each value, as monitor_stats.sketch_buckets"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    values = values.cast(pa.float64())
+    buckets = pc.ceil(pc.divide(pc.ln(values), LOG_GAMMA)).cast(pa.int32(), safe=False)
+    return pc.if_else(values > 0, buckets, pa.scalar(ZERO_BUCKET, pa.int32()))
+
+
+def scan_rows(source, filters=None, tz='UTC', successful_only=True, timer=NULL_TIMER):
+    """Scan the matching rows of a source into an Arrow table with their calendar keys and latency buckets"""
+    import pyarrow as pa
+
+    dataset = open_dataset(source, filters, timer)
+    names = dataset.schema.names
+    start = time.perf_counter()
+    table = dataset.to_table(columns=_row_projection(names, tz),
+                             filter=filter_expression(filters, names, successful_only), use_threads=True)
+    # Each scanned batch builds its own dictionary; hash grouping needs them to agree. The
+    # (stable) time order is the order the pandas path analyses rows in
+    table = table.unify_dictionaries().sort_by('timestamp')
+    if isinstance(source, CSVSource) and 'generation' not in names:
+        # A CSV scanned in place names its generation only in the header, as read_monitor_csv reads it
+        generation = generation_column(detect_generation(names), table.num_rows)
+        table = table.append_column('generation', pa.array(generation))
+    if isinstance(source, CSVSource):
+        # pandas parses CSV categories in sorted order; other sources keep the order they were saved in
+        for key in CATEGORY_KEYS:
+            table = table.set_column(table.schema.get_field_index(key), key, _sort_dictionary(table[key]))
+    timer.add('load/scan', time.perf_counter() - start, rows=table.num_rows)
+    return table
+
+
+def _sort_dictionary(column):
+    """Re-encode a dictionary column so its dictionary is sorted"""
+    import numpy as np
+    import pyarrow as pa
+
+    values = column.combine_chunks()
+    order = np.argsort(values.dictionary.to_numpy(zero_copy_only=False), kind='stable')
+    ranks = np.empty(len(order), dtype='int32')
+    ranks[order] = np.arange(len(order), dtype='int32')
+    indices = pa.array(ranks).take(values.indices)
+    return pa.DictionaryArray.from_arrays(indices, values.dictionary.take(pa.array(order)))
+
+
+def _categories(table, key):
+    """Categories of a key column: its dictionary, which scan_rows has unified"""
+    column = table[key]
+    return column.chunk(0).dictionary.to_pylist() if column.num_chunks else []
+
+
+def _aggregate(table, keys, aggregations, projection=None):
+    """Run one Acero hash aggregation over `table` and return it as a frame ordered like a pandas groupby(sort=False)
+
+    Rows with a null key are dropped, as pandas does. `table` is in time
+    order, and groups come out in the order of their first row.
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.acero as ac
+    import pyarrow.compute as pc
+
+    valid = pc.scalar(True)
+    for key in keys:
+        valid &= pc.field(key).is_valid()
+
+    projection = dict(projection or {})
+    for col in keys + ['_row']:
+        projection.setdefault(col, pc.field(col))
+    table = table.append_column('_row', pa.array(np.arange(table.num_rows)))
+    plan = ac.Declaration.from_sequence([
+        ac.Declaration('table_source', ac.TableSourceNodeOptions(table)),
+        ac.Declaration('filter', ac.FilterNodeOptions(valid)),
+        ac.Declaration('project', ac.ProjectNodeOptions(list(projection.values()), list(projection))),
+        ac.Declaration('aggregate', ac.AggregateNodeOptions(
+            aggregations + [('_row', 'hash_min', None, '_first')], keys=keys)),
+    ])
+    result = plan.to_table(use_threads=True).sort_by('_first')
+
+    df = result.to_pandas(split_blocks=True).drop(columns='_first')
+    for key in CATEGORY_KEYS:
+        if key in df.columns:
+            df[key] = df[key].astype('category').cat.set_categories(_categories(table, key))
+    names = [name for *_, name in aggregations]
+    return df[keys + names]
+
+
+def cube_from_rows(table, keys=CUBE_KEYS, metrics=CUBE_METRICS):
+    """The sufficient-statistics cube of monitor_stats.build_cube, aggregated from scanned rows"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    metrics = [m for m in metrics if m in table.column_names]
+    # Sums of nothing are 0, as in pandas
+    sum_options = pc.ScalarAggregateOptions(min_count=0)
+    projection = {}
+    aggregations = []
+    for m in metrics:
+        # Widened first so sums of squares cannot overflow
+        value = pc.field(m).cast(pa.float64())
+        projection[m] = value
+        projection[f'{m}_sq'] = pc.multiply(value, value)
+        aggregations += [
+            (m, 'hash_count', pc.CountOptions(mode='only_valid'), f'{m}_count'),
+            (m, 'hash_sum', sum_options, f'{m}_sum'),
+            (f'{m}_sq', 'hash_sum', sum_options, f'{m}_sumsq'),
+            (m, 'hash_min', None, f'{m}_min'),
+            (m, 'hash_max', None, f'{m}_max'),
+        ]
+    return _aggregate(table, list(keys), aggregations, projection)
+
+
+def sketches_from_rows(table, keys=SKETCH_KEYS, metric='latencyMs'):
+    """The sketch table of monitor_stats.build_sketches, aggregated from scanned rows
+
+    The scan already bucketed the latencies; other metrics are bucketed here.
+    """
+    import pyarrow.compute as pc
+
+    projection = {metric: pc.field(metric)}
+    if metric != 'latencyMs':
+        projection['bucket'] = _bucket_expression(pc.field(metric))
+    valid = table.filter(pc.field(metric).is_valid())
+    return _aggregate(valid, list(keys) + ['bucket'], [(metric, 'hash_count', pc.CountOptions(mode='all'), 'count')],
+                      projection)
+
+
+def column_median(table, column):
+    """Median of a column, skipping nulls, interpolated like pandas"""
+    import pyarrow.compute as pc
+
+    if column not in table.column_names:
+        return float('nan')
+    median = pc.quantile(table[column], q=0.5, interpolation='linear')[0].as_py()
+    return float('nan') if median is None else median
+
+
+def value_counts(table, column):
+    """Rows per value of a column, as a dict; empty when the rows do not carry it"""
+    import pyarrow.compute as pc
+
+    if column not in table.column_names:
+        return {}
+    counts = pc.value_counts(table[column]).to_pylist()
+    return {item['values']: item['counts'] for item in counts if item['values'] is not None}
+
+
+def rows_frame(table):
+    """Convert scanned rows to the typed, time-ordered frame the pandas path builds"""
+    df = table.drop_columns(['bucket']).to_pandas(split_blocks=True)
+    df = conform_frame(df)
+    for key in CATEGORY_KEYS:
+        df[key] = df[key].astype('category').cat.set_categories(_categories(table, key))
+    return df
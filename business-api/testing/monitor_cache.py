@@ -0,0 +1,397 @@
+"""
+ETag-keyed local cache of the parsed monitor dataset
+
+The typed frame produced by monitor_loader is written as Parquet parts next to
+a small JSON sidecar holding the S3 object's ETag, last-modified time and how
+far into the object we have ingested. On the next run:
+
+- a conditional GET (If-None-Match) that answers 304 means the object is
+  unchanged, and the frame is read back from the memory-mapped Parquet parts;
+- otherwise, since api_tester.js only ever appends rows, a ranged GET fetches
+  just the bytes after the last ingested offset. Those rows are parsed and
+  stored as a new part, so ingest cost scales with the rows added since the
+  last run rather than with the full history;
+- if the header or the bytes just before the old offset no longer match, the
+  object was rewritten rather than appended to, and it is reloaded in full.
+
+Full loads of large objects are downloaded in parallel byte ranges (see
+monitor_download); the tail ingest is small and always uses one GET.
+
+The cache always holds every row of the object. Row filters are pushed into
+the Parquet read instead: parts are written in bounded row groups, and groups
+whose min/max timestamp statistics fall outside the requested window are
+skipped without being read.
+
+A local monitor CSV is cached the same way (see sync_file_cache), with the
+file's size and modification time in place of the ETag, so a report on the
+last day of a long local file neither re-parses nor re-reads its history.
+"""
+
+import glob
+import hashlib
+import io
+import json
+import os
+import shutil
+from importlib.util import find_spec
+
+import pandas as pd
+
+from monitor_loader import (ANALYSIS_COLUMNS, MONITOR_SCHEMA, apply_filters, concat_frames, parquet_filters,
+                            read_monitor_csv, read_monitor_object)
+from monitor_download import DEFAULT_MAX_WORKERS, large_object_head, read_monitor_object_ranged
+
+DEFAULT_CACHE_DIR = '.monitor_cache'
+
+# Bytes before the previous end of the object that are re-fetched and compared
+# to prove the old content is still a prefix of the new object
+BOUNDARY_WINDOW_BYTES = 4096
+
+# Bytes kept from the start of the stream to recover the CSV header line
+HEADER_PROBE_BYTES = 64 * 1024
+
+# Appended parts are compacted back into one file past this many
+MAX_PARTS = 64
+
+# Rows per Parquet row group; each group carries its own min/max statistics,
+# so a narrow time window only reads the groups that overlap it
+ROW_GROUP_ROWS = 50_000
+
+
+def _status(error):
+    return error.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+
+
+def _is_not_modified(error):
+    """Return True when a ClientError is S3's answer to a satisfied If-None-Match"""
+    code = error.response.get('Error', {}).get('Code')
+    return _status(error) == 304 or code in ('304', 'NotModified')
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _frame_signature(columns=ANALYSIS_COLUMNS, successful_only=True, **_):
+    """Describe the parse options and declared dtypes a cached frame was built with"""
+    return {'columns': list(columns), 'successful_only': successful_only,
+            'dtypes': [MONITOR_SCHEMA.get(col) for col in columns]}
+
+
+class _TrackingStream(io.RawIOBase):
+    """Pass-through reader that counts bytes and remembers the header and last few bytes"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+        self.head = b''
+        self.tail = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.raw.read(len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        self.bytes_read += n
+        if len(self.head) < HEADER_PROBE_BYTES:
+            self.head += data[:HEADER_PROBE_BYTES - len(self.head)]
+        self.tail = (self.tail + data)[-BOUNDARY_WINDOW_BYTES:]
+        return n
+
+    def header_line(self):
+        end = self.head.find(b'\n')
+        return self.head[:end + 1] if end >= 0 else b''
+
+
+class MonitorCache:
+    """Parquet cache of one monitor object, keyed by ETag and last-modified time
+
+    A local file is cached with `bucket` None and its absolute path as `key`.
+    """
+
+    def __init__(self, cache_dir, bucket, key):
+        self.cache_dir = cache_dir
+        self.bucket = bucket
+        self.key = key
+
+        # Bucket and key may contain slashes, so the file names are derived from a digest
+        digest = hashlib.sha1(f"{bucket}/{key}".encode('utf-8')).hexdigest()[:16]
+        self.data_dir = os.path.join(cache_dir, f"monitor_{digest}")
+        self.meta_path = os.path.join(cache_dir, f"monitor_{digest}.json")
+
+    @staticmethod
+    def available():
+        """Parquet support needs pyarrow; the cache is skipped without it"""
+        return find_spec('pyarrow') is not None
+
+    def parts(self):
+        return sorted(glob.glob(os.path.join(self.data_dir, 'part-*.parquet')))
+
+    def load_meta(self, signature=None):
+        """Return the sidecar metadata, or None when nothing usable is cached"""
+        if not (os.path.exists(self.meta_path) and self.parts()):
+            return None
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('bucket') != self.bucket or meta.get('key') != self.key:
+            return None
+        if signature is not None and meta.get('signature') != signature:
+            return None
+        return meta
+
+    def load_frame(self, filters=None):
+        """Read the cached parts back through a memory map, skipping row groups the filters rule out"""
+        parts = self.parts()
+        if not filters:
+            return pd.read_parquet(parts, memory_map=True)
+
+        import pyarrow.parquet as pq
+
+        predicates = parquet_filters(filters, pq.read_schema(parts[0]).names)
+        df = pd.read_parquet(parts, memory_map=True, filters=predicates)
+        # Predicates on columns the cache lacks are resolved here
+        return apply_filters(df, filters)
+
+    def store(self, df, meta):
+        """Replace every cached part with a single new one"""
+        staging = self.data_dir + '.tmp'
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        df.to_parquet(os.path.join(staging, 'part-00000.parquet'), index=False, row_group_size=ROW_GROUP_ROWS)
+
+        # Drop the sidecar first so a crash in between never pairs old metadata with new data
+        if os.path.exists(self.meta_path):
+            os.remove(self.meta_path)
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+        os.replace(staging, self.data_dir)
+        self._write_meta(meta)
+
+    def append(self, df, meta):
+        """Add newly ingested rows as another part, compacting when parts pile up"""
+        parts = self.parts()
+        if len(parts) >= MAX_PARTS:
+            self.store(concat_frames([self.load_frame(), df]), meta)
+            return
+
+        if len(df) > 0:
+            path = os.path.join(self.data_dir, f"part-{len(parts):05d}.parquet")
+            df.to_parquet(path + '.tmp', index=False, row_group_size=ROW_GROUP_ROWS)
+            os.replace(path + '.tmp', path)
+        self._write_meta(meta)
+
+    def _write_meta(self, meta):
+        meta = dict(meta, bucket=self.bucket, key=self.key)
+        if hasattr(meta.get('last_modified'), 'isoformat'):
+            meta['last_modified'] = meta['last_modified'].isoformat()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_meta = self.meta_path + '.tmp'
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_meta, self.meta_path)
+
+
+def _load_tail(s3_client, cache, meta, filters=None, **kwargs):
+    """Ingest only the bytes appended since the cached offset
+
+    Returns the updated frame, or None when the object can no longer be
+    treated as an append of what was cached and a full reload is needed.
+    """
+    from botocore.exceptions import ClientError
+
+    offset = meta['offset']
+    window_start = max(offset - BOUNDARY_WINDOW_BYTES, 0)
+
+    try:
+        response = s3_client.get_object(Bucket=cache.bucket, Key=cache.key,
+                                        Range=f"bytes={window_start}-", IfNoneMatch=meta['etag'])
+    except ClientError as e:
+        if _is_not_modified(e):
+            print(f"⚡ Monitor data unchanged (ETag {meta['etag']}), using local cache")
+            return cache.load_frame(filters)
+        if _status(e) == 416:
+            # The object is now shorter than what we ingested, so it was rewritten
+            return None
+        raise
+
+    body = response['Body']
+    try:
+        window = body.read(offset - window_start)
+        if _digest(window) != meta['boundary_hash'] or not window.endswith(b'\n'):
+            print("🔁 Monitor object was rewritten, reloading it in full")
+            return None
+        tail = body.read()
+    finally:
+        body.close()
+
+    header = meta['header'].encode('utf-8')
+    head = s3_client.get_object(Bucket=cache.bucket, Key=cache.key, Range=f"bytes=0-{len(header) - 1}")
+    try:
+        if head['Body'].read() != header:
+            print("🔁 Monitor CSV header changed, reloading it in full")
+            return None
+    finally:
+        head['Body'].close()
+
+    _append_tail(cache, meta, window, tail, response.get('ETag'), response.get('LastModified'), **kwargs)
+    return cache.load_frame(filters)
+
+
+def _append_tail(cache, meta, window, tail, etag, last_modified, **kwargs):
+    """Parse the bytes appended after the cached offset and store them as a new part"""
+    offset = meta['offset']
+    header = meta['header'].encode('utf-8')
+    tail_df = read_monitor_csv(io.BytesIO(header + tail), **kwargs)
+    print(f"➕ Ingested {len(tail):,} new bytes ({len(tail_df):,} rows) after offset {offset:,}")
+
+    cache.append(tail_df, dict(
+        meta,
+        etag=etag,
+        last_modified=last_modified,
+        offset=offset + len(tail),
+        boundary_hash=_digest((window + tail)[-BOUNDARY_WINDOW_BYTES:]),
+        rows=meta['rows'] + len(tail_df),
+    ))
+
+
+def load_monitor_frame(s3_client, bucket, key, cache_dir=DEFAULT_CACHE_DIR, filters=None,
+                       max_workers=DEFAULT_MAX_WORKERS, **kwargs):
+    """Load the compact monitor frame, reusing and extending the local cache where possible
+
+    Pass `cache_dir=None` (or an empty string) to always stream from S3.
+    `filters` (see monitor_loader.make_filters) select the rows returned; they
+    are applied while parsing when streaming and pushed into the Parquet read
+    when the cache answers. Objects of at least monitor_download.PARALLEL_MIN_BYTES
+    are fetched in up to `max_workers` concurrent byte ranges.
+    """
+    if not cache_dir or not MonitorCache.available():
+        head = large_object_head(s3_client, bucket, key, max_workers)
+        if head:
+            return read_monitor_object_ranged(s3_client, bucket, key, head=head, max_workers=max_workers,
+                                              filters=filters, **kwargs)[0]
+        return read_monitor_object(s3_client, bucket, key, filters=filters, **kwargs)
+
+    signature = _frame_signature(**kwargs)
+    cache = MonitorCache(cache_dir, bucket, key)
+    meta = cache.load_meta(signature)
+
+    if meta:
+        df = _load_tail(s3_client, cache, meta, filters=filters, **kwargs)
+        if df is not None:
+            return df
+
+    head = large_object_head(s3_client, bucket, key, max_workers)
+    if head:
+        df, info = read_monitor_object_ranged(s3_client, bucket, key, head=head, max_workers=max_workers,
+                                              tail_bytes=BOUNDARY_WINDOW_BYTES, **kwargs)
+        cache.store(df, {
+            'etag': info['etag'],
+            'last_modified': info['last_modified'],
+            'signature': signature,
+            'offset': info['size'],
+            'header': info['header'].decode('utf-8'),
+            'boundary_hash': _digest(info['tail']),
+            'rows': len(df),
+        })
+        return apply_filters(df, filters)
+
+    response = s3_client.get_object(Bucket=bucket, Key=key)
+    stream = _TrackingStream(response['Body'])
+    try:
+        df = read_monitor_csv(io.BufferedReader(stream), **kwargs)
+    finally:
+        response['Body'].close()
+
+    cache.store(df, {
+        'etag': response.get('ETag'),
+        'last_modified': response.get('LastModified'),
+        'signature': signature,
+        'offset': stream.bytes_read,
+        'header': stream.header_line().decode('utf-8'),
+        'boundary_hash': _digest(stream.tail),
+        'rows': len(df),
+    })
+    return apply_filters(df, filters)
+
+
+def _file_version(path):
+    """Stand-in for an ETag of a local file: its size and modification time"""
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def _load_file_tail(f, cache, meta, version, **kwargs):
+    """Ingest only the bytes appended to a local file since the cached offset
+
+    Returns False when the file can no longer be treated as an append of what
+    was cached and a full reload is needed.
+    """
+    offset = meta['offset']
+    window_start = max(offset - BOUNDARY_WINDOW_BYTES, 0)
+    f.seek(window_start)
+    window = f.read(offset - window_start)
+    # A file now shorter than the cached offset reads back a short window, which never matches
+    if _digest(window) != meta['boundary_hash'] or not window.endswith(b'\n'):
+        print("🔁 Monitor file was rewritten, reloading it in full")
+        return False
+
+    header = meta['header'].encode('utf-8')
+    f.seek(0)
+    if f.read(len(header)) != header:
+        print("🔁 Monitor CSV header changed, reloading it in full")
+        return False
+
+    f.seek(offset)
+    _append_tail(cache, meta, window, f.read(), version, None, **kwargs)
+    return True
+
+
+def sync_file_cache(path, cache_dir=DEFAULT_CACHE_DIR, **kwargs):
+    """Bring the cache of a local monitor CSV up to date with the file and return it
+
+    The file is cached like an S3 object, with its size and modification time
+    in place of the ETag: an unchanged file is not read at all, an appended
+    one only from the cached offset, and anything else in full.
+    """
+    signature = _frame_signature(**kwargs)
+    cache = MonitorCache(cache_dir, None, os.path.abspath(path))
+    meta = cache.load_meta(signature)
+    version = _file_version(path)
+    if meta and meta['etag'] == version:
+        return cache
+
+    with open(path, 'rb') as f:
+        if meta and _load_file_tail(f, cache, meta, version, **kwargs):
+            return cache
+
+        f.seek(0)
+        stream = _TrackingStream(f)
+        df = read_monitor_csv(io.BufferedReader(stream), **kwargs)
+    cache.store(df, {
+        'etag': version,
+        'last_modified': None,
+        'signature': signature,
+        'offset': stream.bytes_read,
+        'header': stream.header_line().decode('utf-8'),
+        'boundary_hash': _digest(stream.tail),
+        'rows': len(df),
+    })
+    return cache
+
+
+def load_file_frame(path, cache_dir=DEFAULT_CACHE_DIR, filters=None, **kwargs):
+    """Load the compact frame of a local monitor CSV through the cache (see sync_file_cache)
+
+    Filters are pushed into the Parquet read, so a narrow time window only
+    reads the row groups that overlap it. Pass `cache_dir=None` (or an empty
+    string) to parse the whole file every time.
+    """
+    if not cache_dir or not MonitorCache.available():
+        with open(path, 'rb') as f:
+            return read_monitor_csv(f, filters=filters, **kwargs)
+    return sync_file_cache(path, cache_dir, **kwargs).load_frame(filters)
@@ -0,0 +1,196 @@
+"""
+Parallel ranged download of one large monitor object
+
+A single GET streams at the speed of one TCP connection, and the CSV is then
+parsed on one core. Objects of at least PARALLEL_MIN_BYTES are instead HEADed
+and split into PART_BYTES byte ranges, fetched concurrently over the shared,
+pooled boto3 client. Each range is retried on its own when it fails, and every
+range is pinned to the ETag from the HEAD, so an object rewritten mid-download
+fails loudly instead of mixing two versions.
+
+Ranges are stitched back in order and cut at the last record boundary each
+holds: the last newline preceded by an even number of double quotes, so the
+quoted multi-line `response` fields are never split. Each piece, with the
+header line prepended, is parsed by a pool of worker processes while later
+ranges are still downloading; only a few ranges per worker are held in memory
+at any time.
+"""
+
+import io
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from multiprocessing import get_context
+
+import numpy as np
+
+from monitor_loader import ANALYSIS_COLUMNS, concat_frames, empty_frame, read_monitor_csv, validate_frame
+from monitor_timing import NULL_TIMER
+
+# Concurrent downloads; the client's connection pool is sized to match
+DEFAULT_MAX_WORKERS = 8
+
+PART_BYTES = 16 * 1024 * 1024
+# Smaller objects are fetched with one GET; the HEAD and stitching would not pay off
+PARALLEL_MIN_BYTES = 4 * PART_BYTES
+
+# Attempts per range after the first, with exponential backoff
+RANGE_RETRIES = 4
+RETRY_BACKOFF_SECONDS = 0.5
+
+# Ranges downloaded ahead of the one being stitched, and pieces queued for parsing, per worker
+LOOKAHEAD_PER_WORKER = 2
+
+
+class ObjectChangedError(RuntimeError):
+    """The object was rewritten while its ranges were being downloaded"""
+
+
+def _status(error):
+    return error.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+
+
+def large_object_head(s3_client, bucket, key, max_workers=DEFAULT_MAX_WORKERS):
+    """HEAD response of an object worth downloading in ranges, or None to use a single GET"""
+    if max_workers <= 1:
+        return None
+    head = s3_client.head_object(Bucket=bucket, Key=key)
+    return head if head['ContentLength'] >= PARALLEL_MIN_BYTES else None
+
+
+def fetch_range(s3_client, bucket, key, first, last, etag, timer=NULL_TIMER):
+    """Download bytes first..last (inclusive) of the object version with `etag`, retrying only this range"""
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    for attempt in range(RANGE_RETRIES + 1):
+        start = time.perf_counter()
+        try:
+            response = s3_client.get_object(Bucket=bucket, Key=key, Range=f'bytes={first}-{last}', IfMatch=etag)
+            body = response['Body']
+            try:
+                data = body.read()
+            finally:
+                body.close()
+            if len(data) != last - first + 1:
+                raise OSError(f"short read of bytes {first}-{last}: got {len(data):,}")
+            timer.add('load/fetch', time.perf_counter() - start, bytes=len(data))
+            return data
+        except ClientError as e:
+            status = _status(e)
+            if status == 412:
+                raise ObjectChangedError(f"{bucket}/{key} changed while it was being downloaded") from e
+            # Throttling and server errors are worth another try, anything else is not
+            if status is not None and status < 500 and status != 429:
+                raise
+            error = e
+        except (BotoCoreError, OSError) as e:
+            error = e
+        if attempt < RANGE_RETRIES:
+            print(f"🔁 Retrying bytes {first:,}-{last:,} of {key} after: {error}")
+            time.sleep(RETRY_BACKOFF_SECONDS * 2 ** attempt)
+    raise error
+
+
+def record_boundary(buffer):
+    """Offset just past the last complete CSV record in a buffer that starts at a record boundary (0 if none)"""
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    newlines = np.flatnonzero(data == ord('\n'))
+    if len(newlines) == 0:
+        return 0
+    quotes = np.flatnonzero(data == ord('"'))
+    # A newline inside a quoted field comes after an odd number of quotes
+    ends = newlines[np.searchsorted(quotes, newlines) % 2 == 0]
+    return int(ends[-1]) + 1 if len(ends) else 0
+
+
+def _parse_piece(data, kwargs):
+    """Parse one stitched piece in a worker process and report how long it took"""
+    start = time.perf_counter()
+    df = read_monitor_csv(io.BytesIO(data), **kwargs)
+    return df, time.perf_counter() - start
+
+
+def read_monitor_object_ranged(s3_client, bucket, key, head=None, max_workers=DEFAULT_MAX_WORKERS,
+                               parse_workers=None, part_bytes=PART_BYTES, tail_bytes=0, timer=NULL_TIMER,
+                               **kwargs):
+    """Download an object in concurrent byte ranges and parse the pieces in parallel
+
+    Returns the frame read_monitor_csv would have produced and a dict with the
+    object's `etag`, `last_modified`, `size`, `header` line and last
+    `tail_bytes` bytes (`tail`), which the cache needs to extend it later.
+    `parse_workers` defaults to one process per CPU; with one, pieces are
+    parsed in this process.
+    """
+    head = head or s3_client.head_object(Bucket=bucket, Key=key)
+    size, etag = head['ContentLength'], head['ETag']
+    ranges = [(first, min(first + part_bytes, size) - 1) for first in range(0, size, part_bytes)]
+    parse_workers = min(parse_workers or os.cpu_count() or 1, len(ranges))
+    print(f"🧵 Downloading {size / 1024 / 1024:,.0f} MB in {len(ranges)} ranges "
+          f"({max_workers} connections, {parse_workers} parser(s))")
+
+    frames = []
+    parsing = deque()
+    header = None
+    carry = b''
+    tail = b''
+    pending = iter(ranges)
+    fetches = deque()
+    processes = (ProcessPoolExecutor(parse_workers, mp_context=get_context('spawn'))
+                 if parse_workers > 1 else nullcontext())
+
+    def top_up():
+        while len(fetches) < LOOKAHEAD_PER_WORKER * max_workers:
+            next_range = next(pending, None)
+            if next_range is None:
+                return
+            fetches.append(downloads.submit(fetch_range, s3_client, bucket, key, *next_range, etag, timer))
+
+    def collect(future):
+        df, seconds = future.result()
+        timer.add('load/parse', seconds, rows=len(df))
+        frames.append(df)
+
+    with ThreadPoolExecutor(max_workers) as downloads, processes as parsers:
+        top_up()
+        while fetches:
+            data = fetches.popleft().result()
+            top_up()
+            if tail_bytes:
+                tail = data[-tail_bytes:] if len(data) >= tail_bytes else (tail + data)[-tail_bytes:]
+
+            buffer = carry + data if carry else data
+            if header is None:
+                end = buffer.find(b'\n') + 1
+                if end == 0:
+                    if fetches:
+                        carry = buffer
+                        continue
+                    end = len(buffer)
+                header, buffer = buffer[:end], buffer[end:]
+
+            # The last range ends the object, so whatever is left is a whole record
+            cut = record_boundary(buffer) if fetches else len(buffer)
+            if cut == 0:
+                carry = buffer
+                continue
+            piece = header + buffer[:cut]
+            carry = buffer[cut:]
+
+            if parsers is None:
+                frames.append(read_monitor_csv(io.BytesIO(piece), timer=timer, **kwargs))
+                continue
+            parsing.append(parsers.submit(_parse_piece, piece, kwargs))
+            # Waiting in order keeps the frames in file order and bounds the pieces held in memory
+            while len(parsing) > LOOKAHEAD_PER_WORKER * parse_workers:
+                collect(parsing.popleft())
+
+        while parsing:
+            collect(parsing.popleft())
+
+    frames = [df for df in frames if len(df) > 0]
+    df = validate_frame(concat_frames(frames)) if frames else empty_frame(kwargs.get('columns', ANALYSIS_COLUMNS))
+    info = {'etag': etag, 'last_modified': head.get('LastModified'), 'size': size,
+            'header': header or b'', 'tail': tail}
+    return df, info
@@ -0,0 +1,715 @@
+"""
+Figure rendering for the LLM performance report
+
+Each figure is drawn by a pure function from the small aggregated tables the
+analyzer prepares, never from the raw rows. That keeps the inputs cheap to
+pickle, so in headless mode the figures can be rendered in parallel worker
+processes and the report is bounded by the slowest figure rather than the sum
+of all of them. Matplotlib and seaborn are imported inside the functions that
+draw, so importing this module (e.g. for FIGURES) does not load the plotting
+stack.
+
+Two render profiles are available:
+
+- `publication`: 300 dpi with per-cell and per-bar value annotations (the default)
+- `draft`: 100 dpi without annotations, for quick iteration
+
+Rendered files can be kept in a content-addressed cache (see figure_key):
+a figure whose inputs, profile, style and renderer are unchanged since an
+earlier run is copied from there instead of being drawn and encoded again.
+
+Figures with a row or a subplot per prompt are drawn page by page (see
+figure_pages): the per-prompt time series as a fixed grid of prompts per page
+and the comparison matrix heatmaps as tiles of prompt rows. Each page is saved,
+as a numbered PNG or into one multi-page PDF, and closed before the next one is
+drawn, so rendering memory stays the same however many prompts are monitored.
+"""
+
+import glob
+import hashlib
+import inspect
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from importlib.metadata import PackageNotFoundError, version
+
+import numpy as np
+import pandas as pd
+
+from monitor_stats import DAY_NAMES
+
+PROFILES = {
+    'publication': {'dpi': 300, 'annotate': True},
+    'draft': {'dpi': 100, 'annotate': False},
+}
+
+DEFAULT_PROFILE = 'publication'
+
+STYLE = 'seaborn-v0_8'
+PALETTE = 'husl'
+
+# Cached renders kept per output file; older ones are removed as new ones are added
+MAX_CACHED_RENDERS = 8
+
+# The per-prompt time series shows at most PAGE_ROWS x PAGE_COLUMNS prompts per page
+PAGE_ROWS = 3
+PAGE_COLUMNS = 2
+
+# Prompt rows per page of the comparison matrix heatmaps
+MATRIX_ROWS_PER_PAGE = 30
+MATRIX_TABLES = ['latency', 'response', 'tokens', 'cv']
+
+# Output formats: png writes a numbered file per page, pdf one file holding every page of a figure
+PAGE_FORMATS = ['png', 'pdf']
+DEFAULT_PAGE_FORMAT = 'png'
+
+
+def setup_style():
+    """Apply the report's plotting style"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.style.use(STYLE)
+    sns.set_palette(PALETTE)
+
+
+def _zone_suffix(inputs):
+    """Title suffix naming the report timezone when it is not UTC"""
+    timezone = inputs.get('timezone') or 'UTC'
+    return '' if timezone == 'UTC' else f' ({timezone})'
+
+
+def _page_suffix(inputs):
+    """Title suffix numbering the page of a figure that has several"""
+    pages = inputs.get('pages', 1)
+    return '' if pages == 1 else f" (page {inputs['page']} of {pages})"
+
+
+def _color_range(inputs, key):
+    """Color scale limits shared by every page of a tiled heatmap, (None, None) when not tiled"""
+    return inputs.get('ranges', {}).get(key, (None, None))
+
+
+def _vector_colorbar(ax):
+    """Draw a heatmap's colorbar as vectors; a multi-page PDF keeps every raster image until it is closed"""
+    ax.collections[0].colorbar.solids.set_rasterized(False)
+
+
+def _flat_axes(axes, count):
+    """Return subplot axes as a flat list regardless of the grid shape"""
+    if count == 1 and not isinstance(axes, np.ndarray):
+        return [axes]
+    return list(np.asarray(axes).flatten())
+
+
+def render_per_prompt_time_series(inputs, profile):
+    """Latency over time, one subplot per prompt and one line per model"""
+    import matplotlib.pyplot as plt
+
+    prompts = inputs['prompts']
+    num_prompts = len(prompts)
+
+    # Every page of a paginated series has the same grid; a single page is sized to its prompts
+    rows, cols = inputs.get('grid') or _time_series_grid(num_prompts)
+
+    # Create figure with subplots
+    fig, axes = plt.subplots(rows, cols, figsize=(20, 6*rows))
+    fig.suptitle(f'Latency Over Time by Prompt{_page_suffix(inputs)}', fontsize=20, fontweight='bold')
+    axes = _flat_axes(axes, rows * cols)
+
+    # Color palette for different models
+    model_colors = plt.cm.Set1(np.linspace(0, 1, len(inputs['models'])))
+    model_color_map = dict(zip(inputs['models'], model_colors))
+
+    # Create a plot for each prompt
+    for ax, prompt in zip(axes, prompts):
+        for model, timestamps, latency in prompt['lines']:
+            ax.plot(timestamps, latency,
+                   marker='o', linewidth=2, markersize=4,
+                   color=model_color_map[model], label=model, alpha=0.8)
+
+        # Customize the subplot
+        ax.set_title(f"Prompt: {prompt['prompt_id']}", fontsize=14, fontweight='bold')
+        ax.set_xlabel('Time')
+        ax.set_ylabel('Latency (ms)')
+        ax.grid(True, alpha=0.3)
+        ax.legend()
+
+        # Format x-axis to show time nicely
+        ax.tick_params(axis='x', rotation=45)
+
+        # Trend line across all models
+        trend = prompt.get('trend')
+        if trend is not None:
+            ax.plot(trend['x'], trend['y'],
+                   '--', color='red', alpha=0.7, linewidth=1,
+                   label=f"Trend ({trend['slope']:+.2f} ms/day)")
+
+        # Detected latency level shifts, in the color of the model that shifted
+        for model, at in prompt.get('change_points', []):
+            ax.axvline(at, color=model_color_map[model], linestyle=':', linewidth=1.5, alpha=0.9)
+
+        # Add statistics text
+        if profile['annotate']:
+            stats_text = (f"Avg: {prompt['mean']:.1f}ms\n"
+                         f"Std: {prompt['std']:.1f}ms\n"
+                         f"Runs: {prompt['count']}")
+
+            ax.text(0.02, 0.98, stats_text, transform=ax.transAxes,
+                   verticalalignment='top', bbox=dict(boxstyle='round',
+                   facecolor='wheat', alpha=0.8), fontsize=10)
+
+    # Hide any unused subplots
+    for ax in axes[num_prompts:]:
+        ax.set_visible(False)
+
+    return fig
+
+
+def render_prompt_comparison_matrix(inputs, profile):
+    """Prompt x model heatmaps of latency, response length, tokens and latency CV"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    annotate = profile['annotate']
+
+    # Create figure with subplots
+    fig, axes = plt.subplots(2, 2, figsize=(20, 16))
+    fig.suptitle(f'Prompt Performance Comparison Matrix{_page_suffix(inputs)}', fontsize=20, fontweight='bold')
+
+    # 1. Latency heatmap
+    vmin, vmax = _color_range(inputs, 'latency')
+    sns.heatmap(inputs['latency'], annot=annotate, fmt='.1f', cmap='YlOrRd', vmin=vmin, vmax=vmax,
+               ax=axes[0, 0], cbar_kws={'label': 'Avg Latency (ms)'})
+    _vector_colorbar(axes[0, 0])
+    axes[0, 0].set_title('Average Latency by Prompt and Model', fontsize=14, fontweight='bold')
+    axes[0, 0].set_xlabel('Model')
+    axes[0, 0].set_ylabel('Prompt ID')
+
+    # 2. Response length heatmap
+    vmin, vmax = _color_range(inputs, 'response')
+    sns.heatmap(inputs['response'], annot=annotate, fmt='.0f', cmap='Blues', vmin=vmin, vmax=vmax,
+               ax=axes[0, 1], cbar_kws={'label': 'Avg Response Length (chars)'})
+    _vector_colorbar(axes[0, 1])
+    axes[0, 1].set_title('Average Response Length by Prompt and Model', fontsize=14, fontweight='bold')
+    axes[0, 1].set_xlabel('Model')
+    axes[0, 1].set_ylabel('Prompt ID')
+
+    # 3. Token usage heatmap
+    vmin, vmax = _color_range(inputs, 'tokens')
+    sns.heatmap(inputs['tokens'], annot=annotate, fmt='.0f', cmap='Greens', vmin=vmin, vmax=vmax,
+               ax=axes[1, 0], cbar_kws={'label': 'Avg Total Tokens'})
+    _vector_colorbar(axes[1, 0])
+    axes[1, 0].set_title('Average Token Usage by Prompt and Model', fontsize=14, fontweight='bold')
+    axes[1, 0].set_xlabel('Model')
+    axes[1, 0].set_ylabel('Prompt ID')
+
+    # 4. Latency variability (coefficient of variation)
+    vmin, vmax = _color_range(inputs, 'cv')
+    sns.heatmap(inputs['cv'], annot=annotate, fmt='.2f', cmap='RdYlBu_r', vmin=vmin, vmax=vmax,
+               ax=axes[1, 1], cbar_kws={'label': 'Latency CV'})
+    _vector_colorbar(axes[1, 1])
+    axes[1, 1].set_title('Latency Variability (CV) by Prompt and Model', fontsize=14, fontweight='bold')
+    axes[1, 1].set_xlabel('Model')
+    axes[1, 1].set_ylabel('Prompt ID')
+
+    return fig
+
+
+def _hourly_boxes(ax, box_stats, colors):
+    """Draw precomputed per-hour box statistics, colored by hour"""
+    box_plot = ax.bxp(box_stats, positions=[s['group'] for s in box_stats], patch_artist=True)
+    for patch, stats in zip(box_plot['boxes'], box_stats):
+        patch.set_facecolor(colors[stats['group']])
+        patch.set_alpha(0.7)
+
+
+def render_hourly_analysis(inputs, profile):
+    """Hourly bar charts and box plots of latency and response length"""
+    import matplotlib.pyplot as plt
+
+    hourly_latency = inputs['hourly_latency']
+    hourly_response = inputs['hourly_response']
+
+    # Create figure with subplots
+    fig, axes = plt.subplots(2, 2, figsize=(20, 16))
+    fig.suptitle(f'Hourly Performance Patterns{_zone_suffix(inputs)}', fontsize=20, fontweight='bold')
+
+    # 1. Average Latency by Hour
+    axes[0, 0].bar(hourly_latency['hour'], hourly_latency['mean'],
+                  yerr=hourly_latency['std'], capsize=5, alpha=0.7, color='skyblue')
+    axes[0, 0].set_title('Average Latency by Hour of Day', fontsize=16, fontweight='bold')
+    axes[0, 0].set_xlabel('Hour of Day (24h format)')
+    axes[0, 0].set_ylabel('Average Latency (ms)')
+    axes[0, 0].grid(True, alpha=0.3)
+    axes[0, 0].set_xticks(range(24))
+
+    # Add value labels on bars
+    if profile['annotate']:
+        for h, v, s in zip(hourly_latency['hour'], hourly_latency['mean'], hourly_latency['std']):
+            axes[0, 0].text(h, v + s, f'{v:.0f}ms',
+                           ha='center', va='bottom', fontsize=10)
+
+    # 2. Average Response Length by Hour
+    axes[0, 1].bar(hourly_response['hour'], hourly_response['mean'],
+                  yerr=hourly_response['std'], capsize=5, alpha=0.7, color='lightcoral')
+    axes[0, 1].set_title('Average Response Length by Hour of Day', fontsize=16, fontweight='bold')
+    axes[0, 1].set_xlabel('Hour of Day (24h format)')
+    axes[0, 1].set_ylabel('Average Response Length (characters)')
+    axes[0, 1].grid(True, alpha=0.3)
+    axes[0, 1].set_xticks(range(24))
+
+    # Add value labels on bars
+    if profile['annotate']:
+        for h, v, s in zip(hourly_response['hour'], hourly_response['mean'], hourly_response['std']):
+            axes[0, 1].text(h, v + s, f'{v:.0f}',
+                           ha='center', va='bottom', fontsize=10)
+
+    colors = plt.cm.viridis(np.linspace(0, 1, 24))
+
+    # 3. Latency Distribution by Hour (Box Plot from precomputed statistics)
+    _hourly_boxes(axes[1, 0], inputs['box_latency'], colors)
+    axes[1, 0].set_title('Latency Distribution by Hour', fontsize=16, fontweight='bold')
+    axes[1, 0].set_xlabel('Hour of Day (24h format)')
+    axes[1, 0].set_ylabel('Latency (ms)')
+    axes[1, 0].grid(True, alpha=0.3)
+    axes[1, 0].set_xticks(range(24))
+    axes[1, 0].set_xticklabels(range(24))
+
+    # 4. Response Length Distribution by Hour (Box Plot from precomputed statistics)
+    _hourly_boxes(axes[1, 1], inputs['box_response'], colors)
+    axes[1, 1].set_title('Response Length Distribution by Hour', fontsize=16, fontweight='bold')
+    axes[1, 1].set_xlabel('Hour of Day (24h format)')
+    axes[1, 1].set_ylabel('Response Length (characters)')
+    axes[1, 1].grid(True, alpha=0.3)
+    axes[1, 1].set_xticks(range(24))
+    axes[1, 1].set_xticklabels(range(24))
+
+    return fig
+
+
+def render_daily_analysis(inputs, profile):
+    """Day-of-week bar charts and per-date trend lines"""
+    import matplotlib.pyplot as plt
+
+    daily_latency = inputs['daily_latency']
+    daily_response = inputs['daily_response']
+    daily_time_series = inputs['daily_time_series']
+    response_time_series = inputs['response_time_series']
+
+    # Create figure with subplots
+    fig, axes = plt.subplots(2, 2, figsize=(20, 16))
+    fig.suptitle('Daily Performance Patterns', fontsize=20, fontweight='bold')
+
+    # 1. Average Latency by Day of Week
+    bars1 = axes[0, 0].bar([DAY_NAMES[d] for d in daily_latency['day_of_week_num']], daily_latency['mean'],
+                          yerr=daily_latency['std'], capsize=5, alpha=0.7, color='lightgreen')
+    axes[0, 0].set_title('Average Latency by Day of Week', fontsize=16, fontweight='bold')
+    axes[0, 0].set_xlabel('Day of Week')
+    axes[0, 0].set_ylabel('Average Latency (ms)')
+    axes[0, 0].grid(True, alpha=0.3)
+    axes[0, 0].tick_params(axis='x', rotation=45)
+
+    # Add value labels on bars
+    if profile['annotate']:
+        for bar, v in zip(bars1, daily_latency['mean']):
+            axes[0, 0].text(bar.get_x() + bar.get_width()/2, bar.get_height() + 50, f'{v:.0f}ms',
+                           ha='center', va='bottom', fontsize=10)
+
+    # 2. Average Response Length by Day of Week
+    bars2 = axes[0, 1].bar([DAY_NAMES[d] for d in daily_response['day_of_week_num']], daily_response['mean'],
+                          yerr=daily_response['std'], capsize=5, alpha=0.7, color='orange')
+    axes[0, 1].set_title('Average Response Length by Day of Week', fontsize=16, fontweight='bold')
+    axes[0, 1].set_xlabel('Day of Week')
+    axes[0, 1].set_ylabel('Average Response Length (characters)')
+    axes[0, 1].grid(True, alpha=0.3)
+    axes[0, 1].tick_params(axis='x', rotation=45)
+
+    # Add value labels on bars
+    if profile['annotate']:
+        for bar, v in zip(bars2, daily_response['mean']):
+            axes[0, 1].text(bar.get_x() + bar.get_width()/2, bar.get_height() + 20, f'{v:.0f}',
+                           ha='center', va='bottom', fontsize=10)
+
+    # 3. Latency Over Time (Time Series)
+    axes[1, 0].plot(daily_time_series['date'], daily_time_series['mean'],
+                   marker='o', linewidth=2, markersize=6, color='purple')
+    axes[1, 0].fill_between(daily_time_series['date'],
+                           daily_time_series['mean'] - daily_time_series['std'],
+                           daily_time_series['mean'] + daily_time_series['std'],
+                           alpha=0.3, color='purple')
+    axes[1, 0].set_title('Latency Trend Over Time', fontsize=16, fontweight='bold')
+    axes[1, 0].set_xlabel('Date')
+    axes[1, 0].set_ylabel('Average Latency (ms)')
+    axes[1, 0].grid(True, alpha=0.3)
+    axes[1, 0].tick_params(axis='x', rotation=45)
+
+    # 4. Response Length Over Time (Time Series)
+    axes[1, 1].plot(response_time_series['date'], response_time_series['mean'],
+                   marker='s', linewidth=2, markersize=6, color='brown')
+    axes[1, 1].fill_between(response_time_series['date'],
+                           response_time_series['mean'] - response_time_series['std'],
+                           response_time_series['mean'] + response_time_series['std'],
+                           alpha=0.3, color='brown')
+    axes[1, 1].set_title('Response Length Trend Over Time', fontsize=16, fontweight='bold')
+    axes[1, 1].set_xlabel('Date')
+    axes[1, 1].set_ylabel('Average Response Length (characters)')
+    axes[1, 1].grid(True, alpha=0.3)
+    axes[1, 1].tick_params(axis='x', rotation=45)
+
+    return fig
+
+
+def render_heatmaps(inputs, profile):
+    """Day x hour heatmaps of latency, response length, volume and latency CV"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    annotate = profile['annotate']
+
+    # Create figure with subplots
+    fig, axes = plt.subplots(2, 2, figsize=(20, 16))
+    fig.suptitle(f'Performance Heatmaps: Day vs Hour Patterns{_zone_suffix(inputs)}', fontsize=20, fontweight='bold')
+
+    # 1. Latency Heatmap
+    sns.heatmap(inputs['latency'], annot=annotate, yticklabels=DAY_NAMES, fmt='.0f', cmap='YlOrRd',
+               ax=axes[0, 0], cbar_kws={'label': 'Latency (ms)'})
+    axes[0, 0].set_title('Average Latency by Day and Hour', fontsize=16, fontweight='bold')
+    axes[0, 0].set_xlabel('Hour of Day')
+    axes[0, 0].set_ylabel('Day of Week')
+
+    # 2. Response Length Heatmap
+    sns.heatmap(inputs['response'], annot=annotate, yticklabels=DAY_NAMES, fmt='.0f', cmap='Blues',
+               ax=axes[0, 1], cbar_kws={'label': 'Response Length (chars)'})
+    axes[0, 1].set_title('Average Response Length by Day and Hour', fontsize=16, fontweight='bold')
+    axes[0, 1].set_xlabel('Hour of Day')
+    axes[0, 1].set_ylabel('Day of Week')
+
+    # 3. Request Count Heatmap
+    sns.heatmap(inputs['count'], annot=annotate, yticklabels=DAY_NAMES, fmt='d', cmap='Greens',
+               ax=axes[1, 0], cbar_kws={'label': 'Request Count'})
+    axes[1, 0].set_title('Request Volume by Day and Hour', fontsize=16, fontweight='bold')
+    axes[1, 0].set_xlabel('Hour of Day')
+    axes[1, 0].set_ylabel('Day of Week')
+
+    # 4. Latency Coefficient of Variation (CV) Heatmap
+    sns.heatmap(inputs['cv'], annot=annotate, yticklabels=DAY_NAMES, fmt='.2f', cmap='RdYlBu_r',
+               ax=axes[1, 1], cbar_kws={'label': 'Latency CV'})
+    axes[1, 1].set_title('Latency Variability (Coefficient of Variation)', fontsize=16, fontweight='bold')
+    axes[1, 1].set_xlabel('Hour of Day')
+    axes[1, 1].set_ylabel('Day of Week')
+
+    return fig
+
+
+def render_tail_latency_analysis(inputs, profile):
+    """p50/p95/p99 latency by hour and p99 by prompt and model"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    hourly_tails = inputs['hourly_tails']
+
+    # Create figure with subplots
+    fig, axes = plt.subplots(1, 2, figsize=(20, 8))
+    fig.suptitle('Tail Latency Analysis', fontsize=20, fontweight='bold')
+
+    # 1. Latency percentiles by hour
+    for column, color in [('p50', 'skyblue'), ('p95', 'orange'), ('p99', 'red')]:
+        axes[0].plot(hourly_tails.index, hourly_tails[column], marker='o', linewidth=2,
+                     markersize=6, color=color, label=column)
+    axes[0].set_title('Latency Percentiles by Hour of Day', fontsize=16, fontweight='bold')
+    axes[0].set_xlabel('Hour of Day (24h format)')
+    axes[0].set_ylabel('Latency (ms)')
+    axes[0].set_xticks(range(24))
+    axes[0].grid(True, alpha=0.3)
+    axes[0].legend()
+
+    # 2. p99 heatmap by prompt and model
+    sns.heatmap(inputs['p99'], annot=profile['annotate'], fmt='.0f', cmap='YlOrRd',
+               ax=axes[1], cbar_kws={'label': 'p99 Latency (ms)'})
+    axes[1].set_title('p99 Latency by Prompt and Model', fontsize=16, fontweight='bold')
+    axes[1].set_xlabel('Model')
+    axes[1].set_ylabel('Prompt ID')
+
+    return fig
+
+
+def render_model_comparison(inputs, profile):
+    """Per-model hourly bars and box plots"""
+    import matplotlib.pyplot as plt
+
+    # Create figure with subplots
+    fig, axes = plt.subplots(2, 2, figsize=(20, 16))
+    fig.suptitle('Model Performance Comparison', fontsize=20, fontweight='bold')
+
+    # 1. Latency by Model and Hour
+    inputs['model_hour_latency'].plot(kind='bar', ax=axes[0, 0], width=0.8)
+    axes[0, 0].set_title('Average Latency by Model and Hour', fontsize=16, fontweight='bold')
+    axes[0, 0].set_xlabel('Model')
+    axes[0, 0].set_ylabel('Average Latency (ms)')
+    axes[0, 0].legend(title='Hour', bbox_to_anchor=(1.05, 1), loc='upper left')
+    axes[0, 0].tick_params(axis='x', rotation=45)
+
+    # 2. Response Length by Model and Hour
+    inputs['model_hour_response'].plot(kind='bar', ax=axes[0, 1], width=0.8)
+    axes[0, 1].set_title('Average Response Length by Model and Hour', fontsize=16, fontweight='bold')
+    axes[0, 1].set_xlabel('Model')
+    axes[0, 1].set_ylabel('Average Response Length (chars)')
+    axes[0, 1].legend(title='Hour', bbox_to_anchor=(1.05, 1), loc='upper left')
+    axes[0, 1].tick_params(axis='x', rotation=45)
+
+    # 3. Model Performance Distribution (Box Plot from precomputed statistics)
+    axes[1, 0].bxp(inputs['box_latency'])
+    axes[1, 0].set_title('Latency Distribution by Model', fontsize=16, fontweight='bold')
+    axes[1, 0].set_xlabel('Model')
+    axes[1, 0].set_ylabel('Latency (ms)')
+
+    # 4. Model Performance Distribution (Box Plot from precomputed statistics)
+    axes[1, 1].bxp(inputs['box_response'])
+    axes[1, 1].set_title('Response Length Distribution by Model', fontsize=16, fontweight='bold')
+    axes[1, 1].set_xlabel('Model')
+    axes[1, 1].set_ylabel('Response Length (chars)')
+
+    return fig
+
+
+# Figure name -> (renderer, output file)
+FIGURES = {
+    'per_prompt_time_series': (render_per_prompt_time_series, 'per_prompt_latency_time_series.png'),
+    'prompt_comparison_matrix': (render_prompt_comparison_matrix, 'prompt_comparison_matrix.png'),
+    'hourly_analysis': (render_hourly_analysis, 'hourly_performance_analysis.png'),
+    'daily_analysis': (render_daily_analysis, 'daily_performance_analysis.png'),
+    'heatmaps': (render_heatmaps, 'performance_heatmaps.png'),
+    'tail_latency_analysis': (render_tail_latency_analysis, 'tail_latency_analysis.png'),
+    'model_comparison': (render_model_comparison, 'model_comparison_analysis.png'),
+}
+
+
+def _time_series_grid(num_prompts):
+    """(rows, columns) of one page of the per-prompt time series"""
+    cols = min(PAGE_COLUMNS, num_prompts)
+    return min(PAGE_ROWS, (num_prompts + cols - 1) // cols), cols
+
+
+def _time_series_pages(inputs):
+    """Split the per-prompt time series into pages of one fixed grid of prompts"""
+    prompts = inputs['prompts']
+    per_page = PAGE_ROWS * PAGE_COLUMNS
+    pages = max(1, (len(prompts) + per_page - 1) // per_page)
+    grid = _time_series_grid(len(prompts))
+    return [dict(inputs, prompts=prompts[i*per_page:(i+1)*per_page], grid=grid, page=i + 1, pages=pages)
+            for i in range(pages)]
+
+
+def _matrix_pages(inputs):
+    """Tile the comparison matrix heatmaps into pages of prompt rows, colored on one scale across pages"""
+    tables = {key: inputs[key] for key in MATRIX_TABLES}
+    num_prompts = len(tables['latency'])
+    pages = max(1, (num_prompts + MATRIX_ROWS_PER_PAGE - 1) // MATRIX_ROWS_PER_PAGE)
+    if pages == 1:
+        return [tables]
+
+    ranges = {key: (float(table.min().min()), float(table.max().max())) for key, table in tables.items()}
+    pages_inputs = []
+    for i in range(pages):
+        rows = slice(i * MATRIX_ROWS_PER_PAGE, (i + 1) * MATRIX_ROWS_PER_PAGE)
+        page = {key: table.iloc[rows] for key, table in tables.items()}
+        pages_inputs.append(dict(page, ranges=ranges, page=i + 1, pages=pages))
+    return pages_inputs
+
+
+# Figure name -> function splitting its inputs into the inputs of each page
+PAGINATED = {
+    'per_prompt_time_series': _time_series_pages,
+    'prompt_comparison_matrix': _matrix_pages,
+}
+
+
+def figure_pages(name, inputs):
+    """Inputs of each page of a figure; figures that are not paginated have a single page"""
+    paginate = PAGINATED.get(name)
+    return paginate(inputs) if paginate else [inputs]
+
+
+def describe_paths(paths, quote="'"):
+    """Name the files of a rendered figure in progress messages, first and last page for several"""
+    if len(paths) == 1:
+        return f"{quote}{paths[0]}{quote}"
+    return f"{quote}{paths[0]}{quote} ... {quote}{paths[-1]}{quote} ({len(paths)} pages)"
+
+
+def _draw_page(render, inputs, settings, target, show=False):
+    """Draw one page, save it to a path or a PdfPages and close it before the next page is drawn"""
+    import matplotlib.pyplot as plt
+
+    setup_style()
+    fig = render(inputs, settings)
+    fig.tight_layout()
+
+    if isinstance(target, str):
+        fig.savefig(target, dpi=settings['dpi'], bbox_inches='tight')
+    else:
+        target.savefig(fig, dpi=settings['dpi'], bbox_inches='tight')
+    if show:
+        plt.show()
+    plt.close(fig)
+
+
+def _remove_stale_pages(output_dir, stem, paths):
+    """Delete files of a figure left by an earlier run with more or fewer pages or the other page format"""
+    candidates = glob.glob(os.path.join(output_dir, f"{stem}_page*.png"))
+    candidates += [os.path.join(output_dir, f"{stem}.png"), os.path.join(output_dir, f"{stem}.pdf")]
+    for old in candidates:
+        if old not in paths and os.path.exists(old):
+            os.remove(old)
+
+
+def render_figure(name, inputs, profile=DEFAULT_PROFILE, output_dir='.', show=False, cache_dir=None,
+                  page_format=DEFAULT_PAGE_FORMAT):
+    """Render one figure from its aggregated inputs, save it and return the paths written
+
+    A figure with several pages is written page by page, as `<name>_pageNNN.png`
+    files or as one `<name>.pdf`, with each page's memory released once it is
+    saved. With a `cache_dir`, a file rendered before from identical inputs is
+    copied from the cache instead; figures that are shown are always drawn.
+    """
+    settings = PROFILES[profile]
+    render, filename = FIGURES[name]
+    stem = os.path.splitext(filename)[0]
+    pages = figure_pages(name, inputs)
+    use_cache = bool(cache_dir) and not show
+
+    if page_format == 'pdf':
+        # Every page goes into one file, which is cached as a whole
+        path = os.path.join(output_dir, f"{stem}.pdf")
+        cached = os.path.join(cache_dir, f"{stem}-{figure_key(name, pages, profile)}.pdf") if use_cache else None
+        if cached and os.path.exists(cached):
+            shutil.copyfile(cached, path)
+            _remove_stale_pages(output_dir, stem, [path])
+            print(f"♻️  {name} unchanged, copied from the render cache")
+            return [path]
+
+        from matplotlib.backends.backend_pdf import PdfPages
+
+        with PdfPages(path) as pdf:
+            for page in pages:
+                _draw_page(render, page, settings, pdf, show)
+        if cached:
+            _store_render(path, cached)
+        _remove_stale_pages(output_dir, stem, [path])
+        return [path]
+
+    if len(pages) == 1:
+        paths = [os.path.join(output_dir, filename)]
+    else:
+        paths = [os.path.join(output_dir, f"{stem}_page{n:03d}.png") for n in range(1, len(pages) + 1)]
+
+    # Pages are cached one by one, so a new prompt only redraws the pages it shifts
+    copied = 0
+    for page, path in zip(pages, paths):
+        stem_of_page = os.path.splitext(os.path.basename(path))[0]
+        cached = os.path.join(cache_dir, f"{stem_of_page}-{figure_key(name, page, profile)}.png") if use_cache else None
+        if cached and os.path.exists(cached):
+            shutil.copyfile(cached, path)
+            copied += 1
+            continue
+        _draw_page(render, page, settings, path, show)
+        if cached:
+            _store_render(path, cached)
+    _remove_stale_pages(output_dir, stem, paths)
+
+    if copied == len(paths):
+        print(f"♻️  {name} unchanged, copied from the render cache")
+    elif copied:
+        print(f"♻️  {name}: {copied} of {len(paths)} pages unchanged, copied from the render cache")
+    return paths
+
+
+def _hash_value(hasher, value):
+    """Feed a figure input (tables, arrays, containers and scalars) into a hash, in a stable order"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        if isinstance(value, pd.DataFrame):
+            labels, dtypes = list(value.columns), [str(dtype) for dtype in value.dtypes]
+        else:
+            labels, dtypes = [value.name], [str(value.dtype)]
+        hasher.update(repr((type(value).__name__, value.shape, labels, dtypes, list(value.index.names))).encode())
+        # Row hashes cover the index too, so the order rows are drawn in is part of the key
+        hasher.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        hasher.update(repr((value.dtype.str, value.shape)).encode())
+        hasher.update(value.tobytes() if value.dtype != object else repr(value.tolist()).encode())
+    elif isinstance(value, dict):
+        hasher.update(b'{')
+        for key in sorted(value, key=str):
+            hasher.update(repr(key).encode())
+            _hash_value(hasher, value[key])
+        hasher.update(b'}')
+    elif isinstance(value, (list, tuple)):
+        hasher.update(b'[')
+        for item in value:
+            _hash_value(hasher, item)
+        hasher.update(b']')
+    else:
+        hasher.update(repr(value).encode())
+
+
+def _package_version(name):
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+
+def figure_key(name, inputs, profile=DEFAULT_PROFILE):
+    """Content hash identifying a rendered figure
+
+    Covers the figure's aggregated inputs, the render profile and style, the
+    matplotlib and seaborn versions and the source of this module, so editing
+    any renderer invalidates what it drew before.
+    """
+    hasher = hashlib.sha256()
+    _hash_value(hasher, {
+        'figure': name,
+        'profile': PROFILES[profile],
+        'style': (STYLE, PALETTE),
+        'versions': (_package_version('matplotlib'), _package_version('seaborn')),
+        'renderer': inspect.getsource(sys.modules[__name__]),
+    })
+    _hash_value(hasher, inputs)
+    return hasher.hexdigest()[:32]
+
+
+def _store_render(path, cached):
+    """Copy a fresh render into the cache and drop the oldest renders of the same output file"""
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    shutil.copyfile(path, cached + '.tmp')
+    os.replace(cached + '.tmp', cached)
+
+    base, ext = os.path.splitext(os.path.basename(cached))
+    stem = base.rsplit('-', 1)[0]
+    renders = sorted(glob.glob(os.path.join(os.path.dirname(cached), f"{stem}-*{ext}")), key=os.path.getmtime)
+    for old in renders[:-MAX_CACHED_RENDERS]:
+        os.remove(old)
+
+
+def _init_worker():
+    import matplotlib
+
+    # Workers never display anything; Agg avoids touching any GUI toolkit
+    matplotlib.use('Agg')
+
+
+def render_figures_parallel(jobs, profile=DEFAULT_PROFILE, output_dir='.', max_workers=None, cache_dir=None,
+                            page_format=DEFAULT_PAGE_FORMAT):
+    """Render (name, inputs) jobs concurrently in worker processes
+
+    Yields (name, paths) pairs as each figure finishes.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as pool:
+        futures = {
+            pool.submit(render_figure, name, inputs, profile, output_dir, False, cache_dir, page_format): name
+            for name, inputs in jobs
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
@@ -0,0 +1,390 @@
+"""
+Streaming loader for the monitor CSV written by api_tester.js
+
+The monitor file carries a large free-text `response` column on every row.
+Reading it chunk by chunk with a column projection keeps only the fields the
+analyzers use, so peak memory is bounded by one chunk rather than by the
+whole object.
+
+Row filters (time window, prompts, models, categories) are applied to each
+chunk as it is parsed, so only the surviving rows are ever concatenated into
+the final frame.
+
+Every column is converted to the dtype declared in MONITOR_SCHEMA: categoricals
+for the low-cardinality strings, nullable int32 for counts, real booleans for
+the flags written by csv-stringify ("1" / ""), and UTC timestamps.
+
+Monitor files from different versions of api_tester.js carry different
+columns. Each parsed row notes its file's generation (see GENERATION_COLUMNS),
+and frames of different generations are concatenated with the columns one
+lacks filled with typed nulls, so they combine into a single typed frame.
+"""
+
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from monitor_timing import NULL_TIMER
+
+# Columns the analyzers actually use; everything else is dropped while parsing
+ANALYSIS_COLUMNS = [
+    'timestamp', 'promptId', 'category', 'model', 'latencyMs', 'success',
+    'promptTokens', 'completionTokens', 'totalTokens', 'responseLength', 'generation',
+]
+
+# Declared dtypes of the columns api_tester.js writes (free-text columns are never parsed)
+MONITOR_SCHEMA = {
+    'timestamp': 'datetime64[ns, UTC]',
+    'promptId': 'category',
+    'category': 'category',
+    'model': 'category',
+    'latencyMs': 'float64',
+    'success': 'bool',
+    'finishReason': 'category',
+    'promptTokens': 'Int32',
+    'completionTokens': 'Int32',
+    'totalTokens': 'Int32',
+    'cachedTokens': 'Int32',
+    'audioTokensPrompt': 'Int32',
+    'reasoningTokens': 'Int32',
+    'audioTokensCompletion': 'Int32',
+    'acceptedPredictionTokens': 'Int32',
+    'rejectedPredictionTokens': 'Int32',
+    'responseLength': 'Int32',
+    'hasRefusal': 'bool',
+    'annotationsCount': 'Int32',
+    'avgLogprob': 'float64',
+    'hasLogprobs': 'bool',
+    'serviceTier': 'category',
+    'errorType': 'category',
+    # Not in the file: the monitor file generation the row was read from
+    'generation': 'category',
+}
+
+# Columns each generation of monitor files added, oldest first. The original
+# monitor_data.csv (v1) predates the token breakdown, logprob and service-tier
+# fields that api_tester.js writes to monitor-v2.csv.
+GENERATION_COLUMNS = {
+    'v1': ['timestamp', 'promptId', 'category', 'model', 'latencyMs', 'success', 'promptTokens',
+           'completionTokens', 'totalTokens', 'responseLength'],
+    'v2': ['cachedTokens', 'audioTokensPrompt', 'reasoningTokens', 'audioTokensCompletion',
+           'acceptedPredictionTokens', 'rejectedPredictionTokens', 'hasRefusal', 'refusalContent',
+           'annotationsCount', 'avgLogprob', 'hasLogprobs', 'serviceTier', 'responseId', 'createdAt'],
+}
+GENERATIONS = list(GENERATION_COLUMNS)
+
+# Columns a monitor frame cannot be analysed without
+REQUIRED_COLUMNS = ['timestamp', 'promptId', 'model', 'latencyMs']
+
+CATEGORY_COLUMNS = [col for col, dtype in MONITOR_SCHEMA.items() if dtype == 'category']
+INT_COLUMNS = [col for col, dtype in MONITOR_SCHEMA.items() if dtype == 'Int32']
+FLOAT_COLUMNS = [col for col, dtype in MONITOR_SCHEMA.items() if dtype == 'float64']
+BOOL_COLUMNS = [col for col, dtype in MONITOR_SCHEMA.items() if dtype == 'bool']
+
+# csv-stringify writes true as "1" and false as an empty field
+TRUE_VALUES = [True, 1, '1', 'true', 'True']
+
+# api_tester.js writes `new Date().toISOString()`, e.g. 2025-06-01T09:30:00.000Z
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+# Rows parsed per chunk; a chunk is converted and filtered before the next one is read
+DEFAULT_CHUNK_ROWS = 50_000
+
+# Filter key -> column it selects on
+FILTER_COLUMNS = {'prompts': 'promptId', 'models': 'model', 'categories': 'category'}
+
+RELATIVE_TIME = re.compile(r'^(\d+)\s*(m|h|d|w)$')
+RELATIVE_UNITS = {'m': 'min', 'h': 'h', 'd': 'D', 'w': 'W'}
+
+
+def _parse_time(value, end_of_day=False):
+    """Parse a filter bound into a UTC timestamp
+
+    Accepts timestamps, ISO strings and relative windows such as `24h` or `7d`
+    (meaning that long before now). A bare date used as an upper bound covers
+    the whole day.
+    """
+    if value is None:
+        return None
+    text = str(value).strip()
+    match = RELATIVE_TIME.match(text)
+    if match:
+        return pd.Timestamp.now(tz='UTC') - pd.Timedelta(int(match.group(1)), unit=RELATIVE_UNITS[match.group(2)])
+
+    ts = pd.Timestamp(value)
+    ts = ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+    if end_of_day and len(text) == 10:
+        ts = ts + pd.Timedelta(days=1) - pd.Timedelta(1, unit='ns')
+    return ts
+
+
+def make_filters(since=None, until=None, prompts=None, models=None, categories=None):
+    """Normalise row filters into a dict, or None when nothing is filtered
+
+    `since` and `until` are inclusive bounds; the value lists select rows whose
+    column matches any of the given values.
+    """
+    filters = {
+        'since': _parse_time(since),
+        'until': _parse_time(until, end_of_day=True),
+        'prompts': list(prompts) if prompts else None,
+        'models': list(models) if models else None,
+        'categories': list(categories) if categories else None,
+    }
+    filters = {name: value for name, value in filters.items() if value is not None}
+    return filters or None
+
+
+def filter_columns(filters):
+    """Columns that must be parsed to evaluate the filters"""
+    columns = [column for name, column in FILTER_COLUMNS.items() if name in (filters or {})]
+    if filters and ('since' in filters or 'until' in filters):
+        columns.append('timestamp')
+    return columns
+
+
+def value_mask(chunk, filters):
+    """Boolean mask of rows matching the prompt, model and category filters"""
+    mask = pd.Series(True, index=chunk.index)
+    for name, column in FILTER_COLUMNS.items():
+        if name in filters:
+            if column not in chunk.columns:
+                return pd.Series(False, index=chunk.index)
+            mask &= chunk[column].isin(filters[name])
+    return mask
+
+
+def time_mask(timestamps, filters):
+    """Boolean mask of parsed UTC timestamps inside the [since, until] window"""
+    mask = pd.Series(True, index=timestamps.index)
+    if 'since' in filters:
+        mask &= timestamps >= filters['since']
+    if 'until' in filters:
+        mask &= timestamps <= filters['until']
+    return mask
+
+
+def apply_filters(df, filters):
+    """Filter an already parsed frame"""
+    if not filters or len(df) == 0:
+        return df
+    mask = value_mask(df, filters)
+    if 'timestamp' in df.columns:
+        mask &= time_mask(df['timestamp'], filters)
+    return df[mask].reset_index(drop=True)
+
+
+def detect_generation(header):
+    """The newest generation whose columns (and those of every earlier one) all appear in a file header"""
+    header = set(header)
+    generation = GENERATIONS[0]
+    for name, added in GENERATION_COLUMNS.items():
+        if not header.issuperset(added):
+            break
+        generation = name
+    return generation
+
+
+def generation_column(generation, n):
+    """A categorical column of n rows that all came from one generation"""
+    return pd.Categorical.from_codes(np.full(n, GENERATIONS.index(generation), dtype='int8'), GENERATIONS)
+
+
+def null_column(col, n):
+    """A column of n nulls in the declared dtype; flags, which cannot be null, read as False"""
+    dtype = MONITOR_SCHEMA.get(col, 'object')
+    if dtype == 'bool':
+        return np.zeros(n, dtype=bool)
+    return pd.Series(index=range(n), dtype=dtype)
+
+
+def parquet_filters(filters, schema_columns):
+    """Translate row filters into pyarrow predicates on the columns a Parquet file holds"""
+    predicates = []
+    if 'since' in filters:
+        predicates.append(('timestamp', '>=', filters['since']))
+    if 'until' in filters:
+        predicates.append(('timestamp', '<=', filters['until']))
+    for name, column in FILTER_COLUMNS.items():
+        if name in filters:
+            predicates.append((column, 'in', filters[name]))
+    predicates = [p for p in predicates if p[0] in schema_columns]
+    return predicates or None
+
+
+def parse_timestamps(values):
+    """Parse ISO-8601 timestamps to UTC, using the fixed toISOString format when every value fits it"""
+    try:
+        parsed = pd.to_datetime(values, format=TIMESTAMP_FORMAT, utc=True)
+    except (ValueError, TypeError):
+        # Hand-written or older rows: any ISO-8601 variant, still without per-value format guessing
+        parsed = pd.to_datetime(values, format='ISO8601', utc=True)
+    return parsed.dt.as_unit('ns')
+
+
+def empty_frame(columns=ANALYSIS_COLUMNS):
+    """An empty frame with the requested columns in their declared dtypes"""
+    return pd.DataFrame({col: pd.Series(dtype=MONITOR_SCHEMA.get(col, 'object')) for col in columns})
+
+
+def conform_frame(df):
+    """Convert columns of an already typed frame (e.g. read from Arrow) to their declared dtypes
+
+    Columns that already have their declared dtype are left untouched, so
+    buffers shared with the source are not copied.
+    """
+    for col in df.columns:
+        expected = MONITOR_SCHEMA.get(col)
+        if expected is None or str(df[col].dtype) == expected:
+            continue
+        if col == 'timestamp':
+            if pd.api.types.is_datetime64_any_dtype(df[col]):
+                values = df[col].dt.tz_localize('UTC') if df[col].dt.tz is None else df[col].dt.tz_convert('UTC')
+                df[col] = values.dt.as_unit('ns')
+            else:
+                df[col] = parse_timestamps(df[col])
+        elif col in INT_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors='coerce').round().astype('Int32')
+        elif col in BOOL_COLUMNS and not pd.api.types.is_bool_dtype(df[col]):
+            df[col] = df[col].isin(TRUE_VALUES)
+        else:
+            df[col] = df[col].astype(expected)
+    return df
+
+
+def validate_frame(df):
+    """Check a parsed frame against MONITOR_SCHEMA, raising ValueError on any mismatch"""
+    problems = [f"missing column '{col}'" for col in REQUIRED_COLUMNS if col not in df.columns]
+    for col in df.columns:
+        expected = MONITOR_SCHEMA.get(col)
+        if expected is not None and str(df[col].dtype) != expected:
+            problems.append(f"column '{col}' is {df[col].dtype}, expected {expected}")
+    if 'timestamp' in df.columns and df['timestamp'].isna().any():
+        problems.append("column 'timestamp' has missing values")
+
+    if problems:
+        raise ValueError(f"Monitor data does not match the expected schema: {'; '.join(problems)}")
+    return df
+
+
+def concat_frames(frames):
+    """Concatenate typed frames, unioning columns and categories so every dtype survives the concat
+
+    A column some frames lack (e.g. one only newer monitor files have) is
+    filled with typed nulls in those frames rather than turning into object.
+    """
+    frames = [frame for frame in frames if len(frame) > 0] or frames[:1]
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+
+    columns = list(dict.fromkeys(col for frame in frames for col in frame.columns))
+    frames = [frame if len(frame.columns) == len(columns) else
+              frame.reset_index(drop=True).assign(**{col: null_column(col, len(frame))
+                                                     for col in columns if col not in frame.columns})[columns]
+              for frame in frames]
+
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            categories = pd.Index([])
+            for frame in frames:
+                # Columns filled with nulls have no categories of their own to contribute
+                if len(frame[col].cat.categories):
+                    categories = categories.union(frame[col].cat.categories)
+            frames = [frame.assign(**{col: frame[col].cat.set_categories(categories)}) for frame in frames]
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def _compact_chunk(chunk, successful_only, filters=None):
+    """Filter and type a single parsed chunk so only compact columns are kept
+
+    Dtypes are fixed regardless of what a chunk happens to contain, so frames
+    parsed from different slices of the object can be concatenated or cached
+    side by side. Cheap equality filters run before any column is converted.
+    """
+    if filters:
+        chunk = chunk[value_mask(chunk, filters)]
+
+    for col in BOOL_COLUMNS:
+        if col in chunk.columns:
+            chunk[col] = chunk[col].isin(TRUE_VALUES)
+
+    if successful_only and 'success' in chunk.columns:
+        chunk = chunk[chunk['success']]
+
+    for col in FLOAT_COLUMNS:
+        if col in chunk.columns:
+            chunk[col] = pd.to_numeric(chunk[col], errors='coerce').astype('float64')
+
+    for col in INT_COLUMNS:
+        if col in chunk.columns:
+            chunk[col] = pd.to_numeric(chunk[col], errors='coerce').round().astype('Int32')
+
+    if 'timestamp' in chunk.columns:
+        chunk['timestamp'] = parse_timestamps(chunk['timestamp'])
+        if filters:
+            chunk = chunk[time_mask(chunk['timestamp'], filters)]
+
+    return chunk
+
+
+def read_monitor_csv(source, columns=ANALYSIS_COLUMNS, chunk_rows=DEFAULT_CHUNK_ROWS, successful_only=True,
+                     filters=None, timer=NULL_TIMER):
+    """Parse a monitor CSV from a path or binary stream, one chunk at a time
+
+    `source` may be anything `pd.read_csv` accepts, including the streaming
+    `Body` of an S3 `get_object` response, so the raw object is never held in
+    memory as a whole. `filters` (see make_filters) are applied per chunk.
+    With a StageTimer, time is split into `load/fetch` (reading bytes),
+    `load/parse` (decoding and tokenizing) and `load/coerce` (typing and
+    filtering) across all chunks. A requested `generation` column records
+    which generation of monitor file the header identifies.
+    """
+    if timer is not NULL_TIMER:
+        source = timer.reader(source, 'load/fetch')
+    wanted = set(columns) | set(filter_columns(filters))
+    if successful_only:
+        # Failed runs are dropped even when the caller never asked for the flag
+        wanted.add('success')
+    header = []
+
+    def use_column(col):
+        header.append(col)
+        return col in wanted
+
+    # Low-cardinality strings are parsed straight into categoricals, never as object columns
+    reader = pd.read_csv(source, usecols=use_column,
+                         dtype={col: 'category' for col in CATEGORY_COLUMNS if col in wanted},
+                         chunksize=chunk_rows, encoding='utf-8')
+
+    chunks = []
+    for chunk in timer.iterate(reader, 'load/parse', exclude=source if timer is not NULL_TIMER else None):
+        start = time.perf_counter()
+        chunk = _compact_chunk(chunk, successful_only, filters)
+        chunks.append(chunk[[col for col in columns if col in chunk.columns]])
+        timer.add('load/coerce', time.perf_counter() - start, rows=len(chunk))
+
+    if not chunks:
+        return empty_frame(columns)
+
+    df = concat_frames(chunks)
+    if 'generation' in columns:
+        df['generation'] = generation_column(detect_generation(header), len(df))
+        df = df[[col for col in columns if col in df.columns]]
+    return validate_frame(df)
+
+
+def read_monitor_response(response, **kwargs):
+    """Parse the body of an S3 `get_object` response and always release the connection"""
+    body = response['Body']
+    try:
+        return read_monitor_csv(body, **kwargs)
+    finally:
+        body.close()
+
+
+def read_monitor_object(s3_client, bucket, key, **kwargs):
+    """Stream a monitor CSV straight from S3 into a compact DataFrame"""
+    return read_monitor_response(s3_client.get_object(Bucket=bucket, Key=key), **kwargs)
@@ -0,0 +1,253 @@
+"""
+Materialized daily rollups of the monitor data
+
+A finished day's statistics never change, yet every report re-aggregated the
+raw rows from the start of monitoring. The rollup store keeps, per completed
+day, that day's slice of the aggregate tables as small Parquet files:
+
+    <root>/monitor_<digest>/manifest.json
+    <root>/monitor_<digest>/date=YYYY-MM-DD/cube.parquet
+    <root>/monitor_<digest>/date=YYYY-MM-DD/latency_sketches.parquet
+    <root>/monitor_<digest>/date=YYYY-MM-DD/length_sketches.parquet
+
+The cube slice holds the count, sum, sum of squares, min and max of every
+metric per (promptId, model, hour); the sketches are the latency and
+response-length histograms per (promptId, model, hour). The root is a local directory or an s3://bucket/prefix/.
+Days and hours depend on the report timezone, so each data source and
+timezone gets its own store directory. The manifest records the last day
+rolled up (`through`): every day up to it is covered, and days without data
+simply have no files.
+
+A report reads the rollups of the whole days inside its time window and
+aggregates raw rows only for the rest, i.e. the current day and a partial day
+at either edge of the window (see split_window). Days that completed since
+the last run are rolled up first from one load of their raw rows. Rows
+written into a day after it was rolled up (late writes, a rewritten object)
+are not picked up; delete the store directory to rebuild it.
+"""
+
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from monitor_download import DEFAULT_MAX_WORKERS
+from monitor_loader import FILTER_COLUMNS, apply_filters, concat_frames
+from monitor_sources import make_s3_client
+from monitor_stats import CUBE_KEYS, CUBE_METRICS, NS_PER_DAY, SKETCH_KEYS, SKETCH_RELATIVE_ACCURACY, day_dates
+
+# Response lengths feed the median and the per-hour and per-model box plots, so they are sketched per hour too
+LENGTH_SKETCH_KEYS = SKETCH_KEYS
+
+# Tables stored for every day, in the order they are passed around
+ROLLUP_TABLES = ['cube', 'latency_sketches', 'length_sketches']
+
+# Filters the rollups can answer; a category is not a key of the stored tables
+ROLLUP_FILTERS = ['since', 'until', 'prompts', 'models']
+
+ONE_NS = pd.Timedelta(1, unit='ns')
+
+
+def rollup_signature():
+    """Describe the layout of the stored tables; a store written with another one is rebuilt"""
+    return {'cube_keys': CUBE_KEYS, 'cube_metrics': CUBE_METRICS, 'sketch_keys': SKETCH_KEYS,
+            'length_sketch_keys': LENGTH_SKETCH_KEYS, 'sketch_accuracy': SKETCH_RELATIVE_ACCURACY}
+
+
+def local_day(timestamp, tz='UTC'):
+    """Epoch day a UTC timestamp falls on in `tz`, numbered as add_calendar_features numbers them"""
+    if tz and tz != 'UTC':
+        timestamp = timestamp.tz_convert(tz).tz_localize(None)
+    return timestamp.value // NS_PER_DAY
+
+
+def day_start(day, tz='UTC'):
+    """UTC timestamp at which epoch day `day` begins in `tz`"""
+    start = pd.Timestamp(day * NS_PER_DAY)
+    if tz and tz != 'UTC':
+        return start.tz_localize(tz, ambiguous=True, nonexistent='shift_forward').tz_convert('UTC')
+    return start.tz_localize('UTC')
+
+
+def current_day(tz='UTC'):
+    """Epoch day it currently is in `tz`; earlier days are complete"""
+    return local_day(pd.Timestamp.now(tz='UTC'), tz)
+
+
+def split_window(filters, through, tz='UTC'):
+    """Split a report's time window into whole stored days and the raw time ranges around them
+
+    Returns `(days, ranges)`. `days` is the (first, last) pair of stored days
+    the window covers entirely, with first None when the window is open at the
+    start, or None when it covers no stored day. `ranges` are the
+    (since, until) bounds, None for open, of the rows still aggregated raw.
+    """
+    since, until = (filters or {}).get('since'), (filters or {}).get('until')
+    if through is None:
+        return None, [(since, until)]
+
+    first = None
+    if since is not None:
+        first = local_day(since, tz)
+        if day_start(first, tz) < since:
+            first += 1
+    last = through
+    if until is not None:
+        # `until` is inclusive, so its day is whole only if the window reaches that day's last nanosecond
+        until_day = local_day(until, tz)
+        if until < day_start(until_day + 1, tz) - ONE_NS:
+            until_day -= 1
+        last = min(last, until_day)
+    if first is not None and first > last:
+        return None, [(since, until)]
+
+    ranges = []
+    if first is not None and since < day_start(first, tz):
+        ranges.append((since, day_start(first, tz) - ONE_NS))
+    after = day_start(last + 1, tz)
+    if until is None or until >= after:
+        ranges.append((after, until))
+    return (first, last), ranges
+
+
+def _iso_day(day):
+    return day_dates(day).date().isoformat()
+
+
+def _epoch_day(iso):
+    return pd.Timestamp(iso).value // NS_PER_DAY
+
+
+class RollupStore:
+    """Daily rollups of one data source in one timezone, under a local directory or an S3 prefix"""
+
+    def __init__(self, location, source, timezone='UTC', max_workers=DEFAULT_MAX_WORKERS, s3_client=None):
+        self.location = location
+        self.source_name = str(source)
+        self.timezone = timezone
+        self.max_workers = max_workers
+        self._s3_client = s3_client
+
+        # Source names contain slashes and spaces, so the directory name is derived from a digest
+        digest = hashlib.sha1(f"{self.source_name}|{timezone}".encode('utf-8')).hexdigest()[:16]
+        if location.startswith('s3://'):
+            self.bucket, _, prefix = location[len('s3://'):].partition('/')
+            self.root = '/'.join(part for part in (prefix.strip('/'), f"monitor_{digest}") if part)
+        else:
+            self.bucket = None
+            self.root = os.path.join(location, f"monitor_{digest}")
+
+    def __str__(self):
+        return f"rollups in {self.location}"
+
+    @property
+    def s3_client(self):
+        """The S3 client, created on first use so local stores never import boto3"""
+        if self._s3_client is None:
+            self._s3_client = make_s3_client(max_pool_connections=self.max_workers)
+        return self._s3_client
+
+    def _read(self, name):
+        """Bytes of a stored file, or None when it does not exist"""
+        if self.bucket is None:
+            try:
+                with open(os.path.join(self.root, name), 'rb') as f:
+                    return f.read()
+            except FileNotFoundError:
+                return None
+
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=f"{self.root}/{name}")
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise
+        body = response['Body']
+        try:
+            return body.read()
+        finally:
+            body.close()
+
+    def _write(self, name, data):
+        if self.bucket is not None:
+            self.s3_client.put_object(Bucket=self.bucket, Key=f"{self.root}/{name}", Body=data)
+            return
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+    def load_manifest(self):
+        """Return the manifest, or None when nothing usable is stored"""
+        data = self._read('manifest.json')
+        if data is None:
+            return None
+        try:
+            manifest = json.loads(data)
+        except ValueError:
+            return None
+        if (manifest.get('source') != self.source_name or manifest.get('timezone') != self.timezone
+                or manifest.get('signature') != rollup_signature()):
+            return None
+        return manifest
+
+    def through(self):
+        """Last day every day up to which is rolled up, or None when the store is empty"""
+        manifest = self.load_manifest()
+        return _epoch_day(manifest['through']) if manifest else None
+
+    def write_days(self, cube, latency_sketches, length_sketches, through):
+        """Store each day's slice of the tables and mark every day up to `through` as rolled up
+
+        Returns the number of days with data that were written.
+        """
+        manifest = self.load_manifest()
+        stored = set(manifest['days']) if manifest else set()
+        days = sorted(int(day) for day in cube['date'].unique() if day <= through)
+
+        def write_day(day):
+            for name, table in zip(ROLLUP_TABLES, (cube, latency_sketches, length_sketches)):
+                buffer = io.BytesIO()
+                table[table['date'] == day].to_parquet(buffer, index=False)
+                self._write(f"date={_iso_day(day)}/{name}.parquet", buffer.getvalue())
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            list(pool.map(write_day, days))
+
+        # The manifest goes last, so a failed run leaves the new days to be rolled up again
+        self._write('manifest.json', json.dumps({
+            'source': self.source_name,
+            'timezone': self.timezone,
+            'signature': rollup_signature(),
+            'through': _iso_day(through),
+            'days': sorted(stored | {_iso_day(day) for day in days}),
+        }, indent=2).encode('utf-8'))
+        return len(days)
+
+    def read_days(self, first, last, filters=None):
+        """The stored tables of days first..last (first None for every day up to last), filtered by prompt and model
+
+        Returns the three tables and the number of days that had data.
+        """
+        manifest = self.load_manifest() or {'days': []}
+        days = [iso for iso in manifest['days']
+                if (first is None or _epoch_day(iso) >= first) and _epoch_day(iso) <= last]
+        # Only the value filters apply; the days were chosen to lie inside the time window
+        value_filters = {name: filters[name] for name in FILTER_COLUMNS if name in (filters or {})}
+
+        def read_day(iso):
+            return [apply_filters(pd.read_parquet(io.BytesIO(self._read(f"date={iso}/{name}.parquet"))),
+                                  value_filters)
+                    for name in ROLLUP_TABLES]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            parts = list(pool.map(read_day, days))
+        if not parts:
+            return None, 0
+        return [concat_frames([part[i] for part in parts]) for i in range(len(ROLLUP_TABLES))], len(days)
@@ -0,0 +1,344 @@
+"""
+Where monitor data is read from
+
+Every analyzer loads its rows through a data source with one `load(filters)`
+method, so the same report can run against:
+
+- S3 (`S3Source`): the objects named by S3_KEY (one key or a comma-separated
+  list), or every object under S3_PREFIX. Under a prefix with Hive-style date
+  partitions such as `monitor/date=YYYY-MM-DD/*.csv`, partitions are pruned
+  against the requested date window before any object is listed, so a 7-day
+  report touches 7 partitions regardless of how much history exists. Several
+  objects are downloaded concurrently over one shared, pooled boto3 client
+  and combined into one typed frame even when they come from different
+  generations of the monitor file (see monitor_loader.GENERATION_COLUMNS);
+- a local CSV (`CSVSource`), e.g. a synced copy of the S3 object, cached like
+  an S3 object so a run parses only the rows appended since the last one and
+  reads only the cached row groups inside its time window;
+- a local Arrow IPC / Feather file or Parquet file or directory
+  (`ArrowSource`). The file is memory-mapped: IPC buffers become the
+  DataFrame's columns without being copied wherever the dtypes allow, so
+  opening even years of history takes milliseconds and pages are only read
+  when a column is used;
+- generated data (`SyntheticSource`), as used by the demo.
+
+`open_source` picks the source from a location string or MONITOR_SOURCE.
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from monitor_cache import (DEFAULT_CACHE_DIR, ROW_GROUP_ROWS, MonitorCache, load_file_frame, load_monitor_frame,
+                           sync_file_cache)
+from monitor_download import DEFAULT_MAX_WORKERS
+from monitor_loader import (ANALYSIS_COLUMNS, apply_filters, concat_frames, conform_frame, empty_frame,
+                            filter_columns, parquet_filters, validate_frame)
+from monitor_timing import NULL_TIMER
+
+# Object read when S3_KEY is unset (api_tester.js writes monitor-v2.csv)
+DEFAULT_KEY = 'monitor_data.csv'
+
+PARTITION_PATTERN = re.compile(r'date=(\d{4}-\d{2}-\d{2})/$')
+
+# Local files read as Arrow IPC; other non-CSV files and directories are read as Parquet
+ARROW_SUFFIXES = ('.arrow', '.feather', '.ipc')
+
+
+def make_s3_client(max_pool_connections=DEFAULT_MAX_WORKERS):
+    """Create an S3 client whose connection pool can serve every worker thread at once"""
+    # boto3 is slow to import, so it is only loaded once a client is actually needed
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client('s3', region_name=os.getenv('AWS_REGION'),
+                        config=Config(max_pool_connections=max_pool_connections))
+
+
+def _empty_frame(columns=ANALYSIS_COLUMNS, **_):
+    """An empty typed frame with the requested columns, for windows that select no data"""
+    return empty_frame(columns)
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def list_date_partitions(s3_client, bucket, prefix):
+    """Return (date, partition prefix) pairs for each `date=YYYY-MM-DD/` directly under prefix
+
+    Only common prefixes are listed here, one entry per day, never the objects inside them.
+    """
+    if prefix and not prefix.endswith('/'):
+        prefix += '/'
+
+    partitions = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, Delimiter='/'):
+        for common in page.get('CommonPrefixes', []):
+            match = PARTITION_PATTERN.search(common['Prefix'])
+            if match:
+                partitions.append((date.fromisoformat(match.group(1)), common['Prefix']))
+
+    return sorted(partitions)
+
+
+def prune_partitions(partitions, since=None, until=None):
+    """Keep only partitions whose date falls inside the inclusive [since, until] window"""
+    since, until = _as_date(since), _as_date(until)
+    return [(day, partition) for day, partition in partitions
+            if (since is None or day >= since) and (until is None or day <= until)]
+
+
+def list_partition_keys(s3_client, bucket, partition):
+    """List the CSV objects stored in a single partition, or anywhere under a prefix"""
+    keys = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=partition):
+        keys.extend(obj['Key'] for obj in page.get('Contents', []) if obj['Key'].endswith('.csv'))
+    return keys
+
+
+def load_objects_frame(s3_client, bucket, keys, filters=None, max_workers=DEFAULT_MAX_WORKERS,
+                       cache_dir=DEFAULT_CACHE_DIR, **kwargs):
+    """Load several monitor objects concurrently into one typed frame
+
+    Each object goes through the ETag cache with the row filters pushed down.
+    Columns an older generation of the file lacks are filled with typed nulls,
+    and the `generation` column tells each row's file generation apart. A
+    large object gets the workers no other object is using for its byte ranges.
+    """
+    if not keys:
+        return _empty_frame(**kwargs)
+    if len(keys) == 1:
+        return load_monitor_frame(s3_client, bucket, keys[0], cache_dir=cache_dir, filters=filters,
+                                  max_workers=max_workers, **kwargs)
+
+    range_workers = max(1, max_workers // len(keys))
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(keys))) as pool:
+        frames = list(pool.map(
+            lambda key: load_monitor_frame(s3_client, bucket, key, cache_dir=cache_dir, filters=filters,
+                                           max_workers=range_workers, **kwargs),
+            keys,
+        ))
+    print(f"📥 Fetched {len(keys)} object(s) with up to {max_workers} concurrent downloads")
+    return concat_frames(frames)
+
+
+def load_partitioned_frame(s3_client, bucket, prefix, filters=None,
+                           max_workers=DEFAULT_MAX_WORKERS, cache_dir=DEFAULT_CACHE_DIR, **kwargs):
+    """Load every monitor object in the date partitions that overlap the filters' time window
+
+    Partitions outside [since, until] are never listed; the remaining row
+    filters are pushed down into each object's load. Each object goes through
+    the ETag cache, so finished days that have not changed are answered
+    locally after the first run. A prefix without date partitions (e.g. one
+    holding monitor_data.csv and monitor-v2.csv) has all its objects loaded.
+    """
+    filters = filters or {}
+    partitions = list_date_partitions(s3_client, bucket, prefix)
+    if not partitions:
+        keys = list_partition_keys(s3_client, bucket, prefix)
+        print(f"🗂️  {len(keys)} object(s) under {bucket}/{prefix}")
+        return load_objects_frame(s3_client, bucket, keys, filters=filters, max_workers=max_workers,
+                                  cache_dir=cache_dir, **kwargs)
+
+    partitions = prune_partitions(partitions, filters.get('since'), filters.get('until'))
+    print(f"🗂️  {len(partitions)} date partition(s) selected under {bucket}/{prefix}")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        key_lists = pool.map(lambda p: list_partition_keys(s3_client, bucket, p[1]), partitions)
+        keys = [key for key_list in key_lists for key in key_list]
+
+    return load_objects_frame(s3_client, bucket, keys, filters=filters, max_workers=max_workers,
+                              cache_dir=cache_dir, **kwargs)
+
+
+class S3Source:
+    """Monitor data on S3: one or more objects, or every object under a prefix when `prefix` is set
+
+    An empty prefix is the whole bucket; only `prefix=None` reads the keys.
+    """
+
+    def __init__(self, bucket, key=DEFAULT_KEY, prefix=None, cache_dir=DEFAULT_CACHE_DIR,
+                 max_workers=DEFAULT_MAX_WORKERS, s3_client=None):
+        self.bucket = bucket
+        self.keys = [key] if isinstance(key, str) else list(key or [])
+        self.prefix = prefix
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self._s3_client = s3_client
+
+    def __str__(self):
+        if self.prefix is not None:
+            return f"S3 prefix: {self.bucket}/{self.prefix}"
+        return f"S3: {self.bucket}/{','.join(self.keys)}"
+
+    @property
+    def s3_client(self):
+        """The pooled client, created on first use so local runs never import boto3"""
+        if self._s3_client is None:
+            self._s3_client = make_s3_client(max_pool_connections=self.max_workers)
+        return self._s3_client
+
+    def load(self, filters=None, **kwargs):
+        """Stream the objects (or reuse the ETag cache), or fetch those under the prefix inside the filters' window"""
+        if self.prefix is not None:
+            return load_partitioned_frame(self.s3_client, self.bucket, self.prefix, filters=filters,
+                                          max_workers=self.max_workers, cache_dir=self.cache_dir, **kwargs)
+        return load_objects_frame(self.s3_client, self.bucket, self.keys, filters=filters,
+                                  max_workers=self.max_workers, cache_dir=self.cache_dir, **kwargs)
+
+
+class CSVSource:
+    """A monitor CSV on local disk, cached as Parquet under `cache_dir` when one is given"""
+
+    def __init__(self, path, cache_dir=None):
+        self.path = path
+        self.cache_dir = cache_dir
+
+    def __str__(self):
+        return f"local CSV: {self.path}"
+
+    def cached_parts(self, timer=NULL_TIMER):
+        """Parquet parts holding every successful row of the file, brought up to date; None without a cache"""
+        if not self.cache_dir or not MonitorCache.available():
+            return None
+        return sync_file_cache(self.path, self.cache_dir, timer=timer).parts()
+
+    def load(self, filters=None, **kwargs):
+        """Parse the file in chunks like an S3 object, applying the filters per chunk, or read it through the cache"""
+        return load_file_frame(self.path, cache_dir=self.cache_dir, filters=filters, **kwargs)
+
+
+class ArrowSource:
+    """A local Arrow IPC file, or Parquet file or directory, read through a memory map"""
+
+    def __init__(self, path):
+        self.path = path
+        self.format = 'ipc' if path.lower().endswith(ARROW_SUFFIXES) else 'parquet'
+
+    def __str__(self):
+        return f"local {'Arrow IPC' if self.format == 'ipc' else 'Parquet'}: {self.path}"
+
+    def _read_table(self, columns, filters):
+        """The requested columns as an Arrow table; Parquet row groups outside the filters are skipped"""
+        import pyarrow as pa
+
+        if self.format == 'ipc':
+            import pyarrow.ipc
+
+            # Columns are views of the mapped file; nothing is read until a page is touched
+            table = pa.ipc.open_file(pa.memory_map(self.path)).read_all()
+            return table.select([col for col in columns if col in table.column_names])
+
+        import pyarrow.parquet as pq
+
+        names = pq.ParquetDataset(self.path).schema.names
+        predicates = parquet_filters(filters, names) if filters else None
+        return pq.read_table(self.path, columns=[col for col in columns if col in names],
+                             filters=predicates, memory_map=True)
+
+    def load(self, filters=None, columns=ANALYSIS_COLUMNS, successful_only=True, timer=NULL_TIMER, **_):
+        """Map the file and build the typed frame, copying only columns whose dtype has to change"""
+        wanted = list(dict.fromkeys(list(columns) + filter_columns(filters) + ['success']))
+        start = time.perf_counter()
+        table = self._read_table(wanted, filters)
+        timer.add('load/read', time.perf_counter() - start)
+
+        start = time.perf_counter()
+        # split_blocks keeps each column in its own block instead of consolidating (and copying) them
+        df = conform_frame(table.to_pandas(split_blocks=True))
+        if successful_only and 'success' in df.columns and not df['success'].all():
+            df = df[df['success']]
+        df = apply_filters(df, filters)
+        df = df[[col for col in columns if col in df.columns]].reset_index(drop=True)
+        timer.add('load/coerce', time.perf_counter() - start, rows=len(df))
+        return validate_frame(df)
+
+
+class SyntheticSource:
+    """Generated monitor data (see monitor_synth), for demos and offline runs"""
+
+    def __init__(self, rows=None, **options):
+        self.rows = rows
+        self.options = options
+
+    def __str__(self):
+        return f"synthetic data ({self.rows or 'default'} rows)"
+
+    def load(self, filters=None, columns=ANALYSIS_COLUMNS, successful_only=True, **_):
+        """Generate the rows, then select like any other source"""
+        from monitor_synth import DEFAULT_ROWS, generate_sample_data
+
+        df = generate_sample_data(self.rows or DEFAULT_ROWS, **self.options)
+        if successful_only:
+            df = df[df['success']]
+        df = apply_filters(df, filters)
+        return df[[col for col in columns if col in df.columns]].reset_index(drop=True)
+
+
+def open_source(location=None, cache_dir=DEFAULT_CACHE_DIR, max_workers=DEFAULT_MAX_WORKERS, s3_client=None):
+    """Data source for a location string
+
+    `s3://bucket/key` reads one object, `s3://bucket/key1,key2` several, and
+    `s3://bucket/prefix/` every object (or date partition) under the prefix;
+    a path ending in .csv is a local CSV, cached under `cache_dir` like an S3
+    object; .arrow, .feather and .ipc files are Arrow IPC; other files and
+    directories are Parquet; and `synthetic` or `synthetic:ROWS` generates
+    data. Without a location, MONITOR_SOURCE is used, and without that the S3
+    objects or prefix set by S3_BUCKET, S3_KEY (comma-separated for several)
+    and S3_PREFIX.
+    """
+    location = location or os.getenv('MONITOR_SOURCE')
+    if not location:
+        keys = [key.strip() for key in os.getenv('S3_KEY', DEFAULT_KEY).split(',') if key.strip()]
+        # An empty S3_PREFIX counts as unset; s3://bucket/ selects the whole bucket
+        return S3Source(os.getenv('S3_BUCKET'), keys, os.getenv('S3_PREFIX') or None,
+                        cache_dir=cache_dir, max_workers=max_workers, s3_client=s3_client)
+
+    if location.startswith('s3://'):
+        bucket, _, path = location[len('s3://'):].partition('/')
+        if not path or path.endswith('/'):
+            return S3Source(bucket, prefix=path, cache_dir=cache_dir, max_workers=max_workers, s3_client=s3_client)
+        return S3Source(bucket, key=path.split(','), cache_dir=cache_dir, max_workers=max_workers,
+                        s3_client=s3_client)
+
+    if location == 'synthetic' or location.startswith('synthetic:'):
+        rows = location.partition(':')[2]
+        return SyntheticSource(int(rows) if rows else None)
+
+    if not os.path.exists(location):
+        raise ValueError(f"Monitor data source '{location}' does not exist")
+    if location.lower().endswith('.csv'):
+        return CSVSource(location, cache_dir=cache_dir)
+    return ArrowSource(location)
+
+
+def write_arrow_file(df, path):
+    """Save a typed monitor frame as an uncompressed Arrow IPC file, or Parquet, for use as an ArrowSource
+
+    The format follows the extension as in open_source. IPC is written
+    uncompressed so readers can map its buffers instead of decoding them.
+    """
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp = f'{path}.tmp'
+    if path.lower().endswith(ARROW_SUFFIXES):
+        import pyarrow.ipc
+
+        with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=ROW_GROUP_ROWS)
+    else:
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, tmp, row_group_size=ROW_GROUP_ROWS)
+    os.replace(tmp, path)
+    return path
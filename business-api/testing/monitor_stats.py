@@ -0,0 +1,361 @@
+"""
+Sufficient-statistics cube for the monitor data
+
+One vectorized groupby pass over the raw rows records, per
+(promptId, model, date, hour, day_of_week_num) cell, the count, sum, sum of
+squares, min and max of each metric. Every chart and summary is then a cheap
+roll-up of that cube: means, standard deviations and coefficients of
+variation all follow from those five numbers, so aggregation stays a single
+O(N) pass no matter how many views are drawn from it.
+"""
+
+import numpy as np
+import pandas as pd
+
+CUBE_KEYS = ['promptId', 'model', 'date', 'hour', 'day_of_week_num']
+CUBE_METRICS = ['latencyMs', 'responseLength', 'totalTokens']
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+NS_PER_HOUR = 3_600 * 10**9
+NS_PER_DAY = 24 * NS_PER_HOUR
+
+# 1970-01-01 was a Thursday, i.e. weekday 3 counting Monday as 0
+EPOCH_WEEKDAY = 3
+
+
+def add_calendar_features(df, tz='UTC'):
+    """Derive the cube's calendar keys from `timestamp` in one integer pass over epoch nanoseconds
+
+    Adds `date` (whole days since 1970-01-01, int32), `hour` and
+    `day_of_week_num` (Monday = 0), both int8. With a `tz` other than UTC the
+    timestamps are first shifted to that zone's wall-clock time, so hours and
+    days follow where the users are. Weekday names are never stored per row;
+    map day numbers through DAY_NAMES when rendering.
+    """
+    timestamps = df['timestamp']
+    if tz and tz != 'UTC':
+        timestamps = timestamps.dt.tz_convert(tz).dt.tz_localize(None)
+
+    ns = timestamps.astype('int64').to_numpy()
+    days = ns // NS_PER_DAY
+    return df.assign(
+        date=days.astype('int32'),
+        hour=(ns // NS_PER_HOUR % 24).astype('int8'),
+        day_of_week_num=((days + EPOCH_WEEKDAY) % 7).astype('int8'),
+    )
+
+
+def day_dates(days):
+    """Turn epoch day numbers (a scalar or a series) back into dates for display"""
+    return pd.to_datetime(days, unit='D')
+
+
+def build_cube(df, keys=CUBE_KEYS, metrics=CUBE_METRICS):
+    """Aggregate raw rows into one row of sufficient statistics per key cell"""
+    metrics = [m for m in metrics if m in df.columns]
+    # Narrow integer columns are widened first so sums of squares cannot overflow
+    values = {m: df[m].astype('float64') for m in metrics}
+    squares = {f'{m}_sq': values[m] * values[m] for m in metrics}
+    work = df[keys].assign(**values, **squares)
+
+    spec = {}
+    for m in metrics:
+        spec[f'{m}_count'] = (m, 'count')
+        spec[f'{m}_sum'] = (m, 'sum')
+        spec[f'{m}_sumsq'] = (f'{m}_sq', 'sum')
+        spec[f'{m}_min'] = (m, 'min')
+        spec[f'{m}_max'] = (m, 'max')
+
+    return work.groupby(keys, observed=True, sort=False).agg(**spec).reset_index()
+
+
+def rollup(cube, by, metrics=CUBE_METRICS):
+    """Combine cube cells over everything except `by` and derive per-group statistics
+
+    For each metric the result holds `<metric>_count`, `_mean`, `_std`
+    (sample standard deviation, like pandas), `_cv`, `_min` and `_max`.
+    Pass `by=[]` for a single overall row.
+    """
+    metrics = [m for m in metrics if f'{m}_count' in cube.columns]
+
+    spec = {}
+    for m in metrics:
+        for stat in ('count', 'sum', 'sumsq'):
+            spec[f'{m}_{stat}'] = 'sum'
+        spec[f'{m}_min'] = 'min'
+        spec[f'{m}_max'] = 'max'
+
+    if by:
+        totals = cube.groupby(by, observed=True).agg(spec)
+    else:
+        totals = cube.agg(spec).to_frame().T
+
+    result = pd.DataFrame(index=totals.index)
+    for m in metrics:
+        n = totals[f'{m}_count'].astype('float64')
+        total = totals[f'{m}_sum']
+        mean = total / n.where(n > 0)
+        var = (totals[f'{m}_sumsq'] - total * mean) / (n - 1).where(n > 1)
+
+        result[f'{m}_count'] = totals[f'{m}_count'].astype('int64')
+        result[f'{m}_mean'] = mean
+        result[f'{m}_std'] = np.sqrt(var.clip(lower=0))
+        result[f'{m}_cv'] = (result[f'{m}_std'] / mean.where(mean > 0)).fillna(0)
+        result[f'{m}_min'] = totals[f'{m}_min']
+        result[f'{m}_max'] = totals[f'{m}_max']
+
+    return result
+
+
+def pivot(cube, rows, cols, value):
+    """Roll the cube up to (rows, cols) and spread one derived statistic into a matrix"""
+    return rollup(cube, [rows, cols])[value].unstack(fill_value=0)
+
+
+# Flier points kept per box; the rest of the outliers add nothing visible but drawing cost
+MAX_FLIERS = 200
+
+
+def _percentile_sorted(values, q):
+    """Linearly interpolated percentile of an already sorted array, as np.percentile computes it"""
+    position = q * (len(values) - 1)
+    lower = int(np.floor(position))
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def boxplot_stats(df, by, value, whis=1.5, max_fliers=MAX_FLIERS):
+    """Compute `Axes.bxp` statistics for every `by` group from one sort of the data
+
+    The frame is sorted once by (group, value); each group is then a contiguous
+    sorted slice, so quartiles are direct lookups and whiskers are binary
+    searches. Matplotlib never sees or re-sorts the raw arrays. Returns a list
+    of stat dicts ordered by group, each labelled with its group key.
+    """
+    data = df[[by, value]].dropna(subset=[value])
+    codes, groups = pd.factorize(data[by], sort=True)
+    values = data[value].to_numpy(dtype='float64')
+
+    order = np.lexsort((values, codes))
+    values = values[order]
+    bounds = np.searchsorted(codes[order], np.arange(len(groups) + 1))
+
+    stats = []
+    for i, group in enumerate(groups):
+        group_values = values[bounds[i]:bounds[i + 1]]
+        if len(group_values) == 0:
+            continue
+
+        q1 = _percentile_sorted(group_values, 0.25)
+        med = _percentile_sorted(group_values, 0.5)
+        q3 = _percentile_sorted(group_values, 0.75)
+        iqr = q3 - q1
+
+        # Whiskers reach the most extreme data points still inside the fences
+        low = np.searchsorted(group_values, q1 - whis * iqr, side='left')
+        high = np.searchsorted(group_values, q3 + whis * iqr, side='right') - 1
+        whislo = group_values[low] if low <= high else q1
+        whishi = group_values[high] if high >= low else q3
+
+        fliers = np.concatenate([group_values[:low], group_values[high + 1:]])
+        if len(fliers) > max_fliers:
+            # Evenly spaced sample that always keeps the extremes
+            fliers = fliers[np.linspace(0, len(fliers) - 1, max_fliers).astype(int)]
+
+        stats.append({
+            'label': str(group),
+            'group': group,
+            'mean': group_values.mean(),
+            'med': med,
+            'q1': q1,
+            'q3': q3,
+            'iqr': iqr,
+            'whislo': min(whislo, q1),
+            'whishi': max(whishi, q3),
+            'fliers': fliers,
+        })
+
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# Mergeable quantile sketches
+#
+# Means and variances roll up from sums, but quantiles do not. Latency tails
+# are therefore kept as DDSketch-style log-bucketed histograms: every value x
+# lands in bucket ceil(log_gamma(x)), with gamma = (1 + alpha) / (1 - alpha),
+# so any quantile read back is within `alpha` relative error. A sketch table
+# is a plain frame of (keys..., bucket, count) rows; merging any slice (a week,
+# one model across all prompts) is a groupby-sum over bucket counts, and the
+# table round-trips through Parquet (`export --format parquet` writes one).
+# ---------------------------------------------------------------------------
+
+SKETCH_KEYS = ['promptId', 'model', 'date', 'hour']
+SKETCH_RELATIVE_ACCURACY = 0.01
+SKETCH_QUANTILES = (0.5, 0.95, 0.99)
+
+# Bucket for values <= 0, which have no logarithm
+ZERO_BUCKET = np.iinfo(np.int32).min
+
+_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+_LOG_GAMMA = np.log(_GAMMA)
+
+
+def sketch_buckets(values):
+    """Map raw values to their sketch bucket indices"""
+    values = np.asarray(values, dtype='float64')
+    buckets = np.full(values.shape, ZERO_BUCKET, dtype='int32')
+    positive = values > 0
+    buckets[positive] = np.ceil(np.log(values[positive]) / _LOG_GAMMA)
+    return buckets
+
+
+def bucket_values(buckets):
+    """Representative value of each bucket, within the sketch's relative accuracy of any member"""
+    buckets = np.asarray(buckets)
+    values = 2 * np.power(_GAMMA, buckets.astype('float64')) / (_GAMMA + 1)
+    return np.where(buckets == ZERO_BUCKET, 0.0, values)
+
+
+def build_sketches(df, keys=SKETCH_KEYS, metric='latencyMs'):
+    """Build one sketch per key cell in a single vectorized pass over the raw rows"""
+    values = df[metric]
+    valid = values.notna()
+    work = df.loc[valid, keys].assign(bucket=sketch_buckets(values[valid]))
+    return work.groupby(keys + ['bucket'], observed=True, sort=False).size().rename('count').reset_index()
+
+
+def merge_sketches(sketches, by):
+    """Merge sketches over everything except `by`; the result is itself a sketch table"""
+    return sketches.groupby(list(by) + ['bucket'], observed=True)['count'].sum().reset_index()
+
+
+def sketch_quantiles(sketches, by, quantiles=SKETCH_QUANTILES):
+    """Read quantiles for each `by` group, e.g. p50/p95/p99 per prompt, without touching raw rows
+
+    Returns one row per group with a `p<q>` column per quantile (`p50`, `p95`, ...)
+    and the group's `count`. Pass `by=[]` for a single overall row.
+    """
+    by = list(by)
+    if by:
+        merged = merge_sketches(sketches, by).sort_values(by + ['bucket'], kind='stable')
+        grouped = merged.groupby(by, observed=True, sort=False)['count']
+        cumulative = grouped.cumsum()
+        total = grouped.transform('sum')
+    else:
+        merged = sketches.groupby('bucket')['count'].sum().reset_index()
+        cumulative = merged['count'].cumsum()
+        total = pd.Series(merged['count'].sum(), index=merged.index)
+
+    result = {}
+    for q in quantiles:
+        # The first bucket whose cumulative count passes rank q * (n - 1) holds the quantile
+        hit = merged[cumulative > q * (total - 1)]
+        first = hit.groupby(by, observed=True)['bucket'].first() if by else hit['bucket'].iloc[:1]
+        result[f'p{q * 100:g}'] = pd.Series(bucket_values(first.to_numpy()), index=first.index)
+
+    if by:
+        out = pd.DataFrame(result)
+        out['count'] = merged.groupby(by, observed=True)['count'].sum()
+        return out
+    out = pd.DataFrame({name: series.to_numpy() for name, series in result.items()})
+    out['count'] = int(merged['count'].sum())
+    return out
+
+
+def sketch_boxplot_stats(sketches, by, means=None, whis=1.5, max_fliers=MAX_FLIERS):
+    """Compute `Axes.bxp` statistics for every `by` group from sketches, without raw rows
+
+    Quartiles, whisker ends and fliers are bucket values, each within the
+    sketches' relative accuracy of what boxplot_stats reads from the rows;
+    fliers are one point per occupied bucket. `means` (a series indexed by
+    group, e.g. from a cube roll-up) gives exact means; otherwise they are
+    estimated from the buckets.
+    """
+    quartiles = sketch_quantiles(sketches, [by], quantiles=(0.25, 0.5, 0.75))
+    merged = merge_sketches(sketches, [by])
+    merged['value'] = bucket_values(merged['bucket'].to_numpy())
+
+    stats = []
+    for group, cells in merged.sort_values([by, 'bucket']).groupby(by, observed=True, sort=True):
+        values = cells['value'].to_numpy()
+        counts = cells['count'].to_numpy()
+        if counts.sum() == 0:
+            continue
+
+        q1, med, q3 = quartiles.loc[group, ['p25', 'p50', 'p75']]
+        iqr = q3 - q1
+
+        inside = (values >= q1 - whis * iqr) & (values <= q3 + whis * iqr)
+        whislo = values[inside].min() if inside.any() else q1
+        whishi = values[inside].max() if inside.any() else q3
+
+        fliers = values[~inside]
+        if len(fliers) > max_fliers:
+            fliers = fliers[np.linspace(0, len(fliers) - 1, max_fliers).astype(int)]
+
+        stats.append({
+            'label': str(group),
+            'group': group,
+            'mean': means[group] if means is not None else np.average(values, weights=counts),
+            'med': med,
+            'q1': q1,
+            'q3': q3,
+            'iqr': iqr,
+            'whislo': min(whislo, q1),
+            'whishi': max(whishi, q3),
+            'fliers': fliers,
+        })
+
+    return stats
+
+
+def save_sketches(sketches, path):
+    """Persist a sketch table (Parquet) so slices can be merged later without raw rows"""
+    sketches.to_parquet(path, index=False)
+
+
+def load_sketches(path):
+    return pd.read_parquet(path)
+
+
+# ---------------------------------------------------------------------------
+# Line downsampling
+#
+# A time series with tens of thousands of points is drawn into at most a few
+# thousand pixel columns. Keeping, per equal-width time bucket, the first,
+# last, lowest and highest point (M4 / min-max-per-pixel) draws the same line
+# envelope as the raw series at a fraction of the points.
+# ---------------------------------------------------------------------------
+
+MAX_LINE_POINTS = 2000
+
+
+def minmax_downsample(x, y, max_points=MAX_LINE_POINTS):
+    """Indices of the points that preserve the drawn shape of a line sorted by x
+
+    Returns every index when the line is already short enough.
+    """
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+
+    buckets = max(max_points // 4, 1)
+    span = x[-1] - x[0]
+    if span > 0:
+        bucket = np.minimum(((x - x[0]) / span * buckets).astype('int64'), buckets - 1)
+    else:
+        bucket = np.arange(n) * buckets // n
+
+    # Within each bucket, y-sorted order puts the minimum first and the maximum last
+    by_value = np.lexsort((y, bucket))
+    starts = np.flatnonzero(np.r_[True, bucket[by_value][1:] != bucket[by_value][:-1]])
+    ends = np.r_[starts[1:], n] - 1
+
+    # bucket is non-decreasing along x, so bucket edges in x order give first and last
+    edges = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    keep = np.concatenate([edges, np.r_[edges[1:], n] - 1, by_value[starts], by_value[ends]])
+    return np.unique(keep)
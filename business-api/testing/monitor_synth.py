@@ -0,0 +1,232 @@
+"""
+Synthetic monitor data at production scale
+
+Rows are generated a chunk at a time with vectorized NumPy draws and written
+straight to CSV (in the exact format api_tester.js writes) or Parquet, so
+any number of rows, prompts, models and days can be produced in bounded
+memory and the analyzer can be exercised at scale without touching S3.
+
+Each monitoring run tests every prompt against every model, and runs are
+spread evenly over the date span. Latency is log-normal around a per-model
+base, scaled by diurnal and weekday multipliers and by the response length.
+Response lengths are log-normal around a per-prompt base, and completion
+tokens follow the response length at roughly four characters per token.
+
+    python monitor_synth.py --rows 10000000 --days 90 --output monitor_10m.csv
+"""
+
+import argparse
+import csv
+import sys
+
+import numpy as np
+import pandas as pd
+
+from monitor_loader import MONITOR_SCHEMA
+from monitor_stats import EPOCH_WEEKDAY, NS_PER_DAY, NS_PER_HOUR
+
+# Prompt id -> (category, typical response length in characters)
+DEFAULT_PROMPTS = {
+    'feleenas-context-test': ('long', 150),
+    'customer-greeting': ('short', 80),
+    'financial-advisor': ('medium', 300),
+    'medical-qa': ('medium', 250),
+}
+UNKNOWN_PROMPT = ('medium', 200)
+
+# Model -> typical latency in ms
+MODEL_BASE_LATENCY = {
+    'gpt-4o-mini': 1500,
+    'llama-3.3-70b-versatile': 2200,
+}
+UNKNOWN_MODEL_LATENCY = 1800
+
+# Slower over lunch and in the evening, faster at night
+HOUR_FACTORS = np.array([0.9] * 7 + [1.0] * 5 + [1.3] * 3 + [1.0] * 2 + [1.2] * 3 + [1.0] * 4)
+# Monday is slowest, weekends are quiet
+WEEKDAY_FACTORS = np.array([1.15, 1.0, 1.0, 1.0, 1.0, 0.95, 0.95])
+
+LATENCY_SIGMA = 0.3
+LENGTH_SIGMA = 0.35
+CHARS_PER_TOKEN = 4.0
+# Time one run takes to start all of its prompt/model combinations
+RUN_SPREAD_NS = 5_000_000_000
+
+DEFAULT_ROWS = 2_000
+DEFAULT_DAYS = 7
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+
+def _as_options(names, defaults, unknown):
+    """Per-name settings in the given order, falling back to `unknown` for names without defaults"""
+    names = list(names or defaults)
+    return names, [defaults.get(name, unknown) for name in names]
+
+
+def generate_chunks(rows=DEFAULT_ROWS, prompts=None, models=None, start=None, days=DEFAULT_DAYS,
+                    chunk_rows=DEFAULT_CHUNK_ROWS, seed=42, failure_rate=0.02):
+    """Yield typed monitor frames of at most `chunk_rows` rows, `rows` in total, in time order
+
+    `prompts` and `models` default to the demo's; `start` defaults to `days`
+    before now. Frames use the loader's MONITOR_SCHEMA dtypes. Output only
+    depends on `seed` and `chunk_rows`.
+    """
+    prompts, prompt_options = _as_options(prompts, DEFAULT_PROMPTS, UNKNOWN_PROMPT)
+    models, base_latency = _as_options(models, MODEL_BASE_LATENCY, UNKNOWN_MODEL_LATENCY)
+    base_latency = np.array(base_latency, dtype='float64')
+    base_length = np.array([length for _, length in prompt_options], dtype='float64')
+    categories, category_codes = np.unique([category for category, _ in prompt_options], return_inverse=True)
+    # A prompt's own token count does not change between runs
+    prompt_tokens = np.random.default_rng(seed).integers(40, 600, len(prompts))
+    has_logprobs = np.array([model.startswith('gpt') for model in models])
+
+    combos = len(prompts) * len(models)
+    runs = max(1, -(-rows // combos))
+    if start is None:
+        start = pd.Timestamp.now(tz='UTC').floor('h') - pd.Timedelta(days=days)
+    start = pd.Timestamp(start)
+    start_ns = (start.tz_localize('UTC') if start.tz is None else start).value
+    spacing = days * NS_PER_DAY / runs
+
+    for number, first in enumerate(range(0, rows, chunk_rows)):
+        rng = np.random.default_rng([seed, number])
+        index = np.arange(first, min(rows, first + chunk_rows))
+        n = len(index)
+        run, combo = np.divmod(index, combos)
+        p, m = np.divmod(combo, len(models))
+
+        # The combinations of a run start one after another within its first few seconds
+        offset = (combo + rng.random(n)) * (min(spacing, RUN_SPREAD_NS) / combos)
+        ns = start_ns + (run * spacing).astype('int64') + offset.astype('int64')
+        hour = ns // NS_PER_HOUR % 24
+        weekday = (ns // NS_PER_DAY + EPOCH_WEEKDAY) % 7
+
+        failed = rng.random(n) < failure_rate
+        length = np.maximum(1, np.rint(base_length[p] * rng.lognormal(0, LENGTH_SIGMA, n))).astype('int64')
+        completion = np.maximum(1, np.rint(length / rng.normal(CHARS_PER_TOKEN, 0.3, n))).astype('int64')
+        latency = (base_latency[m] * HOUR_FACTORS[hour] * WEEKDAY_FACTORS[weekday]
+                   * (0.7 + 0.3 * length / base_length[p]) * rng.lognormal(0, LATENCY_SIGMA, n))
+
+        length[failed] = completion[failed] = 0
+        used_prompt = np.where(failed, 0, prompt_tokens[p])
+        logprobs = has_logprobs[m] & ~failed
+        avg_logprob = np.where(logprobs, np.round(-np.abs(rng.normal(0.15, 0.08, n)), 3), np.nan)
+        zeros = np.zeros(n, dtype='int64')
+        response_codes = np.where(failed, len(prompts), p)
+
+        # Columns in the order api_tester.js writes them
+        frame = pd.DataFrame({
+            'timestamp': pd.to_datetime(ns, utc=True),
+            'promptId': pd.Categorical.from_codes(p, prompts),
+            'category': pd.Categorical.from_codes(category_codes[p], categories),
+            'model': pd.Categorical.from_codes(m, models),
+            'latencyMs': np.rint(latency),
+            'success': ~failed,
+            'finishReason': pd.Categorical.from_codes(failed.astype('int8'), ['stop', 'error']),
+            'promptTokens': used_prompt,
+            'completionTokens': completion,
+            'totalTokens': used_prompt + completion,
+            'cachedTokens': zeros,
+            'audioTokensPrompt': zeros,
+            'reasoningTokens': zeros,
+            'audioTokensCompletion': zeros,
+            'acceptedPredictionTokens': zeros,
+            'rejectedPredictionTokens': zeros,
+            'responseLength': length,
+            'response': pd.Categorical.from_codes(
+                response_codes, [f'Sample response for {prompt_id}...' for prompt_id in prompts] + ['']),
+            'hasRefusal': np.zeros(n, dtype=bool),
+            'refusalContent': '',
+            'annotationsCount': zeros,
+            'avgLogprob': avg_logprob,
+            'hasLogprobs': logprobs,
+            'serviceTier': pd.Categorical.from_codes(failed.astype('int8'), ['default', 'unknown']),
+            'responseId': pd.Series(index).astype(str).radd('chatcmpl-synthetic-').where(~failed),
+            'createdAt': pd.Series(pd.to_datetime(ns // 1_000_000_000, unit='s', utc=True)).where(~failed),
+            'error': pd.Series('Synthetic failure', index=range(n)).where(failed),
+            'errorType': pd.Categorical.from_codes(np.where(failed, 0, -1), ['api_error']),
+        })
+        yield frame.astype({col: MONITOR_SCHEMA[col] for col in frame.columns if col in MONITOR_SCHEMA})
+
+
+def generate_sample_data(rows=DEFAULT_ROWS, **kwargs):
+    """Generate a whole synthetic monitor frame in memory"""
+    return pd.concat(generate_chunks(rows, **kwargs), ignore_index=True)
+
+
+def _csv_chunk(frame):
+    """Format a typed frame the way api_tester.js writes its CSV (ISO timestamps, booleans as "1"/"")"""
+    frame = frame.copy()
+    for col in ['timestamp', 'createdAt']:
+        values = frame[col].dt.tz_localize(None).to_numpy().astype('datetime64[ms]')
+        text = np.char.add(np.datetime_as_string(values, unit='ms'), 'Z')
+        frame[col] = np.where(np.isnat(values), '', text)
+    for col in ['success', 'hasRefusal', 'hasLogprobs']:
+        frame[col] = np.where(frame[col], '1', '')
+    frame['latencyMs'] = frame['latencyMs'].astype('int64')
+    return frame
+
+
+def write_sample_data(path, rows=DEFAULT_ROWS, fmt=None, **kwargs):
+    """Stream synthetic rows to a CSV or Parquet file chunk by chunk and return the number of rows written
+
+    The format follows the file extension unless `fmt` is given.
+    """
+    fmt = fmt or ('parquet' if path.endswith('.parquet') else 'csv')
+    written = 0
+
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for frame in generate_chunks(rows, **kwargs):
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                written += len(frame)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        with open(path, 'w', newline='') as f:
+            for frame in generate_chunks(rows, **kwargs):
+                _csv_chunk(frame).to_csv(f, header=written == 0, index=False, quoting=csv.QUOTE_NONNUMERIC,
+                                         lineterminator='\n')
+                written += len(frame)
+
+    print(f"💾 Wrote {written:,} synthetic rows to '{path}'")
+    return written
+
+
+def parse_args(argv=None):
+    """Parse the command line"""
+    parser = argparse.ArgumentParser(description='Write synthetic monitor data for scale testing')
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS)
+    parser.add_argument('--days', type=float, default=DEFAULT_DAYS, help='date span the rows are spread over')
+    parser.add_argument('--start', help='first timestamp (default: DAYS before now)')
+    parser.add_argument('--prompt', dest='prompts', action='append', metavar='PROMPT_ID',
+                        help='prompt id (repeatable, default: the demo prompts)')
+    parser.add_argument('--model', dest='models', action='append', metavar='MODEL',
+                        help='model (repeatable, default: the monitored models)')
+    parser.add_argument('--failure-rate', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--format', choices=['csv', 'parquet'], help='default: from the output extension')
+    parser.add_argument('--output', default='monitor_sample.csv')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Write the requested synthetic data set"""
+    args = parse_args(argv)
+    write_sample_data(args.output, args.rows, fmt=args.format, prompts=args.prompts, models=args.models,
+                      start=args.start, days=args.days, chunk_rows=args.chunk_rows, seed=args.seed,
+                      failure_rate=args.failure_rate)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
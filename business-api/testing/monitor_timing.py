@@ -0,0 +1,234 @@
+"""
+Wall time and peak memory of named pipeline stages
+
+`StageTimer.stage(name)` is a context manager that records how long the
+stage took and the highest resident set size reached while it ran. RSS is
+sampled from /proc/self/statm by a background thread, so memory held by
+NumPy and Arrow buffers is counted as well as Python objects; where /proc is
+not available the process-wide peak from getrusage is reported instead. With
+`trace_memory=True` the peak of Python-level allocations seen by tracemalloc
+is recorded as well (this slows the run down noticeably).
+
+Work that happens in many small pieces, such as fetching, parsing and typing
+the chunks of one CSV, is summed into a single record per name with `add`,
+`reader` and `iterate`. Those names are `<stage>/<part>` (e.g. `load/parse`),
+so reports can tell the parts of a stage from the stages themselves. Code
+that may run without a timer uses NULL_TIMER, which records nothing.
+"""
+
+import functools
+import io
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+MB = 1024 * 1024
+SAMPLE_INTERVAL = 0.005
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def max_rss():
+    """Peak resident set size of this process so far, in bytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class _RssSampler(threading.Thread):
+    """Polls RSS until stopped and keeps the highest value seen"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = current_rss() or 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, current_rss() or 0)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, current_rss() or 0)
+        return self.peak
+
+
+class _TimedReader(io.RawIOBase):
+    """Pass-through binary reader that adds the time spent in and bytes returned by each read to a timer"""
+
+    def __init__(self, raw, timer, name):
+        self.raw = raw
+        self.timer = timer
+        self.name = name
+        self.seconds = 0.0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        start = time.perf_counter()
+        data = self.raw.read(len(buffer))
+        elapsed = time.perf_counter() - start
+        n = len(data)
+        buffer[:n] = data
+        self.seconds += elapsed
+        self.timer.add(self.name, elapsed, bytes=n)
+        return n
+
+
+class StageTimer:
+    """Collects one record per timed stage: name, seconds, peak and change in RSS plus any extra fields"""
+
+    def __init__(self, trace_memory=False, sample_interval=SAMPLE_INTERVAL):
+        self.sample_interval = sample_interval
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.records = []
+        self.started = time.time()
+        self._totals = {}
+        self._lock = threading.Lock()
+        self._open = []
+
+    @contextmanager
+    def stage(self, name, **info):
+        """Time the enclosed block; the yielded dict can be filled with extra fields such as rows"""
+        record = {'stage': name, **info}
+        start_rss = current_rss()
+        sampler = None
+        if start_rss is not None:
+            sampler = _RssSampler(self.sample_interval)
+            sampler.start()
+        if self.trace_memory:
+            start_traced = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            self._open.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            if sampler is not None:
+                peak = sampler.stop()
+                record['peak_rss_mb'] = round(peak / MB, 1)
+                record['rss_delta_mb'] = round(((current_rss() or 0) - start_rss) / MB, 1)
+            else:
+                record['peak_rss_mb'] = round(max_rss() / MB, 1)
+            if self.trace_memory:
+                self._open.pop()
+                # Inner stages reset the peak, so they hand theirs up to the enclosing stage
+                peak = max(tracemalloc.get_traced_memory()[1], record.pop('_traced_peak', 0))
+                record['peak_traced_mb'] = round((peak - start_traced) / MB, 1)
+                if self._open:
+                    self._open[-1]['_traced_peak'] = max(self._open[-1].get('_traced_peak', 0), peak)
+            self.records.append(record)
+
+    def add(self, name, seconds, **counts):
+        """Add time and counts to the running total of a `<stage>/<part>` record"""
+        with self._lock:
+            record = self._totals.get(name)
+            if record is None:
+                record = self._totals[name] = {'stage': name, 'seconds': 0.0}
+                self.records.append(record)
+            record['seconds'] += seconds
+            for key, value in counts.items():
+                record[key] = record.get(key, 0) + value
+
+    def reader(self, stream, name):
+        """Wrap a binary stream so its read time and bytes are added to `name`"""
+        return io.BufferedReader(_TimedReader(stream, self, name))
+
+    def iterate(self, iterable, name, exclude=None):
+        """Yield from `iterable`, adding the time spent producing each item (and its rows) to `name`
+
+        Time the `exclude` reader spent reading during an item, e.g. fetching
+        bytes while a CSV chunk was being parsed, is not counted twice.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            excluded = exclude.raw.seconds if exclude is not None else 0.0
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            elapsed = time.perf_counter() - start
+            if exclude is not None:
+                elapsed -= exclude.raw.seconds - excluded
+            self.add(name, elapsed, rows=len(item))
+            yield item
+
+    def total(self, field, prefix):
+        """Sum of `field` over the records whose name starts with `prefix`"""
+        return sum(record.get(field, 0) for record in self.records if record['stage'].startswith(prefix))
+
+    def report(self, **meta):
+        """Machine-readable run report: the given metadata, totals and every stage record"""
+        stages = [record for record in self.records if '/' not in record['stage']]
+        return {
+            **meta,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(self.started)),
+            'seconds': round(time.time() - self.started, 3),
+            'staged_seconds': round(sum(record['seconds'] for record in stages), 3),
+            'peak_rss_mb': round(max_rss() / MB, 1),
+            'stages': [{key: round(value, 4) if isinstance(value, float) else value
+                        for key, value in record.items()} for record in self.records],
+        }
+
+    def summary_line(self):
+        """One line with the total and the time per stage family (load, inputs, render, ...)"""
+        families = {}
+        for record in self.records:
+            if '/' not in record['stage']:
+                family = record['stage'].split('.')[0]
+                families[family] = families.get(family, 0.0) + record['seconds']
+
+        read = self.total('bytes', 'load/')
+        parts = [f"{family} {seconds:.1f}s" + (f" ({read / MB:,.1f} MB read)" if family == 'load' and read else '')
+                 for family, seconds in families.items()]
+        return (f"⏱️ {time.time() - self.started:.1f}s total: {', '.join(parts) or 'no stages'}; "
+                f"peak RSS {max_rss() / MB:,.0f} MB")
+
+
+def timed(name):
+    """Method decorator that records each call as stage `name` of the instance's `timer`"""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.timer.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class NullTimer:
+    """Stands in for a StageTimer where nothing should be recorded"""
+
+    @contextmanager
+    def stage(self, name, **info):
+        yield {}
+
+    def add(self, name, seconds, **counts):
+        pass
+
+    def reader(self, stream, name):
+        return stream
+
+    def iterate(self, iterable, name, exclude=None):
+        return iterable
+
+
+NULL_TIMER = NullTimer()
@@ -0,0 +1,310 @@
+"""
+Latency trends and change points for every prompt/model series at once
+
+Trends are ordinary least-squares lines fitted in closed form from grouped
+sums (n, sum x, sum y, sum x^2, sum xy, sum y^2), so one vectorized groupby
+pass fits every series together. Slopes are reported in ms per day with a 95%
+confidence interval.
+
+Change points are found by binary segmentation on hourly cells of each series,
+after the series' hour-of-week profile (hour-of-day on series shorter than two
+weeks) is removed so ordinary weekday and day/night cycles are not reported as
+level shifts. Cumulative sums give, for every candidate split, the drop in within-segment
+squared error (the CUSUM statistic), the best split is tested with a two-sample
+z statistic against the pooled within-segment variance, and accepted halves
+are searched again. This finds latency level shifts deterministically, without
+anyone eyeballing daily averages.
+
+Both work from hourly (count, sum, sum of squares) cells as well as from raw
+rows, so a report backed by daily rollups fits its trends from the stored
+cube (see cube_cells) without loading any runs.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from monitor_stats import NS_PER_DAY, NS_PER_HOUR
+
+TREND_KEYS = ['promptId', 'model']
+
+# Two-sided 95% normal quantile
+Z_95 = 1.959963984540054
+
+# A split is a change point only if the level shift is both this significant...
+CHANGE_Z = 5.0
+# ...and at least this large relative to the level before it
+MIN_RELATIVE_SHIFT = 0.1
+# Hourly cells each side of a split must hold at least this many cells
+MIN_SEGMENT_CELLS = 24
+MAX_CHANGES = 5
+
+# Seasonal periods in hourly cells, longest first; a series is adjusted by the
+# longest one it covers at least SEASONAL_CYCLES times
+SEASONAL_PERIODS = [7 * 24, 24]
+SEASONAL_CYCLES = 2
+
+
+def _t_quantile_95(dof):
+    """Two-sided 95% Student t quantile (Cornish-Fisher expansion; exact for one degree of freedom)"""
+    if dof == 1:
+        return math.tan(0.475 * math.pi)
+    z = Z_95
+    return (z + (z**3 + z) / (4 * dof) + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * dof**2)
+            + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * dof**3))
+
+
+def _fit(sums):
+    """Slopes, intervals and intercepts from grouped sums n, sx, sy, sxx, sxy, syy, first and last"""
+    n = sums['n'].astype('float64')
+    mean_x, mean_y = sums['sx'] / n, sums['sy'] / n
+    sxx = sums['sxx'] - n * mean_x**2
+    sxy = sums['sxy'] - n * mean_x * mean_y
+    syy = sums['syy'] - n * mean_y**2
+
+    slope = sxy / sxx.where(sxx > 0)
+    residual = (syy - slope * sxy).clip(lower=0)
+    stderr = np.sqrt(residual / (n - 2).where(n > 2) / sxx.where(sxx > 0))
+    t = (n - 2).map(lambda dof: _t_quantile_95(int(dof)) if dof >= 1 else np.nan)
+
+    trends = pd.DataFrame({
+        'n': sums['n'],
+        'slope': slope,
+        'ci_low': slope - t * stderr,
+        'ci_high': slope + t * stderr,
+        'intercept': mean_y - slope * mean_x,
+        'first': pd.to_datetime(sums['first'], utc=True),
+        'last': pd.to_datetime(sums['last'], utc=True),
+    })
+    trends['direction'] = np.select([trends['ci_low'] > 0, trends['ci_high'] < 0],
+                                    ['increasing', 'decreasing'], 'flat')
+    return trends
+
+
+def fit_trends(df, keys=TREND_KEYS, metric='latencyMs'):
+    """Fit a least-squares latency trend per `keys` group in one grouped-sums pass
+
+    Returns one row per group with `n`, `slope` (ms per day), `ci_low` and
+    `ci_high` (95% interval of the slope), `intercept` (ms at `origin`), the
+    first and last timestamp, and `direction` ('increasing', 'decreasing' or
+    'flat' depending on whether the interval excludes zero).
+    """
+    data = df[df[metric].notna()]
+    ns = data['timestamp'].astype('int64').to_numpy()
+    origin = ns.min() if len(ns) else 0
+    x = (ns - origin) / NS_PER_DAY
+    y = data[metric].to_numpy(dtype='float64')
+
+    work = data[keys].assign(ns=ns, x=x, y=y, xx=x * x, xy=x * y, yy=y * y)
+    sums = work.groupby(keys, observed=True, sort=False).agg(
+        n=('x', 'size'), sx=('x', 'sum'), sy=('y', 'sum'), sxx=('xx', 'sum'), sxy=('xy', 'sum'),
+        syy=('yy', 'sum'), first=('ns', 'min'), last=('ns', 'max'),
+    )
+
+    trends = _fit(sums)
+    trends.attrs['origin'] = pd.Timestamp(origin, tz='UTC')
+    return trends
+
+
+def fit_trend_cells(cells, keys=TREND_KEYS):
+    """fit_trends on hourly cells (see hourly_cells and cube_cells) instead of rows
+
+    Every run of a cell is placed at the middle of its hour, so slopes match a
+    fit on the rows up to that rounding; `first` and `last` are the start and
+    end of the first and last hour.
+    """
+    origin = cells['start'].min() if len(cells) else 0
+    x = (cells['start'].to_numpy() + NS_PER_HOUR // 2 - origin) / NS_PER_DAY
+    count = cells['count'].to_numpy(dtype='float64')
+    total = cells['total'].to_numpy()
+
+    work = cells[keys].assign(count=count, sx=count * x, sy=total, sxx=count * x * x, sxy=x * total,
+                              syy=cells['sumsq'], first=cells['start'], last=cells['start'] + NS_PER_HOUR)
+    sums = work.groupby(keys, observed=True, sort=False).agg(
+        n=('count', 'sum'), sx=('sx', 'sum'), sy=('sy', 'sum'), sxx=('sxx', 'sum'), sxy=('sxy', 'sum'),
+        syy=('syy', 'sum'), first=('first', 'min'), last=('last', 'max'),
+    )
+    sums['n'] = sums['n'].astype('int64')
+
+    trends = _fit(sums)
+    trends.attrs['origin'] = pd.Timestamp(origin, tz='UTC')
+    return trends
+
+
+def _best_split(count, total, sumsq):
+    """Best single split of a run of cells: (index of the first cell after it, mean before, mean after, z)"""
+    n_cells = len(count)
+    c, s, q = np.cumsum(count), np.cumsum(total), np.cumsum(sumsq)
+    n1, s1 = c[:-1], s[:-1]
+    n2, s2 = c[-1] - n1, s[-1] - s1
+
+    # Between-segment sum of squares for a split after each cell (the CUSUM statistic)
+    between = s1**2 / n1 + s2**2 / n2 - s[-1]**2 / c[-1]
+    cells_before = np.arange(1, n_cells)
+    valid = (cells_before >= MIN_SEGMENT_CELLS) & (n_cells - cells_before >= MIN_SEGMENT_CELLS)
+    if not valid.any():
+        return None
+
+    k = np.argmax(np.where(valid, between, -np.inf))
+    within = q[-1] - s1[k]**2 / n1[k] - s2[k]**2 / n2[k]
+    if c[-1] <= 2 or within <= 0:
+        return None
+
+    before, after = s1[k] / n1[k], s2[k] / n2[k]
+    z = abs(after - before) / math.sqrt(within / (c[-1] - 2) * (1 / n1[k] + 1 / n2[k]))
+    return k + 1, before, after, z
+
+
+def _deseasonalize(hours, count, total, sumsq):
+    """Remove a series' seasonal profile from its hourly (count, sum, sum of squares) cells
+
+    Every value in a cell is shifted by its slot's deviation from the series
+    mean (slot = hour of week, or hour of day), which the cell sums absorb
+    exactly. Series too short to cover two cycles of a day are left as is.
+    """
+    span = hours[-1] - hours[0] + 1
+    period = next((period for period in SEASONAL_PERIODS if span >= SEASONAL_CYCLES * period), None)
+    if period is None:
+        return total, sumsq
+
+    slot = hours % period
+    slot_count = np.bincount(slot, weights=count, minlength=period)
+    slot_total = np.bincount(slot, weights=total, minlength=period)
+    profile = slot_total / np.where(slot_count > 0, slot_count, 1) - total.sum() / count.sum()
+    deviation = profile[slot]
+    return total - count * deviation, sumsq - 2 * deviation * total + count * deviation**2
+
+
+def _segment(count, total, sumsq):
+    """Binary segmentation: indices of accepted splits with their before/after means and z"""
+    changes = []
+    pending = [(0, len(count))]
+    while pending and len(changes) < MAX_CHANGES:
+        start, end = pending.pop()
+        split = _best_split(count[start:end], total[start:end], sumsq[start:end])
+        if split is None:
+            continue
+        offset, before, after, z = split
+        if z < CHANGE_Z or abs(after - before) < MIN_RELATIVE_SHIFT * before:
+            continue
+        changes.append((start + offset, before, after, z))
+        pending.extend([(start, start + offset), (start + offset, end)])
+    return sorted(changes)
+
+
+def hourly_cells(df, keys=TREND_KEYS, metric='latencyMs'):
+    """Roll rows up into (count, sum, sum of squares) cells per series and UTC hour, in one groupby pass
+
+    `cell` numbers the hours since the epoch and `start` is each hour's first
+    nanosecond, as in cube_cells.
+    """
+    data = df[df[metric].notna()]
+    y = data[metric].to_numpy(dtype='float64')
+    cell = data['timestamp'].astype('int64').to_numpy() // NS_PER_HOUR
+    work = data[keys].assign(cell=cell, y=y, yy=y * y)
+    cells = work.groupby(keys + ['cell'], observed=True).agg(
+        count=('y', 'size'), total=('y', 'sum'), sumsq=('yy', 'sum'),
+    ).reset_index()
+    cells.insert(len(keys) + 1, 'start', cells['cell'] * NS_PER_HOUR)
+    return cells
+
+
+def cube_cells(cube, tz='UTC', keys=TREND_KEYS, metric='latencyMs'):
+    """The hourly cells of hourly_cells, combined from a monitor_stats cube instead of raw rows
+
+    The cube's hours are local to `tz`, so `cell` numbers local hours and
+    `start` is the UTC nanosecond each one begins at (the first occurrence of
+    an hour repeated when clocks go back).
+    """
+    cell = cube['date'].astype('int64') * 24 + cube['hour'].astype('int64')
+    work = cube[keys].assign(cell=cell, count=cube[f'{metric}_count'], total=cube[f'{metric}_sum'],
+                             sumsq=cube[f'{metric}_sumsq'])
+    cells = work.groupby(keys + ['cell'], observed=True).sum().reset_index()
+    cells = cells[cells['count'] > 0].reset_index(drop=True)
+
+    start = pd.DatetimeIndex(cells['cell'].to_numpy() * NS_PER_HOUR)
+    if tz and tz != 'UTC':
+        start = start.tz_localize(tz, ambiguous=np.ones(len(start), dtype=bool), nonexistent='shift_forward')
+    cells.insert(len(keys) + 1, 'start', start.asi8)
+    return cells
+
+
+def change_points_from_cells(cells, keys=TREND_KEYS):
+    """Find the hours at which each series' latency level shifted, from its hourly cells
+
+    Segmentation runs on each series' cells once their seasonal profile is
+    removed (see _deseasonalize). Returns one row per change point with the
+    series keys, `at` (UTC start of the first hour at the new level), `before`
+    and `after` (seasonally adjusted mean levels of the adjacent segments,
+    ms), `shift`, `shift_pct` and `z`.
+    """
+    rows = []
+    for key, series in cells.groupby(keys, observed=True, sort=False):
+        key = key if isinstance(key, tuple) else (key,)
+        hours = series['cell'].to_numpy()
+        count = series['count'].to_numpy(dtype='float64')
+        total, sumsq = _deseasonalize(hours, count, series['total'].to_numpy(), series['sumsq'].to_numpy())
+        changes = _segment(count, total, sumsq)
+        for index, before, after, z in changes:
+            row = dict(zip(keys, key))
+            row.update({
+                'at': pd.Timestamp(int(series['start'].iloc[index]), tz='UTC'),
+                'before': before,
+                'after': after,
+                'shift': after - before,
+                'shift_pct': (after - before) / before * 100 if before else np.nan,
+                'z': z,
+            })
+            rows.append(row)
+
+    columns = list(keys) + ['at', 'before', 'after', 'shift', 'shift_pct', 'z']
+    return pd.DataFrame(rows, columns=columns)
+
+
+def detect_change_points(df, keys=TREND_KEYS, metric='latencyMs'):
+    """Find the hours at which each series' latency level shifted, from raw rows
+
+    Rows are rolled up into hourly cells (see hourly_cells) and segmented as
+    in change_points_from_cells, whose columns the result has.
+    """
+    return change_points_from_cells(hourly_cells(df, keys, metric), keys)
+
+
+def trend_report(trends, change_points, keys=TREND_KEYS):
+    """JSON-ready report: one entry per series with its trend and change points"""
+    by_series = {}
+    for _, change in change_points.iterrows():
+        by_series.setdefault(tuple(change[k] for k in keys), []).append({
+            'at': change['at'].isoformat(),
+            'beforeMs': round(change['before'], 1),
+            'afterMs': round(change['after'], 1),
+            'shiftMs': round(change['shift'], 1),
+            'shiftPct': round(change['shift_pct'], 1),
+            'z': round(change['z'], 1),
+        })
+
+    series = []
+    for key, trend in trends.iterrows():
+        key = key if isinstance(key, tuple) else (key,)
+        entry = dict(zip(keys, key))
+        entry.update({
+            'runs': int(trend['n']),
+            'from': trend['first'].isoformat(),
+            'to': trend['last'].isoformat(),
+            'slopeMsPerDay': round(trend['slope'], 3) if pd.notna(trend['slope']) else None,
+            'slopeCi95': ([round(trend['ci_low'], 3), round(trend['ci_high'], 3)]
+                          if pd.notna(trend['ci_low']) else None),
+            'direction': trend['direction'],
+            'changePoints': by_series.get(key, []),
+        })
+        series.append(entry)
+
+    return {
+        'method': {
+            'trend': 'least squares on latency vs time, slope in ms/day with 95% CI',
+            'changePoints': (f'binary segmentation on hourly cells without their hour-of-week profile, z >= {CHANGE_Z}, '
+                             f'shift >= {MIN_RELATIVE_SHIFT:.0%}, >= {MIN_SEGMENT_CELLS} cells per segment'),
+        },
+        'series': series,
+    }
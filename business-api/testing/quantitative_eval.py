@@ -1,13 +1,14 @@
 import os
-import boto3
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 from datetime import datetime, timedelta
 import warnings
-from io import StringIO
 from dotenv import load_dotenv
+from monitor_cache import DEFAULT_CACHE_DIR
+from monitor_loader import INT_COLUMNS
+from monitor_sources import open_source
 
 # Load environment variables
 load_dotenv()
@@ -21,25 +22,21 @@ sns.set_palette("husl")
 
 class LLMPerformanceAnalyzer:
     def __init__(self):
-        """Initialize the analyzer with AWS S3 configuration"""
-        self.s3_client = boto3.client('s3', region_name=os.getenv('AWS_REGION'))
-        self.bucket = os.getenv('S3_BUCKET')
-        self.key = os.getenv('S3_KEY', 'monitor_data.csv')
+        """Initialize the analyzer with its data source (MONITOR_SOURCE, default the S3_KEY object)"""
+        # Local Parquet cache of the parsed object; set MONITOR_CACHE_DIR= (empty) to disable
+        self.cache_dir = os.getenv('MONITOR_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.source = open_source(cache_dir=self.cache_dir)
         self.df = None
         
     def load_data_from_s3(self):
-        """Load monitoring data from S3"""
+        """Load monitoring data from the data source (S3 by default)"""
         try:
-            print(f"📊 Loading data from S3: {self.bucket}/{self.key}")
+            print(f"📊 Loading data from {self.source}")
             
-            response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key)
-            csv_content = response['Body'].read().decode('utf-8')
-            
-            # Parse CSV data
-            self.df = pd.read_csv(StringIO(csv_content))
-            
-            # Convert timestamp to datetime
-            self.df['timestamp'] = pd.to_datetime(self.df['timestamp'])
+            # Only the analysis columns of successful rows are loaded (from the cache when the object is unchanged)
+            self.df = self.source.load()
+            # These plots work on raw rows and expect plain NumPy floats rather than nullable ints
+            self.df = self.df.astype({col: 'float64' for col in INT_COLUMNS if col in self.df.columns})
             
             # Extract time components
             self.df['date'] = self.df['timestamp'].dt.date
@@ -47,15 +44,6 @@ class LLMPerformanceAnalyzer:
             self.df['day_of_week'] = self.df['timestamp'].dt.day_name()
             self.df['day_of_week_num'] = self.df['timestamp'].dt.dayofweek
             
-            # Convert numeric columns
-            numeric_columns = ['latencyMs', 'responseLength', 'promptTokens', 'completionTokens', 'totalTokens']
-            for col in numeric_columns:
-                if col in self.df.columns:
-                    self.df[col] = pd.to_numeric(self.df[col], errors='coerce')
-            
-            # Filter successful responses only
-            self.df = self.df[self.df['success'] == True].copy()
-            
             print(f"✅ Loaded {len(self.df)} successful records")
             print(f"📅 Date range: {self.df['date'].min()} to {self.df['date'].max()}")
             print(f"🏷️  Unique prompts: {self.df['promptId'].nunique()}")
@@ -1,13 +1,24 @@
+import argparse
+import json
 import os
-import boto3
+import sys
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
-from datetime import datetime, timedelta
 import warnings
-from io import StringIO
 from dotenv import load_dotenv
+from monitor_arrow import column_median, cube_from_rows, rows_frame, scan_rows, sketches_from_rows, value_counts
+from monitor_cache import DEFAULT_CACHE_DIR
+from monitor_figures import (DEFAULT_PAGE_FORMAT, DEFAULT_PROFILE, FIGURES, PAGE_FORMATS, PROFILES, describe_paths,
+                             render_figure, render_figures_parallel)
+from monitor_loader import concat_frames, make_filters
+from monitor_rollups import LENGTH_SKETCH_KEYS, ONE_NS, ROLLUP_FILTERS, RollupStore, current_day, day_start, split_window
+from monitor_sources import DEFAULT_MAX_WORKERS, open_source, write_arrow_file
+from monitor_stats import (DAY_NAMES, add_calendar_features, boxplot_stats, build_cube, build_sketches, day_dates,
+                           minmax_downsample, NS_PER_DAY, pivot, rollup, sketch_boxplot_stats,
+                           sketch_quantiles)
+from monitor_timing import StageTimer, timed
+from monitor_trends import (TREND_KEYS, change_points_from_cells, cube_cells, detect_change_points, fit_trend_cells,
+                            fit_trends, trend_report)
 
 # Load environment variables
 load_dotenv()
@@ -15,54 +26,189 @@ load_dotenv()
 # Suppress warnings for cleaner output
 warnings.filterwarnings('ignore')
 
-# Set up plotting style
-plt.style.use('seaborn-v0_8')
-sns.set_palette("husl")
+# How the rows are scanned and aggregated (see monitor_arrow)
+BACKENDS = ['pandas', 'arrow']
 
 class LLMPerformanceAnalyzer:
-    def __init__(self):
-        """Initialize the analyzer with AWS S3 configuration"""
-        self.s3_client = boto3.client('s3', region_name=os.getenv('AWS_REGION'))
-        self.bucket = os.getenv('S3_BUCKET')
-        self.key = os.getenv('S3_KEY', 'monitor_data.csv')
-        self.df = None
-        
+    def __init__(self, since=None, until=None, prompts=None, models=None, categories=None, timezone=None,
+                 headless=None, profile=None, render_workers=None, output_dir='.', trace_memory=None, source=None,
+                 backend=None, rollups=None, page_format=None, cache_dir=None, max_workers=None):
+        """Initialize the analyzer with its data source (AWS S3 unless configured otherwise)
+
+        `source` is a data source or a location for monitor_sources.open_source
+        (MONITOR_SOURCE), e.g. a local `monitor.arrow` or `monitor.csv`. By
+        default the S3_KEY objects (comma-separated) are read, or, when S3_PREFIX
+        is set, the objects under that prefix, with `date=YYYY-MM-DD/` partitions
+        limited to [since, until]. Files of different generations are combined,
+        with each row's generation in the `generation` column.
+        `since`/`until` (timestamps, dates or relative windows like `24h`) and the
+        prompt, model and category lists are applied while the data is parsed,
+        so only matching rows are ever loaded.
+        
+        Hours, days and weekdays are reported in `timezone` (REPORT_TIMEZONE,
+        default UTC), e.g. `Europe/Berlin` for business-hours heatmaps.
+        
+        Headless mode (REPORT_HEADLESS=1) renders with the Agg backend and never
+        calls `show`; with more than one render worker (RENDER_WORKERS) the figures
+        are then rendered in parallel processes. FIGURE_PROFILE selects the
+        `publication` (300 dpi, annotated) or `draft` (100 dpi, no annotations) profile.
+        Headless renders are cached under MONITOR_CACHE_DIR, so a figure whose
+        inputs have not changed since an earlier run is copied rather than redrawn.
+        The per-prompt figures are drawn page by page, a fixed number of prompts
+        each, into numbered PNGs or, with `page_format` (FIGURE_PAGE_FORMAT)
+        `pdf`, one multi-page PDF per figure.
+        
+        Every stage is timed into `self.timer` (see write_run_report); set
+        `trace_memory` (REPORT_TRACEMALLOC=1) to also record tracemalloc peaks.
+        
+        With the `arrow` backend (ANALYSIS_BACKEND=arrow) local files are scanned
+        and aggregated by multithreaded Arrow query plans; the raw rows are only
+        converted to a DataFrame for figures that draw individual runs.
+        
+        `cache_dir` (MONITOR_CACHE_DIR) holds the Parquet cache of loaded data
+        and the render cache; an empty string disables both. `max_workers`
+        (S3_MAX_WORKERS) bounds the parallel S3 requests. Every setting given
+        here overrides its environment variable, so a caller that passes them
+        all is unaffected by the environment and `.env`.
+        
+        With a rollup store (`rollups` or ROLLUP_STORE, a directory or
+        s3://bucket/prefix/; an empty string disables it) the whole days of the window are read from stored
+        daily rollups and only the rest is aggregated from raw rows (see
+        monitor_rollups). Figures and trends are then drawn from the rollups as
+        well: box plots from the sketches, and trend fits, change points and the
+        per-prompt lines from the cube's hourly cells, so no earlier run is loaded.
+        """
+        if trace_memory is None:
+            trace_memory = os.getenv('REPORT_TRACEMALLOC', '').lower() in ('1', 'true', 'yes')
+        self.timer = StageTimer(trace_memory=trace_memory)
+        if headless is None:
+            headless = os.getenv('REPORT_HEADLESS', '').lower() in ('1', 'true', 'yes')
+        self.headless = headless
+        if self.headless:
+            import matplotlib
+            matplotlib.use('Agg')
+        self.profile = profile or os.getenv('FIGURE_PROFILE', DEFAULT_PROFILE)
+        self.render_workers = render_workers or int(os.getenv('RENDER_WORKERS', '1'))
+        self.page_format = page_format or os.getenv('FIGURE_PAGE_FORMAT', DEFAULT_PAGE_FORMAT)
+        if self.page_format not in PAGE_FORMATS:
+            raise ValueError(f"Unknown page format '{self.page_format}' (choose from {', '.join(PAGE_FORMATS)})")
+        self.output_dir = output_dir
+        # Files written per figure, for the closing list of the report
+        self.figure_paths = {}
+        self.backend = backend or os.getenv('ANALYSIS_BACKEND', 'pandas')
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown analysis backend '{self.backend}' (choose from {', '.join(BACKENDS)})")
+        
+        self.max_workers = max_workers or int(os.getenv('S3_MAX_WORKERS', DEFAULT_MAX_WORKERS))
+        self.filters = make_filters(since, until, prompts, models, categories)
+        self.timezone = timezone or os.getenv('REPORT_TIMEZONE', 'UTC')
+        # Local Parquet cache of the parsed object; set MONITOR_CACHE_DIR= (empty) to disable
+        self.cache_dir = cache_dir if cache_dir is not None else os.getenv('MONITOR_CACHE_DIR', DEFAULT_CACHE_DIR)
+        # Rendered figures keyed by a hash of their inputs, profile, style and renderer (see monitor_figures)
+        self.figure_cache_dir = os.path.join(self.cache_dir, 'figures') if self.cache_dir else None
+        # S3 clients are only created once an S3 source is actually loaded
+        self.source = source if hasattr(source, 'load') else open_source(source, cache_dir=self.cache_dir,
+                                                                        max_workers=self.max_workers)
+        rollups = rollups if rollups is not None else os.getenv('ROLLUP_STORE')
+        self.rollup_store = (RollupStore(rollups, self.source, self.timezone, max_workers=self.max_workers)
+                             if rollups else None)
+        # Whether the aggregates were combined from rollups, in which case the runs are never loaded
+        self.from_rollups = False
+        self._df = None
+        # Scanned rows as an Arrow table, with the arrow backend
+        self.rows = None
+        # Per-cell sufficient statistics that every chart and summary is rolled up from
+        self.cube = None
+        # Per-(promptId, model, date, hour) latency sketches for mergeable p50/p95/p99
+        self.sketches = None
+        # Per-(promptId, model, date) response length sketches, kept with the rollups
+        self.length_sketches = None
+        # Batched per-(promptId, model) latency trends and detected level shifts, computed on first use
+        self.trends = None
+        self.change_points = None
+        
+    @property
+    def df(self):
+        """The loaded rows as a DataFrame; with the arrow backend they are converted on first use"""
+        if self._df is None and self.rows is not None:
+            with self.timer.stage('to_pandas'):
+                self._df = rows_frame(self.rows)
+        return self._df
+    
+    @df.setter
+    def df(self, df):
+        self._df = df
+    
+    @property
+    def row_count(self):
+        """Number of loaded rows, without converting Arrow rows to a DataFrame or loading rolled-up runs"""
+        if self.from_rollups:
+            return int(self.cube['latencyMs_count'].sum()) if self.cube is not None else 0
+        if self.rows is not None:
+            return self.rows.num_rows
+        return len(self._df) if self._df is not None else 0
+    
     def load_data_from_s3(self):
-        """Load monitoring data from S3"""
+        """Load monitoring data from the data source (S3 by default)"""
         try:
-            print(f"📊 Loading data from S3: {self.bucket}/{self.key}")
-            
-            response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key)
-            csv_content = response['Body'].read().decode('utf-8')
+            if self.filters:
+                print(f"🔎 Filters: {', '.join(f'{name}={value}' for name, value in self.filters.items())}")
+            self.df = self.rows = self.cube = self.sketches = self.length_sketches = None
+            self.trends = self.change_points = None
+            self.from_rollups = False
+            with self.timer.stage('load') as stage:
+                print(f"📊 Loading data from {self.source}" + (" (arrow backend)" if self.backend == 'arrow' else ''))
+                if self.rollup_store is not None and set(self.filters or {}) <= set(ROLLUP_FILTERS):
+                    stored_days, raw_rows = self.load_from_rollups()
+                elif self.backend == 'arrow':
+                    # The scan keeps only the columns the aggregates need and filters while reading
+                    self.rows = scan_rows(self.source, filters=self.filters, tz=self.timezone, timer=self.timer)
+                else:
+                    # Only the analysis columns of successful rows matching the filters are loaded
+                    self.df = self.source.load(filters=self.filters, timer=self.timer)
+                stage['rows'] = self.row_count
             
-            # Parse CSV data
-            self.df = pd.read_csv(StringIO(csv_content))
+            if self.row_count == 0:
+                print("❌ No successful records match the requested filters")
+                self.df = self.rows = self.cube = self.sketches = self.length_sketches = None
+                self.from_rollups = False
+                return False
             
-            # Convert timestamp to datetime
-            self.df['timestamp'] = pd.to_datetime(self.df['timestamp'])
-            
-            # Extract time components
-            self.df['date'] = self.df['timestamp'].dt.date
-            self.df['hour'] = self.df['timestamp'].dt.hour
-            self.df['day_of_week'] = self.df['timestamp'].dt.day_name()
-            self.df['day_of_week_num'] = self.df['timestamp'].dt.dayofweek
-            
-            # Convert numeric columns
-            numeric_columns = ['latencyMs', 'responseLength', 'promptTokens', 'completionTokens', 'totalTokens']
-            for col in numeric_columns:
-                if col in self.df.columns:
-                    self.df[col] = pd.to_numeric(self.df[col], errors='coerce')
-            
-            # Filter successful responses only
-            self.df = self.df[self.df['success'] == True].copy()
-            
-            # Sort by timestamp for time series analysis
-            self.df = self.df.sort_values('timestamp')
+            if self.from_rollups:
+                print(f"🗄️  {stored_days} day(s) read from {self.rollup_store}, {raw_rows:,} raw records aggregated")
+            elif self.backend == 'arrow':
+                # Calendar keys were computed by the scan; the rows are already in time order
+                with self.timer.stage('aggregate.cube') as stage:
+                    self.cube = cube_from_rows(self.rows)
+                    stage['rows'] = len(self.cube)
+                with self.timer.stage('aggregate.sketches') as stage:
+                    self.sketches = sketches_from_rows(self.rows)
+                    stage['rows'] = len(self.sketches)
+            else:
+                # Extract time components (local to the report timezone) in one integer pass
+                with self.timer.stage('features'):
+                    self.df = add_calendar_features(self.df, self.timezone)
+                
+                # Sort by timestamp for time series analysis
+                with self.timer.stage('sort'):
+                    self.df = self.df.sort_values('timestamp')
+                
+                # Single aggregation pass shared by all charts and summaries
+                with self.timer.stage('aggregate.cube') as stage:
+                    self.cube = build_cube(self.df)
+                    stage['rows'] = len(self.cube)
+                with self.timer.stage('aggregate.sketches') as stage:
+                    self.sketches = build_sketches(self.df)
+                    stage['rows'] = len(self.sketches)
             
-            print(f"✅ Loaded {len(self.df)} successful records")
-            print(f"📅 Date range: {self.df['date'].min()} to {self.df['date'].max()}")
-            print(f"🏷️  Unique prompts: {self.df['promptId'].nunique()}")
-            print(f"🤖 Models: {', '.join(self.df['model'].unique())}")
+            print(f"✅ Loaded {self.row_count} successful records")
+            print(f"📅 Date range: {day_dates(self.cube['date'].min()).date()} to {day_dates(self.cube['date'].max()).date()}")
+            print(f"🏷️  Unique prompts: {self.cube['promptId'].nunique()}")
+            print(f"🤖 Models: {', '.join(self.cube['model'].unique())}")
+            # Generations are not rolled up, and counting them would load every run
+            counts = {} if self.from_rollups else self.generation_counts()
+            if len(counts) > 1:
+                print(f"🧬 File generations: {', '.join(f'{name} ({n:,} rows)' for name, n in counts.items())}")
             
             return True
             
@@ -70,445 +216,434 @@ class LLMPerformanceAnalyzer:
             print(f"❌ Error loading data: {e}")
             return False
     
-    def create_per_prompt_time_series(self):
-        """Create linear plots showing latency over time for each prompt"""
-        if self.df is None:
-            print("❌ No data loaded. Please load data first.")
-            return
-        
-        print("📊 Creating per-prompt time series analysis...")
-        
-        # Get unique prompts
-        unique_prompts = self.df['promptId'].unique()
-        num_prompts = len(unique_prompts)
-        
-        # Calculate grid layout - try to make it roughly square
-        cols = min(2, num_prompts)  # Max 2 columns for readability
-        rows = (num_prompts + cols - 1) // cols
-        
-        # Create figure with subplots
-        fig, axes = plt.subplots(rows, cols, figsize=(20, 6*rows))
-        fig.suptitle('Latency Over Time by Prompt', fontsize=20, fontweight='bold')
-        
-        # Handle case where we have only one subplot
-        if num_prompts == 1:
-            axes = [axes]
-        elif rows == 1:
-            axes = axes if isinstance(axes, np.ndarray) else [axes]
-        else:
-            axes = axes.flatten()
-        
-        # Color palette for different models
-        model_colors = plt.cm.Set1(np.linspace(0, 1, len(self.df['model'].unique())))
-        model_color_map = dict(zip(self.df['model'].unique(), model_colors))
+    def load_from_rollups(self):
+        """Aggregate the window from the daily rollups, plus raw rows for the time they do not cover
+        
+        Days completed since the last run are rolled up first. Returns the number
+        of stored days read and of raw rows aggregated.
+        """
+        with self.timer.stage('rollups.update') as stage:
+            stage['days'] = self.update_rollups()
+        days, ranges = split_window(self.filters, self.rollup_store.through(), self.timezone)
+        
+        parts = []
+        stored_days = 0
+        if days:
+            with self.timer.stage('rollups.read') as stage:
+                tables, stored_days = self.rollup_store.read_days(*days, filters=self.filters)
+                stage['days'] = stored_days
+            if tables:
+                parts.append(tables)
+        
+        raw_rows = 0
+        for since, until in ranges:
+            filters = dict(self.filters or {}, since=since, until=until)
+            rows = self._load_rows({name: value for name, value in filters.items() if value is not None})
+            raw_rows += len(rows)
+            with self.timer.stage('aggregate.raw', rows=len(rows)):
+                parts.append(self._aggregate_rows(rows))
+        
+        if parts:
+            # Each day comes from one part, so a stable sort by day restores the time order of first appearance
+            self.cube, self.sketches, self.length_sketches = (
+                concat_frames(list(tables)).sort_values('date', kind='stable', ignore_index=True)
+                for tables in zip(*parts))
+        self.from_rollups = True
+        return stored_days, raw_rows
+    
+    def update_rollups(self):
+        """Roll up every day completed since the store was last updated and return how many had data"""
+        yesterday = current_day(self.timezone) - 1
+        through = self.rollup_store.through()
+        if through is not None and through >= yesterday:
+            return 0
+        
+        # Every row of those days is rolled up, whatever this report is filtered on
+        filters = {'until': day_start(yesterday + 1, self.timezone) - ONE_NS}
+        if through is not None:
+            filters['since'] = day_start(through + 1, self.timezone)
+        print(f"🗄️  Rolling up completed days through {day_dates(yesterday).date()}")
+        days = self.rollup_store.write_days(*self._aggregate_rows(self._load_rows(filters)), through=yesterday)
+        print(f"✅ Stored rollups of {days} day(s) in {self.rollup_store.location}")
+        return days
+    
+    def _load_rows(self, filters):
+        """Rows matching `filters`, ready to aggregate: scanned Arrow rows, or a time-ordered frame with calendar keys"""
+        if self.backend == 'arrow':
+            return scan_rows(self.source, filters=filters, tz=self.timezone, timer=self.timer)
+        df = self.source.load(filters=filters, timer=self.timer)
+        return add_calendar_features(df, self.timezone).sort_values('timestamp')
+    
+    def _aggregate_rows(self, rows):
+        """Cube, latency sketches and response length sketches of rows from _load_rows"""
+        if self.backend == 'arrow':
+            return (cube_from_rows(rows), sketches_from_rows(rows),
+                    sketches_from_rows(rows, LENGTH_SKETCH_KEYS, 'responseLength'))
+        return build_cube(rows), build_sketches(rows), build_sketches(rows, LENGTH_SKETCH_KEYS, 'responseLength')
+    
+    def generation_counts(self):
+        """Rows per monitor file generation that has any, from whichever form the rows are loaded in"""
+        if self.rows is not None:
+            return value_counts(self.rows, 'generation')
+        if 'generation' not in self.df.columns:
+            return {}
+        return {name: n for name, n in self.df['generation'].value_counts(sort=False).items() if n}
+    
+    @timed('snapshot')
+    def save_snapshot(self, path):
+        """Save the rows matching the filters as a local Arrow IPC or Parquet file that later runs can use as source"""
+        try:
+            print(f"📊 Loading data from {self.source}")
+            df = self.source.load(filters=self.filters, timer=self.timer)
+            write_arrow_file(df, path)
+        except Exception as e:
+            print(f"❌ Error saving snapshot: {e}")
+            return False
         
-        # Create a plot for each prompt
-        for i, prompt_id in enumerate(unique_prompts):
-            ax = axes[i]
-            
-            # Filter data for this prompt
-            prompt_data = self.df[self.df['promptId'] == prompt_id].copy()
-            
-            # Group by model and plot each model's latency over time
-            for model in prompt_data['model'].unique():
-                model_data = prompt_data[prompt_data['model'] == model]
-                
-                ax.plot(model_data['timestamp'], model_data['latencyMs'], 
-                       marker='o', linewidth=2, markersize=4, 
-                       color=model_color_map[model], label=model, alpha=0.8)
-            
-            # Customize the subplot
-            ax.set_title(f'Prompt: {prompt_id}', fontsize=14, fontweight='bold')
-            ax.set_xlabel('Time')
-            ax.set_ylabel('Latency (ms)')
-            ax.grid(True, alpha=0.3)
-            ax.legend()
+        print(f"✅ Saved {len(df):,} records as '{path}' (use with --source {path})")
+        return True
+    
+    def _latency_points(self):
+        """Time-ordered latency points to draw: every run, or with rollups each hour's mean per prompt and model"""
+        if not self.from_rollups:
+            return self.df
+        cells = cube_cells(self.cube, self.timezone).sort_values('start', kind='stable')
+        return pd.DataFrame({
+            'promptId': cells['promptId'],
+            'model': cells['model'],
+            'timestamp': pd.to_datetime(cells['start'], utc=True),
+            'latencyMs': cells['total'] / cells['count'],
+        })
+    
+    def _fit_trends(self, keys):
+        """Latency trend per `keys` group: fitted to the loaded rows, or to the cube's hourly cells with rollups"""
+        if self.from_rollups:
+            return fit_trend_cells(cube_cells(self.cube, self.timezone, keys), keys)
+        return fit_trends(self.df, keys)
+    
+    def _per_prompt_time_series_inputs(self):
+        """Per-prompt, per-model latency series with an overall trend and change points for each prompt
+        
+        The points (runs, or hourly means with rollups) are split into
+        (promptId, model) series with a single stable sort (they are already in
+        time order), and each series is downsampled to at most MAX_LINE_POINTS
+        points that keep its drawn shape.
+        """
+        points = self._latency_points()
+        # Prompts and models in order of first appearance, as the chart has always listed them
+        prompt_codes, prompt_ids = pd.factorize(points['promptId'])
+        model_codes, models = pd.factorize(points['model'])
+        
+        series = prompt_codes.astype('int64') * len(models) + model_codes
+        order = np.argsort(series, kind='stable')
+        series = series[order]
+        bounds = np.searchsorted(series, np.arange(len(prompt_ids) * len(models) + 1))
+        
+        timestamps = points['timestamp'].dt.tz_localize(None).to_numpy()[order]
+        x_numeric = timestamps.astype('int64')
+        latency = points['latencyMs'].to_numpy(dtype='float64')[order]
+        prompt_stats = rollup(self.cube, ['promptId'])
+        prompt_trends = self._fit_trends(['promptId'])
+        origin = prompt_trends.attrs['origin'].value
+        change_points = self.latency_trends()[1]
+        
+        prompts = []
+        for i, prompt_id in enumerate(prompt_ids):
+            # Series of one prompt are adjacent: one slice holds all its models
+            start, end = bounds[i * len(models)], bounds[(i + 1) * len(models)]
             
-            # Format x-axis to show time nicely
-            ax.tick_params(axis='x', rotation=45)
+            lines = []
+            for m, model in enumerate(models):
+                lo, hi = bounds[i * len(models) + m], bounds[i * len(models) + m + 1]
+                if hi > lo:
+                    keep = lo + minmax_downsample(x_numeric[lo:hi], latency[lo:hi])
+                    lines.append((model, timestamps[keep], latency[keep]))
             
-            # Add trend line if there are enough points
-            if len(prompt_data) > 3:
-                # Calculate overall trend across all models
-                x_numeric = pd.to_numeric(prompt_data['timestamp'])
-                z = np.polyfit(x_numeric, prompt_data['latencyMs'], 1)
-                p = np.poly1d(z)
-                ax.plot(prompt_data['timestamp'], p(x_numeric), 
-                       '--', color='red', alpha=0.7, linewidth=1, 
-                       label=f'Trend (slope: {z[0]:.2e})')
+            # Overall trend across all models if there are enough points, from the batched fit
+            trend = None
+            if end - start > 3:
+                fit = prompt_trends.loc[prompt_id]
+                ends = np.array([x_numeric[start:end].min(), x_numeric[start:end].max()])
+                days = (ends - origin) / NS_PER_DAY
+                trend = {'x': ends.astype('datetime64[ns]'), 'y': fit['intercept'] + fit['slope'] * days,
+                         'slope': fit['slope']}
             
-            # Add statistics text
-            stats_text = (f"Avg: {prompt_data['latencyMs'].mean():.1f}ms\n"
-                         f"Std: {prompt_data['latencyMs'].std():.1f}ms\n"
-                         f"Runs: {len(prompt_data)}")
+            # Level shifts of this prompt's models, drawn as markers on the time axis
+            changes = change_points[change_points['promptId'] == prompt_id]
+            shifts = [(model, at.tz_localize(None)) for model, at in zip(changes['model'], changes['at'])]
             
-            ax.text(0.02, 0.98, stats_text, transform=ax.transAxes, 
-                   verticalalignment='top', bbox=dict(boxstyle='round', 
-                   facecolor='wheat', alpha=0.8), fontsize=10)
-        
-        # Hide any unused subplots
-        for i in range(num_prompts, len(axes)):
-            axes[i].set_visible(False)
-        
-        plt.tight_layout()
-        plt.savefig('per_prompt_latency_time_series.png', dpi=300, bbox_inches='tight')
-        plt.show()
+            stats = prompt_stats.loc[prompt_id]
+            prompts.append({
+                'prompt_id': prompt_id,
+                'lines': lines,
+                'trend': trend,
+                'change_points': shifts,
+                'mean': stats['latencyMs_mean'],
+                'std': stats['latencyMs_std'],
+                'count': int(stats['latencyMs_count']),
+            })
+        
+        return {'prompts': prompts, 'models': list(models)}
+    
+    def _prompt_comparison_matrix_inputs(self):
+        """Prompt x model statistics and heatmap pivots"""
+        # Calculate statistics for each prompt-model combination
+        stats = rollup(self.cube, ['promptId', 'model'])[[
+            'latencyMs_mean', 'latencyMs_std', 'latencyMs_count',
+            'responseLength_mean', 'totalTokens_mean'
+        ]].round(2).reset_index()
+        
+        return {
+            'stats': stats,
+            'latency': pivot(self.cube, 'promptId', 'model', 'latencyMs_mean'),
+            'response': pivot(self.cube, 'promptId', 'model', 'responseLength_mean'),
+            'tokens': pivot(self.cube, 'promptId', 'model', 'totalTokens_mean'),
+            'cv': pivot(self.cube, 'promptId', 'model', 'latencyMs_cv'),
+        }
+    
+    def _hourly_analysis_inputs(self):
+        """Hourly roll-up of the cube plus per-hour box statistics"""
+        hourly = rollup(self.cube, ['hour']).reset_index()
+        
+        hourly_latency = hourly[['hour', 'latencyMs_mean', 'latencyMs_std', 'latencyMs_count']]
+        hourly_latency.columns = ['hour', 'mean', 'std', 'count']
+        hourly_response = hourly[['hour', 'responseLength_mean', 'responseLength_std']]
+        hourly_response.columns = ['hour', 'mean', 'std']
+        
+        return {
+            'timezone': self.timezone,
+            'hourly_latency': hourly_latency,
+            'hourly_response': hourly_response,
+            'box_latency': self._box_stats('hour', 'latencyMs'),
+            'box_response': self._box_stats('hour', 'responseLength'),
+        }
+    
+    def _daily_analysis_inputs(self):
+        """Day-of-week and per-date roll-ups of the cube"""
+        weekly = rollup(self.cube, ['day_of_week_num']).sort_index().reset_index()
+        by_date = rollup(self.cube, ['date']).reset_index()
+        by_date['date'] = day_dates(by_date['date'])
+        by_date = by_date.sort_values('date')
+        
+        daily_latency = weekly[['day_of_week_num', 'latencyMs_mean', 'latencyMs_std', 'latencyMs_count']]
+        daily_latency.columns = ['day_of_week_num', 'mean', 'std', 'count']
+        daily_response = weekly[['day_of_week_num', 'responseLength_mean', 'responseLength_std']]
+        daily_response.columns = ['day_of_week_num', 'mean', 'std']
+        
+        daily_time_series = by_date[['date', 'latencyMs_mean', 'latencyMs_std']]
+        daily_time_series.columns = ['date', 'mean', 'std']
+        response_time_series = by_date[['date', 'responseLength_mean', 'responseLength_std']]
+        response_time_series.columns = ['date', 'mean', 'std']
+        
+        return {
+            'daily_latency': daily_latency,
+            'daily_response': daily_response,
+            'daily_time_series': daily_time_series,
+            'response_time_series': response_time_series,
+        }
+    
+    def _heatmaps_inputs(self):
+        """Day-of-week x hour pivots from one roll-up of the cube"""
+        day_hour = rollup(self.cube, ['day_of_week_num', 'hour'])
+        
+        def day_hour_pivot(value):
+            # Rows are day numbers, Monday first; names are attached when rendering
+            return day_hour[value].unstack(fill_value=0).reindex(range(7), fill_value=0)
+        
+        return {
+            'latency': day_hour_pivot('latencyMs_mean'),
+            'response': day_hour_pivot('responseLength_mean'),
+            'count': day_hour_pivot('latencyMs_count'),
+            'cv': day_hour_pivot('latencyMs_cv'),
+            'timezone': self.timezone,
+        }
+    
+    def _box_stats(self, by, column):
+        """Per-group box plot statistics: exact from the loaded rows, or read from the sketches with rollups"""
+        if self.from_rollups:
+            sketches = self.sketches if column == 'latencyMs' else self.length_sketches
+            return sketch_boxplot_stats(sketches, by, rollup(self.cube, [by])[f'{column}_mean'])
+        return boxplot_stats(self.df, by, column)
+    
+    def _tail_latency_analysis_inputs(self):
+        """Latency percentiles read from the sketches"""
+        return {
+            'hourly_tails': sketch_quantiles(self.sketches, ['hour']).sort_index(),
+            'p99': sketch_quantiles(self.sketches, ['promptId', 'model'])['p99'].unstack(fill_value=0),
+        }
+    
+    def _model_comparison_inputs(self):
+        """Model x hour means and per-model box statistics; None with fewer than two models"""
+        if self.cube['model'].nunique() < 2:
+            return None
+        
+        model_hour = rollup(self.cube, ['model', 'hour'])
+        return {
+            'model_hour_latency': model_hour['latencyMs_mean'].unstack(),
+            'model_hour_response': model_hour['responseLength_mean'].unstack(),
+            'box_latency': self._box_stats('model', 'latencyMs'),
+            'box_response': self._box_stats('model', 'responseLength'),
+        }
+    
+    def figure_inputs(self, name):
+        """Aggregated inputs for one figure in monitor_figures.FIGURES"""
+        with self.timer.stage(f'inputs.{name}'):
+            return getattr(self, f'_{name}_inputs')()
+    
+    def _render(self, name, inputs):
+        """Render one figure in this process, showing it unless running headless"""
+        with self.timer.stage(f'render.{name}'):
+            paths = render_figure(name, inputs, profile=self.profile, output_dir=self.output_dir,
+                                  show=not self.headless, cache_dir=self.figure_cache_dir,
+                                  page_format=self.page_format)
+        self.figure_paths[name] = paths
+        return paths
+    
+    def create_per_prompt_time_series(self):
+        """Create linear plots showing latency over time for each prompt"""
+        if self.cube is None:
+            print("❌ No data loaded. Please load data first.")
+            return
         
-        print("✅ Per-prompt time series saved as 'per_prompt_latency_time_series.png'")
+        print("📊 Creating per-prompt time series analysis...")
+        paths = self._render('per_prompt_time_series', self.figure_inputs('per_prompt_time_series'))
+        print(f"✅ Per-prompt time series saved as {describe_paths(paths)}")
     
     def create_prompt_comparison_matrix(self):
         """Create a comprehensive comparison matrix for all prompts"""
-        if self.df is None:
+        if self.cube is None:
             print("❌ No data loaded. Please load data first.")
             return
         
         print("📊 Creating prompt comparison matrix...")
+        inputs = self.figure_inputs('prompt_comparison_matrix')
+        paths = self._render('prompt_comparison_matrix', inputs)
+        print(f"✅ Prompt comparison matrix saved as {describe_paths(paths)}")
         
-        # Calculate statistics for each prompt-model combination
-        prompt_model_stats = self.df.groupby(['promptId', 'model']).agg({
-            'latencyMs': ['mean', 'std', 'count'],
-            'responseLength': 'mean',
-            'totalTokens': 'mean'
-        }).round(2)
-        
-        # Flatten column names
-        prompt_model_stats.columns = ['_'.join(col).strip() for col in prompt_model_stats.columns]
-        prompt_model_stats = prompt_model_stats.reset_index()
-        
-        # Create pivot table for latency heatmap
-        latency_pivot = self.df.groupby(['promptId', 'model'])['latencyMs'].mean().unstack(fill_value=0)
-        
-        # Create figure with subplots
-        fig, axes = plt.subplots(2, 2, figsize=(20, 16))
-        fig.suptitle('Prompt Performance Comparison Matrix', fontsize=20, fontweight='bold')
-        
-        # 1. Latency heatmap
-        sns.heatmap(latency_pivot, annot=True, fmt='.1f', cmap='YlOrRd', 
-                   ax=axes[0, 0], cbar_kws={'label': 'Avg Latency (ms)'})
-        axes[0, 0].set_title('Average Latency by Prompt and Model', fontsize=14, fontweight='bold')
-        axes[0, 0].set_xlabel('Model')
-        axes[0, 0].set_ylabel('Prompt ID')
-        
-        # 2. Response length heatmap
-        response_pivot = self.df.groupby(['promptId', 'model'])['responseLength'].mean().unstack(fill_value=0)
-        sns.heatmap(response_pivot, annot=True, fmt='.0f', cmap='Blues', 
-                   ax=axes[0, 1], cbar_kws={'label': 'Avg Response Length (chars)'})
-        axes[0, 1].set_title('Average Response Length by Prompt and Model', fontsize=14, fontweight='bold')
-        axes[0, 1].set_xlabel('Model')
-        axes[0, 1].set_ylabel('Prompt ID')
-        
-        # 3. Token usage heatmap
-        tokens_pivot = self.df.groupby(['promptId', 'model'])['totalTokens'].mean().unstack(fill_value=0)
-        sns.heatmap(tokens_pivot, annot=True, fmt='.0f', cmap='Greens', 
-                   ax=axes[1, 0], cbar_kws={'label': 'Avg Total Tokens'})
-        axes[1, 0].set_title('Average Token Usage by Prompt and Model', fontsize=14, fontweight='bold')
-        axes[1, 0].set_xlabel('Model')
-        axes[1, 0].set_ylabel('Prompt ID')
-        
-        # 4. Latency variability (coefficient of variation)
-        latency_cv = self.df.groupby(['promptId', 'model'])['latencyMs'].agg(
-            lambda x: x.std() / x.mean() if x.mean() > 0 else 0
-        ).unstack(fill_value=0)
-        sns.heatmap(latency_cv, annot=True, fmt='.2f', cmap='RdYlBu_r', 
-                   ax=axes[1, 1], cbar_kws={'label': 'Latency CV'})
-        axes[1, 1].set_title('Latency Variability (CV) by Prompt and Model', fontsize=14, fontweight='bold')
-        axes[1, 1].set_xlabel('Model')
-        axes[1, 1].set_ylabel('Prompt ID')
-        
-        plt.tight_layout()
-        plt.savefig('prompt_comparison_matrix.png', dpi=300, bbox_inches='tight')
-        plt.show()
-        
-        print("✅ Prompt comparison matrix saved as 'prompt_comparison_matrix.png'")
-        
-        return prompt_model_stats
+        return inputs['stats']
     
     def create_hourly_analysis(self):
         """Create hourly pattern visualizations"""
-        if self.df is None:
+        if self.cube is None:
             print("❌ No data loaded. Please load data first.")
             return
         
         print("📊 Creating hourly analysis graphs...")
-        
-        # Create figure with subplots
-        fig, axes = plt.subplots(2, 2, figsize=(20, 16))
-        fig.suptitle('Hourly Performance Patterns', fontsize=20, fontweight='bold')
-        
-        # 1. Average Latency by Hour
-        hourly_latency = self.df.groupby('hour')['latencyMs'].agg(['mean', 'std', 'count']).reset_index()
-        
-        axes[0, 0].bar(hourly_latency['hour'], hourly_latency['mean'], 
-                      yerr=hourly_latency['std'], capsize=5, alpha=0.7, color='skyblue')
-        axes[0, 0].set_title('Average Latency by Hour of Day', fontsize=16, fontweight='bold')
-        axes[0, 0].set_xlabel('Hour of Day (24h format)')
-        axes[0, 0].set_ylabel('Average Latency (ms)')
-        axes[0, 0].grid(True, alpha=0.3)
-        axes[0, 0].set_xticks(range(24))
-        
-        # Add value labels on bars
-        for i, v in enumerate(hourly_latency['mean']):
-            axes[0, 0].text(i, v + hourly_latency['std'].iloc[i], f'{v:.0f}ms', 
-                           ha='center', va='bottom', fontsize=10)
-        
-        # 2. Average Response Length by Hour
-        hourly_response = self.df.groupby('hour')['responseLength'].agg(['mean', 'std']).reset_index()
-        
-        axes[0, 1].bar(hourly_response['hour'], hourly_response['mean'], 
-                      yerr=hourly_response['std'], capsize=5, alpha=0.7, color='lightcoral')
-        axes[0, 1].set_title('Average Response Length by Hour of Day', fontsize=16, fontweight='bold')
-        axes[0, 1].set_xlabel('Hour of Day (24h format)')
-        axes[0, 1].set_ylabel('Average Response Length (characters)')
-        axes[0, 1].grid(True, alpha=0.3)
-        axes[0, 1].set_xticks(range(24))
-        
-        # Add value labels on bars
-        for i, v in enumerate(hourly_response['mean']):
-            axes[0, 1].text(i, v + hourly_response['std'].iloc[i], f'{v:.0f}', 
-                           ha='center', va='bottom', fontsize=10)
-        
-        # 3. Latency Distribution by Hour (Box Plot)
-        hourly_data_latency = [self.df[self.df['hour'] == h]['latencyMs'].values for h in range(24)]
-        box_plot = axes[1, 0].boxplot(hourly_data_latency, patch_artist=True)
-        
-        # Color the boxes
-        colors = plt.cm.viridis(np.linspace(0, 1, 24))
-        for patch, color in zip(box_plot['boxes'], colors):
-            patch.set_facecolor(color)
-            patch.set_alpha(0.7)
-        
-        axes[1, 0].set_title('Latency Distribution by Hour', fontsize=16, fontweight='bold')
-        axes[1, 0].set_xlabel('Hour of Day (24h format)')
-        axes[1, 0].set_ylabel('Latency (ms)')
-        axes[1, 0].grid(True, alpha=0.3)
-        axes[1, 0].set_xticklabels(range(24))
-        
-        # 4. Response Length Distribution by Hour (Box Plot)
-        hourly_data_response = [self.df[self.df['hour'] == h]['responseLength'].values for h in range(24)]
-        box_plot_resp = axes[1, 1].boxplot(hourly_data_response, patch_artist=True)
-        
-        # Color the boxes
-        for patch, color in zip(box_plot_resp['boxes'], colors):
-            patch.set_facecolor(color)
-            patch.set_alpha(0.7)
-        
-        axes[1, 1].set_title('Response Length Distribution by Hour', fontsize=16, fontweight='bold')
-        axes[1, 1].set_xlabel('Hour of Day (24h format)')
-        axes[1, 1].set_ylabel('Response Length (characters)')
-        axes[1, 1].grid(True, alpha=0.3)
-        axes[1, 1].set_xticklabels(range(24))
-        
-        plt.tight_layout()
-        plt.savefig('hourly_performance_analysis.png', dpi=300, bbox_inches='tight')
-        plt.show()
-        
-        print("✅ Hourly analysis saved as 'hourly_performance_analysis.png'")
+        paths = self._render('hourly_analysis', self.figure_inputs('hourly_analysis'))
+        print(f"✅ Hourly analysis saved as {describe_paths(paths)}")
     
     def create_daily_analysis(self):
         """Create daily pattern visualizations"""
-        if self.df is None:
+        if self.cube is None:
             print("❌ No data loaded. Please load data first.")
             return
         
         print("📊 Creating daily analysis graphs...")
-        
-        # Create figure with subplots
-        fig, axes = plt.subplots(2, 2, figsize=(20, 16))
-        fig.suptitle('Daily Performance Patterns', fontsize=20, fontweight='bold')
-        
-        # 1. Average Latency by Day of Week
-        daily_latency = self.df.groupby(['day_of_week_num', 'day_of_week'])['latencyMs'].agg(['mean', 'std', 'count']).reset_index()
-        daily_latency = daily_latency.sort_values('day_of_week_num')
-        
-        bars1 = axes[0, 0].bar(daily_latency['day_of_week'], daily_latency['mean'], 
-                              yerr=daily_latency['std'], capsize=5, alpha=0.7, color='lightgreen')
-        axes[0, 0].set_title('Average Latency by Day of Week', fontsize=16, fontweight='bold')
-        axes[0, 0].set_xlabel('Day of Week')
-        axes[0, 0].set_ylabel('Average Latency (ms)')
-        axes[0, 0].grid(True, alpha=0.3)
-        axes[0, 0].tick_params(axis='x', rotation=45)
-        
-        # Add value labels on bars
-        for bar, v in zip(bars1, daily_latency['mean']):
-            axes[0, 0].text(bar.get_x() + bar.get_width()/2, bar.get_height() + 50, f'{v:.0f}ms', 
-                           ha='center', va='bottom', fontsize=10)
-        
-        # 2. Average Response Length by Day of Week
-        daily_response = self.df.groupby(['day_of_week_num', 'day_of_week'])['responseLength'].agg(['mean', 'std']).reset_index()
-        daily_response = daily_response.sort_values('day_of_week_num')
-        
-        bars2 = axes[0, 1].bar(daily_response['day_of_week'], daily_response['mean'], 
-                              yerr=daily_response['std'], capsize=5, alpha=0.7, color='orange')
-        axes[0, 1].set_title('Average Response Length by Day of Week', fontsize=16, fontweight='bold')
-        axes[0, 1].set_xlabel('Day of Week')
-        axes[0, 1].set_ylabel('Average Response Length (characters)')
-        axes[0, 1].grid(True, alpha=0.3)
-        axes[0, 1].tick_params(axis='x', rotation=45)
-        
-        # Add value labels on bars
-        for bar, v in zip(bars2, daily_response['mean']):
-            axes[0, 1].text(bar.get_x() + bar.get_width()/2, bar.get_height() + 20, f'{v:.0f}', 
-                           ha='center', va='bottom', fontsize=10)
-        
-        # 3. Latency Over Time (Time Series)
-        daily_time_series = self.df.groupby('date')['latencyMs'].agg(['mean', 'std']).reset_index()
-        daily_time_series['date'] = pd.to_datetime(daily_time_series['date'])
-        daily_time_series = daily_time_series.sort_values('date')
-        
-        axes[1, 0].plot(daily_time_series['date'], daily_time_series['mean'], 
-                       marker='o', linewidth=2, markersize=6, color='purple')
-        axes[1, 0].fill_between(daily_time_series['date'], 
-                               daily_time_series['mean'] - daily_time_series['std'],
-                               daily_time_series['mean'] + daily_time_series['std'],
-                               alpha=0.3, color='purple')
-        axes[1, 0].set_title('Latency Trend Over Time', fontsize=16, fontweight='bold')
-        axes[1, 0].set_xlabel('Date')
-        axes[1, 0].set_ylabel('Average Latency (ms)')
-        axes[1, 0].grid(True, alpha=0.3)
-        axes[1, 0].tick_params(axis='x', rotation=45)
-        
-        # 4. Response Length Over Time (Time Series)
-        response_time_series = self.df.groupby('date')['responseLength'].agg(['mean', 'std']).reset_index()
-        response_time_series['date'] = pd.to_datetime(response_time_series['date'])
-        response_time_series = response_time_series.sort_values('date')
-        
-        axes[1, 1].plot(response_time_series['date'], response_time_series['mean'], 
-                       marker='s', linewidth=2, markersize=6, color='brown')
-        axes[1, 1].fill_between(response_time_series['date'], 
-                               response_time_series['mean'] - response_time_series['std'],
-                               response_time_series['mean'] + response_time_series['std'],
-                               alpha=0.3, color='brown')
-        axes[1, 1].set_title('Response Length Trend Over Time', fontsize=16, fontweight='bold')
-        axes[1, 1].set_xlabel('Date')
-        axes[1, 1].set_ylabel('Average Response Length (characters)')
-        axes[1, 1].grid(True, alpha=0.3)
-        axes[1, 1].tick_params(axis='x', rotation=45)
-        
-        plt.tight_layout()
-        plt.savefig('daily_performance_analysis.png', dpi=300, bbox_inches='tight')
-        plt.show()
-        
-        print("✅ Daily analysis saved as 'daily_performance_analysis.png'")
+        paths = self._render('daily_analysis', self.figure_inputs('daily_analysis'))
+        print(f"✅ Daily analysis saved as {describe_paths(paths)}")
     
     def create_heatmaps(self):
         """Create heatmaps showing patterns across days and hours"""
-        if self.df is None:
+        if self.cube is None:
             print("❌ No data loaded. Please load data first.")
             return
         
         print("📊 Creating heatmap visualizations...")
+        paths = self._render('heatmaps', self.figure_inputs('heatmaps'))
+        print(f"✅ Heatmaps saved as {describe_paths(paths)}")
+    
+    def create_tail_latency_analysis(self):
+        """Create tail latency (p50/p95/p99) visualizations from the latency sketches"""
+        if self.cube is None:
+            print("❌ No data loaded. Please load data first.")
+            return
         
-        # Create figure with subplots
-        fig, axes = plt.subplots(2, 2, figsize=(20, 16))
-        fig.suptitle('Performance Heatmaps: Day vs Hour Patterns', fontsize=20, fontweight='bold')
-        
-        # Prepare data for heatmaps
-        pivot_latency = self.df.groupby(['day_of_week', 'hour'])['latencyMs'].mean().unstack(fill_value=0)
-        pivot_response = self.df.groupby(['day_of_week', 'hour'])['responseLength'].mean().unstack(fill_value=0)
-        pivot_count = self.df.groupby(['day_of_week', 'hour'])['latencyMs'].count().unstack(fill_value=0)
-        
-        # Reorder days to start with Monday
-        day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        pivot_latency = pivot_latency.reindex(day_order)
-        pivot_response = pivot_response.reindex(day_order)
-        pivot_count = pivot_count.reindex(day_order)
-        
-        # 1. Latency Heatmap
-        sns.heatmap(pivot_latency, annot=True, fmt='.0f', cmap='YlOrRd', 
-                   ax=axes[0, 0], cbar_kws={'label': 'Latency (ms)'})
-        axes[0, 0].set_title('Average Latency by Day and Hour', fontsize=16, fontweight='bold')
-        axes[0, 0].set_xlabel('Hour of Day')
-        axes[0, 0].set_ylabel('Day of Week')
-        
-        # 2. Response Length Heatmap
-        sns.heatmap(pivot_response, annot=True, fmt='.0f', cmap='Blues', 
-                   ax=axes[0, 1], cbar_kws={'label': 'Response Length (chars)'})
-        axes[0, 1].set_title('Average Response Length by Day and Hour', fontsize=16, fontweight='bold')
-        axes[0, 1].set_xlabel('Hour of Day')
-        axes[0, 1].set_ylabel('Day of Week')
-        
-        # 3. Request Count Heatmap
-        sns.heatmap(pivot_count, annot=True, fmt='d', cmap='Greens', 
-                   ax=axes[1, 0], cbar_kws={'label': 'Request Count'})
-        axes[1, 0].set_title('Request Volume by Day and Hour', fontsize=16, fontweight='bold')
-        axes[1, 0].set_xlabel('Hour of Day')
-        axes[1, 0].set_ylabel('Day of Week')
-        
-        # 4. Latency Coefficient of Variation (CV) Heatmap
-        pivot_latency_cv = self.df.groupby(['day_of_week', 'hour'])['latencyMs'].agg(
-            lambda x: x.std() / x.mean() if x.mean() > 0 else 0
-        ).unstack(fill_value=0)
-        pivot_latency_cv = pivot_latency_cv.reindex(day_order)
-        
-        sns.heatmap(pivot_latency_cv, annot=True, fmt='.2f', cmap='RdYlBu_r', 
-                   ax=axes[1, 1], cbar_kws={'label': 'Latency CV'})
-        axes[1, 1].set_title('Latency Variability (Coefficient of Variation)', fontsize=16, fontweight='bold')
-        axes[1, 1].set_xlabel('Hour of Day')
-        axes[1, 1].set_ylabel('Day of Week')
-        
-        plt.tight_layout()
-        plt.savefig('performance_heatmaps.png', dpi=300, bbox_inches='tight')
-        plt.show()
-        
-        print("✅ Heatmaps saved as 'performance_heatmaps.png'")
+        print("📊 Creating tail latency analysis...")
+        paths = self._render('tail_latency_analysis', self.figure_inputs('tail_latency_analysis'))
+        print(f"✅ Tail latency analysis saved as {describe_paths(paths)}")
     
     def create_model_comparison(self):
         """Create model comparison visualizations"""
-        if self.df is None:
+        if self.cube is None:
             print("❌ No data loaded. Please load data first.")
             return
         
-        if 'model' not in self.df.columns or self.df['model'].nunique() < 2:
+        inputs = self.figure_inputs('model_comparison')
+        if inputs is None:
             print("⚠️ No model comparison available - need multiple models in data")
             return
         
         print("📊 Creating model comparison graphs...")
-        
-        # Create figure with subplots
-        fig, axes = plt.subplots(2, 2, figsize=(20, 16))
-        fig.suptitle('Model Performance Comparison', fontsize=20, fontweight='bold')
-        
-        # 1. Latency by Model and Hour
-        model_hour_latency = self.df.groupby(['model', 'hour'])['latencyMs'].mean().unstack()
-        model_hour_latency.plot(kind='bar', ax=axes[0, 0], width=0.8)
-        axes[0, 0].set_title('Average Latency by Model and Hour', fontsize=16, fontweight='bold')
-        axes[0, 0].set_xlabel('Model')
-        axes[0, 0].set_ylabel('Average Latency (ms)')
-        axes[0, 0].legend(title='Hour', bbox_to_anchor=(1.05, 1), loc='upper left')
-        axes[0, 0].tick_params(axis='x', rotation=45)
-        
-        # 2. Response Length by Model and Hour
-        model_hour_response = self.df.groupby(['model', 'hour'])['responseLength'].mean().unstack()
-        model_hour_response.plot(kind='bar', ax=axes[0, 1], width=0.8)
-        axes[0, 1].set_title('Average Response Length by Model and Hour', fontsize=16, fontweight='bold')
-        axes[0, 1].set_xlabel('Model')
-        axes[0, 1].set_ylabel('Average Response Length (chars)')
-        axes[0, 1].legend(title='Hour', bbox_to_anchor=(1.05, 1), loc='upper left')
-        axes[0, 1].tick_params(axis='x', rotation=45)
-        
-        # 3. Model Performance Distribution (Violin Plot)
-        self.df.boxplot(column='latencyMs', by='model', ax=axes[1, 0])
-        axes[1, 0].set_title('Latency Distribution by Model', fontsize=16, fontweight='bold')
-        axes[1, 0].set_xlabel('Model')
-        axes[1, 0].set_ylabel('Latency (ms)')
-        plt.suptitle('')  # Remove automatic title
-        
-        # 4. Model Performance Distribution (Violin Plot)
-        self.df.boxplot(column='responseLength', by='model', ax=axes[1, 1])
-        axes[1, 1].set_title('Response Length Distribution by Model', fontsize=16, fontweight='bold')
-        axes[1, 1].set_xlabel('Model')
-        axes[1, 1].set_ylabel('Response Length (chars)')
-        plt.suptitle('')  # Remove automatic title
-        
-        plt.tight_layout()
-        plt.savefig('model_comparison_analysis.png', dpi=300, bbox_inches='tight')
-        plt.show()
-        
-        print("✅ Model comparison saved as 'model_comparison_analysis.png'")
+        paths = self._render('model_comparison', inputs)
+        print(f"✅ Model comparison saved as {describe_paths(paths)}")
+    
+    def create_figures(self, names=None):
+        """Create the requested figures (all of them by default), in parallel when headless with several workers"""
+        names = list(names or FIGURES)
+        if self.headless and self.render_workers > 1:
+            self.create_figures_parallel(names)
+        else:
+            for name in names:
+                getattr(self, f'create_{name}')()
+    
+    def create_figures_parallel(self, names=None):
+        """Render figures headlessly, one worker process per figure"""
+        print(f"📊 Rendering figures in parallel ({self.render_workers} workers, {self.profile} profile)...")
+        
+        jobs = []
+        for name in names or FIGURES:
+            inputs = self.figure_inputs(name)
+            if inputs is None:
+                print(f"⚠️ Skipping {name} - not enough data")
+                continue
+            jobs.append((name, inputs))
+        
+        with self.timer.stage('render.parallel', figures=len(jobs)):
+            for name, paths in render_figures_parallel(jobs, profile=self.profile, output_dir=self.output_dir,
+                                                       max_workers=self.render_workers,
+                                                       cache_dir=self.figure_cache_dir,
+                                                       page_format=self.page_format):
+                self.figure_paths[name] = paths
+                print(f"✅ {name} saved as {describe_paths(paths)}")
     
+    @timed('export')
+    def export_tables(self, output_dir='.', fmt='csv'):
+        """Write the aggregated tables behind the report (csv, json or parquet) and return their paths"""
+        if self.cube is None:
+            print("❌ No data loaded. Please load data first.")
+            return []
+        
+        fits = self.latency_trends()[0].reset_index()
+        # Intercepts are relative to the fits' time origin; as a column it survives every format
+        fits['origin'] = fits.attrs.pop('origin')
+        
+        tables = {
+            'performance_cube': self.cube.assign(date=day_dates(self.cube['date'])),
+            'prompt_model_stats': rollup(self.cube, ['promptId', 'model']).reset_index(),
+            'latency_percentiles': sketch_quantiles(self.sketches, ['promptId', 'model']).reset_index(),
+            'latency_sketches': self.sketches,
+            'latency_trend_fits': fits,
+            'latency_change_points': self.latency_trends()[1],
+        }
+        
+        paths = []
+        for name, table in tables.items():
+            path = os.path.join(output_dir, f"{name}.{fmt}")
+            if fmt == 'parquet':
+                table.to_parquet(path, index=False)
+            elif fmt == 'json':
+                table.to_json(path, orient='records', date_format='iso')
+            else:
+                table.to_csv(path, index=False)
+            print(f"✅ Exported {name} ({len(table):,} rows) to '{path}'")
+            paths.append(path)
+        
+        return paths
+    
+    @timed('summary')
     def generate_summary_stats(self):
         """Generate and display summary statistics"""
-        if self.df is None:
+        if self.cube is None:
             print("❌ No data loaded. Please load data first.")
             return
         
@@ -516,74 +651,148 @@ class LLMPerformanceAnalyzer:
         print("📊 PERFORMANCE SUMMARY STATISTICS")
         print("="*80)
         
+        overall = rollup(self.cube, []).iloc[0]
+        tails = sketch_quantiles(self.sketches, [], quantiles=(0.95, 0.99)).iloc[0]
+        
         # Overall statistics
         print(f"\n🔢 Overall Statistics:")
-        print(f"   • Total successful requests: {len(self.df):,}")
-        print(f"   • Date range: {self.df['date'].min()} to {self.df['date'].max()}")
-        print(f"   • Unique prompts: {self.df['promptId'].nunique()}")
-        print(f"   • Models tested: {', '.join(self.df['model'].unique())}")
+        print(f"   • Total successful requests: {self.row_count:,}")
+        print(f"   • Date range: {day_dates(self.cube['date'].min()).date()} to {day_dates(self.cube['date'].max()).date()}")
+        print(f"   • Unique prompts: {self.cube['promptId'].nunique()}")
+        print(f"   • Models tested: {', '.join(self.cube['model'].unique())}")
         
         # Latency statistics
         print(f"\n⏱️ Latency Statistics:")
-        print(f"   • Mean: {self.df['latencyMs'].mean():.2f} ms")
-        print(f"   • Median: {self.df['latencyMs'].median():.2f} ms")
-        print(f"   • Std Dev: {self.df['latencyMs'].std():.2f} ms")
-        print(f"   • Min: {self.df['latencyMs'].min():.2f} ms")
-        print(f"   • Max: {self.df['latencyMs'].max():.2f} ms")
-        print(f"   • 95th percentile: {self.df['latencyMs'].quantile(0.95):.2f} ms")
+        print(f"   • Mean: {overall['latencyMs_mean']:.2f} ms")
+        print(f"   • Median: {self.latency_median():.2f} ms")
+        print(f"   • Std Dev: {overall['latencyMs_std']:.2f} ms")
+        print(f"   • Min: {overall['latencyMs_min']:.2f} ms")
+        print(f"   • Max: {overall['latencyMs_max']:.2f} ms")
+        print(f"   • 95th percentile: {tails['p95']:.2f} ms")
+        print(f"   • 99th percentile: {tails['p99']:.2f} ms")
         
         # Response length statistics
         print(f"\n📝 Response Length Statistics:")
-        print(f"   • Mean: {self.df['responseLength'].mean():.2f} characters")
-        print(f"   • Median: {self.df['responseLength'].median():.2f} characters")
-        print(f"   • Std Dev: {self.df['responseLength'].std():.2f} characters")
-        print(f"   • Min: {self.df['responseLength'].min():.0f} characters")
-        print(f"   • Max: {self.df['responseLength'].max():.0f} characters")
+        print(f"   • Mean: {overall['responseLength_mean']:.2f} characters")
+        print(f"   • Median: {self.response_length_median():.2f} characters")
+        print(f"   • Std Dev: {overall['responseLength_std']:.2f} characters")
+        print(f"   • Min: {overall['responseLength_min']:.0f} characters")
+        print(f"   • Max: {overall['responseLength_max']:.0f} characters")
         
         # Per-prompt statistics
         print(f"\n🏷️ Per-Prompt Statistics:")
-        prompt_stats = self.df.groupby('promptId').agg({
-            'latencyMs': ['mean', 'std', 'count'],
-            'responseLength': 'mean'
-        }).round(2)
-        
-        for prompt_id in self.df['promptId'].unique():
-            mean_lat = prompt_stats.loc[prompt_id, ('latencyMs', 'mean')]
-            std_lat = prompt_stats.loc[prompt_id, ('latencyMs', 'std')]
-            count = prompt_stats.loc[prompt_id, ('latencyMs', 'count')]
-            mean_resp = prompt_stats.loc[prompt_id, ('responseLength', 'mean')]
-            print(f"   • {prompt_id}: {mean_lat:.1f}ms (±{std_lat:.1f}), {count} runs, {mean_resp:.0f} chars avg")
+        prompt_stats = rollup(self.cube, ['promptId']).round(2)
+        prompt_tails = sketch_quantiles(self.sketches, ['promptId'])
+        
+        for prompt_id in self.cube['promptId'].unique():
+            row = prompt_stats.loc[prompt_id]
+            tail = prompt_tails.loc[prompt_id]
+            print(f"   • {prompt_id}: {row['latencyMs_mean']:.1f}ms (±{row['latencyMs_std']:.1f}), "
+                  f"p95 {tail['p95']:.0f}ms, p99 {tail['p99']:.0f}ms, "
+                  f"{int(row['latencyMs_count'])} runs, {row['responseLength_mean']:.0f} chars avg")
+        
+        # Tail latency per model
+        print(f"\n🐢 Tail Latency by Model:")
+        for model, tail in sketch_quantiles(self.sketches, ['model']).iterrows():
+            print(f"   • {model}: p50 {tail['p50']:.0f}ms, p95 {tail['p95']:.0f}ms, p99 {tail['p99']:.0f}ms")
         
         # Peak hours analysis
-        if len(self.df) > 0:
-            hourly_stats = self.df.groupby('hour').agg({
-                'latencyMs': ['mean', 'count'],
-                'responseLength': 'mean'
-            }).round(2)
+        if len(self.cube) > 0:
+            hourly_latency = rollup(self.cube, ['hour'])['latencyMs_mean'].round(2)
             
-            peak_latency_hour = hourly_stats[('latencyMs', 'mean')].idxmax()
-            lowest_latency_hour = hourly_stats[('latencyMs', 'mean')].idxmin()
+            peak_latency_hour = hourly_latency.idxmax()
+            lowest_latency_hour = hourly_latency.idxmin()
             
             print(f"\n🕐 Hourly Patterns:")
-            print(f"   • Highest latency hour: {peak_latency_hour}:00 ({hourly_stats.loc[peak_latency_hour, ('latencyMs', 'mean')]:.2f} ms)")
-            print(f"   • Lowest latency hour: {lowest_latency_hour}:00 ({hourly_stats.loc[lowest_latency_hour, ('latencyMs', 'mean')]:.2f} ms)")
+            print(f"   • Highest latency hour: {peak_latency_hour}:00 ({hourly_latency[peak_latency_hour]:.2f} ms)")
+            print(f"   • Lowest latency hour: {lowest_latency_hour}:00 ({hourly_latency[lowest_latency_hour]:.2f} ms)")
         
         # Daily patterns
-        if len(self.df) > 0:
-            daily_stats = self.df.groupby('day_of_week').agg({
-                'latencyMs': 'mean',
-                'responseLength': 'mean'
-            }).round(2)
+        if len(self.cube) > 0:
+            daily_latency = rollup(self.cube, ['day_of_week_num'])['latencyMs_mean'].round(2)
             
-            best_day = daily_stats['latencyMs'].idxmin()
-            worst_day = daily_stats['latencyMs'].idxmax()
+            best_day = daily_latency.idxmin()
+            worst_day = daily_latency.idxmax()
             
             print(f"\n📅 Daily Patterns:")
-            print(f"   • Best performing day: {best_day} ({daily_stats.loc[best_day, 'latencyMs']:.2f} ms)")
-            print(f"   • Worst performing day: {worst_day} ({daily_stats.loc[worst_day, 'latencyMs']:.2f} ms)")
+            print(f"   • Best performing day: {DAY_NAMES[best_day]} ({daily_latency[best_day]:.2f} ms)")
+            print(f"   • Worst performing day: {DAY_NAMES[worst_day]} ({daily_latency[worst_day]:.2f} ms)")
         
         print("="*80)
     
+    def _median(self, column, sketches):
+        """Median of a column: exact from the loaded rows, or from its sketches with rollups"""
+        if self.from_rollups:
+            return sketch_quantiles(sketches, [], quantiles=(0.5,))['p50'].iloc[0]
+        if self.rows is not None:
+            return column_median(self.rows, column)
+        return self.df[column].median()
+    
+    def latency_median(self):
+        """Median latency; the p95/p99 tails always come from the latency sketches"""
+        return self._median('latencyMs', self.sketches)
+    
+    def response_length_median(self):
+        """Median response length"""
+        return self._median('responseLength', self.length_sketches)
+    
+    def latency_trends(self):
+        """Trend fit and change points of every (promptId, model) series, computed once per load"""
+        if self.trends is None:
+            self.trends = self._fit_trends(TREND_KEYS)
+            if self.from_rollups:
+                self.change_points = change_points_from_cells(cube_cells(self.cube, self.timezone))
+            else:
+                self.change_points = detect_change_points(self.df)
+        return self.trends, self.change_points
+    
+    @timed('trends')
+    def analyze_trends(self, output_dir='.'):
+        """Print latency trends and level shifts per prompt and model, and save them as JSON"""
+        if self.cube is None:
+            print("❌ No data loaded. Please load data first.")
+            return None
+        
+        trends, change_points = self.latency_trends()
+        
+        print(f"\n📈 Latency Trends & Change Points:")
+        for (prompt_id, model), trend in trends.iterrows():
+            if pd.isna(trend['ci_low']):
+                print(f"   • {prompt_id} / {model}: not enough runs for a trend")
+                continue
+            print(f"   • {prompt_id} / {model}: {trend['slope']:+.2f} ms/day "
+                  f"(95% CI {trend['ci_low']:+.2f} to {trend['ci_high']:+.2f}), {trend['direction']}")
+        
+        if len(change_points) == 0:
+            print("   • No latency level shifts detected")
+        for _, change in change_points.iterrows():
+            # Shifts start on an hour in UTC; zones with half-hour offsets keep their minutes
+            at = change['at'].tz_convert(self.timezone)
+            print(f"   ⚠️ {change['promptId']} / {change['model']}: {change['before']:.0f}ms → {change['after']:.0f}ms "
+                  f"({change['shift_pct']:+.0f}%) at {at:%Y-%m-%d %H:%M} {self.timezone}")
+        
+        path = os.path.join(output_dir, 'latency_trends.json')
+        with open(path, 'w') as f:
+            json.dump(trend_report(trends, change_points), f, indent=2)
+        print(f"✅ Latency trends saved as '{path}'")
+        return path
+    
+    def write_run_report(self, path=None, **meta):
+        """Print a one-line timing summary and, given a path, save the timing and memory of every stage as JSON"""
+        report = self.timer.report(
+            **meta,
+            rows=self.row_count,
+            bytes_read=self.timer.total('bytes', 'load/'),
+            filters={name: str(value) for name, value in (self.filters or {}).items()},
+        )
+        if path is None:
+            print(f"\n{self.timer.summary_line()}")
+            return report
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n{self.timer.summary_line()} (details in '{path}')")
+        return report
+    
     def run_full_analysis(self):
         """Run the complete analysis pipeline"""
         print("🚀 Starting comprehensive performance analysis...")
@@ -594,39 +803,152 @@ class LLMPerformanceAnalyzer:
         
         # Generate summary statistics
         self.generate_summary_stats()
+        self.analyze_trends(self.output_dir)
         
         # Create all visualizations - starting with the new per-prompt time series
-        self.create_per_prompt_time_series()
-        self.create_prompt_comparison_matrix()
-        self.create_hourly_analysis()
-        self.create_daily_analysis()
-        self.create_heatmaps()
-        self.create_model_comparison()
+        self.create_figures()
         
         print("\n✅ Analysis complete! Generated files:")
-        print("   • per_prompt_latency_time_series.png")
-        print("   • prompt_comparison_matrix.png")
-        print("   • hourly_performance_analysis.png")
-        print("   • daily_performance_analysis.png")
-        print("   • performance_heatmaps.png")
-        print("   • model_comparison_analysis.png")
+        for paths in self.figure_paths.values():
+            print(f"   • {describe_paths([os.path.basename(path) for path in paths], quote='')}")
+        print("   • latency_trends.json")
         
         return True
 
-def main():
+def _add_filter_options(parser, default):
+    """Data source, row filters and instrumentation options shared by every subcommand"""
+    parser.add_argument('--source', default=default, metavar='LOCATION',
+                        help='s3://bucket/key, s3://bucket/prefix/, a local .csv, .arrow or .parquet file, '
+                             'or synthetic[:ROWS] (MONITOR_SOURCE, default: S3_BUCKET/S3_KEY)')
+    parser.add_argument('--backend', choices=BACKENDS, default=default,
+                        help='scan and aggregate with pandas or with multithreaded Arrow query plans '
+                             '(ANALYSIS_BACKEND, default pandas)')
+    parser.add_argument('--rollups', default=default, metavar='LOCATION',
+                        help='directory or s3://bucket/prefix/ for daily rollups of completed days (ROLLUP_STORE)')
+    parser.add_argument('--since', default=default,
+                        help='first timestamp or date to include, or a window such as 24h or 7d')
+    parser.add_argument('--until', default=default, help='last timestamp or date to include')
+    parser.add_argument('--prompt', dest='prompts', action='append', default=default, metavar='PROMPT_ID',
+                        help='only this prompt (repeatable)')
+    parser.add_argument('--model', dest='models', action='append', default=default, metavar='MODEL',
+                        help='only this model (repeatable)')
+    parser.add_argument('--category', dest='categories', action='append', default=default, metavar='CATEGORY',
+                        help='only prompts of this category, e.g. short, medium, long (repeatable)')
+    parser.add_argument('--timezone', default=default,
+                        help='timezone for hours and days, e.g. Europe/Berlin (REPORT_TIMEZONE, default UTC)')
+    parser.add_argument('--run-report', default=default, metavar='PATH',
+                        help='write the per-stage timing report to PATH (the full report writes run_report.json '
+                             'to the output dir by default; other commands only print a summary line)')
+    parser.add_argument('--cprofile', default=default, metavar='PATH',
+                        help='profile the run with cProfile and save the stats here')
+    parser.add_argument('--trace-memory', action='store_true', default=default,
+                        help='also record tracemalloc peaks per stage; slower (REPORT_TRACEMALLOC)')
+
+def parse_args(argv=None):
+    """Parse the command line; without a subcommand the full report is produced"""
+    parser = argparse.ArgumentParser(description='Quantitative performance analysis of the LLM monitor data')
+    parser.set_defaults(figures=None, headless=None, profile=None, page_format=None, workers=None,
+                        output_dir='.', format='csv')
+    _add_filter_options(parser, default=None)
+    subparsers = parser.add_subparsers(dest='command')
+    
+    # Source, filter and instrumentation options may be given before or after the subcommand
+    filter_options = argparse.ArgumentParser(add_help=False)
+    _add_filter_options(filter_options, default=argparse.SUPPRESS)
+    
+    render_options = argparse.ArgumentParser(add_help=False)
+    render_options.add_argument('--headless', action='store_true', default=None,
+                                help='render with the Agg backend and never open windows (REPORT_HEADLESS)')
+    render_options.add_argument('--profile', choices=list(PROFILES),
+                                help=f'render profile (FIGURE_PROFILE, default {DEFAULT_PROFILE})')
+    render_options.add_argument('--page-format', choices=PAGE_FORMATS,
+                                help='png (a numbered file per page) or pdf (one multi-page file per figure) '
+                                     f'(FIGURE_PAGE_FORMAT, default {DEFAULT_PAGE_FORMAT})')
+    render_options.add_argument('--workers', type=int,
+                                help='parallel render processes when headless (RENDER_WORKERS)')
+    render_options.add_argument('--output-dir', default='.', help='directory for the generated files')
+    
+    subparsers.add_parser('report', parents=[filter_options, render_options],
+                          help='summary statistics and every figure (default)')
+    subparsers.add_parser('summary', parents=[filter_options],
+                          help='summary statistics only; plotting libraries are never loaded')
+    figures = subparsers.add_parser('figures', parents=[filter_options, render_options], help='render figures only')
+    figures.add_argument('--figures', nargs='+', choices=list(FIGURES), metavar='NAME',
+                         help=f"figures to render (default: all of {', '.join(FIGURES)})")
+    trends = subparsers.add_parser('trends', parents=[filter_options],
+                                   help='latency trend and change points per prompt and model')
+    trends.add_argument('--output-dir', default='.', help='directory for latency_trends.json')
+    snapshot = subparsers.add_parser('snapshot', parents=[filter_options],
+                                     help='save the matching rows locally for fast offline runs with --source')
+    snapshot.add_argument('--output', default='monitor.arrow',
+                          help='.arrow/.feather (memory-mapped, fastest) or .parquet (smaller) file to write')
+    export = subparsers.add_parser('export', parents=[filter_options],
+                                   help='write the aggregated tables instead of figures')
+    export.add_argument('--format', choices=['csv', 'json', 'parquet'], default='csv')
+    export.add_argument('--output-dir', default='.', help='directory for the exported tables')
+    
+    args = parser.parse_args(argv)
+    args.command = args.command or 'report'
+    return args
+
+def main(argv=None):
     """Main execution function"""
-    analyzer = LLMPerformanceAnalyzer()
+    args = parse_args(argv)
+    os.makedirs(args.output_dir, exist_ok=True)
+    try:
+        analyzer = LLMPerformanceAnalyzer(since=args.since, until=args.until, prompts=args.prompts,
+                                          models=args.models, categories=args.categories, timezone=args.timezone,
+                                          headless=args.headless, profile=args.profile,
+                                          render_workers=args.workers, output_dir=args.output_dir,
+                                          trace_memory=args.trace_memory, source=args.source,
+                                          backend=args.backend, rollups=args.rollups,
+                                          page_format=args.page_format)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    
+    profiler = None
+    if args.cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
     
+    success = False
     try:
-        success = analyzer.run_full_analysis()
+        if args.command == 'report':
+            success = analyzer.run_full_analysis()
+        elif args.command == 'snapshot':
+            success = analyzer.save_snapshot(args.output)
+        else:
+            success = analyzer.load_data_from_s3()
+            if success and args.command == 'summary':
+                analyzer.generate_summary_stats()
+            elif success and args.command == 'figures':
+                analyzer.create_figures(args.figures)
+            elif success and args.command == 'trends':
+                analyzer.analyze_trends(args.output_dir)
+            elif success and args.command == 'export':
+                analyzer.export_tables(args.output_dir, args.format)
+        
         if success:
-            print("\n🎉 All visualizations created successfully!")
+            if args.command == 'report':
+                print("\n🎉 All visualizations created successfully!")
         else:
             print("\n❌ Analysis failed. Please check your configuration and data.")
     except Exception as e:
         print(f"\n💥 Analysis failed with error: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+            print(f"🔬 cProfile stats saved as '{args.cprofile}' (inspect with: python -m pstats {args.cprofile})")
+        run_report = args.run_report
+        if run_report is None and args.command == 'report':
+            run_report = os.path.join(args.output_dir, 'run_report.json')
+        analyzer.write_run_report(run_report, command=args.command, success=success)
+    return 0 if success else 1
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Streaming anomaly detection across scheduled runs
+
+Each run loads the records since the persisted high-water mark and scores
+them against the baselines the earlier runs left behind.
+"""
+
+import pandas as pd
+import pytest
+
+from monitor_anomalies import (DETECTOR_METRICS, MIN_SAMPLES, _update, load_new_records, load_state, new_state,
+                               save_state, score_records)
+from monitor_loader import apply_filters
+from monitor_synth import generate_sample_data
+
+
+class FrameSource:
+    """The successful rows of an in-memory frame, filtered like any other source"""
+
+    def __init__(self, df):
+        self.df = df
+
+    def load(self, filters=None, **_):
+        return apply_filters(self.df[self.df['success']].reset_index(drop=True), filters)
+
+
+@pytest.fixture(scope='module')
+def feed():
+    return generate_sample_data(6000, start=pd.Timestamp('2025-06-02', tz='UTC'), days=14)
+
+
+def _run(source, path):
+    """One scheduled run: load the state, score the new records, save the state"""
+    state = load_state(path)
+    df = load_new_records(source, since=state['last_timestamp'], scored=state['last_count'])
+    anomalies = score_records(state, df)
+    save_state(state, path)
+    return df, anomalies
+
+
+def test_state_carries_over_between_runs(feed, tmp_path):
+    feed = feed.copy()
+    # Four successful records recorded in the same millisecond, split across the two runs
+    successful = feed.index[feed['success']]
+    tied = successful[successful >= len(feed) // 2][:4]
+    feed.loc[tied, 'timestamp'] = feed.loc[tied[0], 'timestamp']
+    path = str(tmp_path / 'anomaly_state.json')
+
+    first, _ = _run(FrameSource(feed.loc[:tied[1]]), path)
+    second, _ = _run(FrameSource(feed), path)
+
+    assert len(first) + len(second) == len(successful)
+    assert (second['timestamp'] == feed.loc[tied[0], 'timestamp']).sum() == 2
+    assert _run(FrameSource(feed), path)[0].empty
+
+    once = new_state()
+    score_records(once, load_new_records(FrameSource(feed)))
+    state = load_state(path)
+    assert state['last_timestamp'] == once['last_timestamp']
+    assert state['baselines'].keys() == once['baselines'].keys()
+    for slot, baseline in once['baselines'].items():
+        assert state['baselines'][slot] == pytest.approx(baseline, rel=1e-9)
+
+
+def test_injected_slow_pair_is_reported(feed, tmp_path):
+    path = str(tmp_path / 'anomaly_state.json')
+    cutoff = pd.Timestamp('2025-06-14', tz='UTC')
+    _run(FrameSource(feed[feed['timestamp'] < cutoff]), path)
+
+    feed = feed.copy()
+    prompt_id, model = feed['promptId'].iloc[0], feed['model'].iloc[0]
+    slow = (feed['promptId'] == prompt_id) & (feed['model'] == model) & (feed['timestamp'] >= cutoff)
+    feed['latencyMs'] = feed['latencyMs'].where(~slow, feed['latencyMs'] * 5)
+    new, anomalies = _run(FrameSource(feed), path)
+
+    onset = new[(new['promptId'] == prompt_id) & (new['model'] == model)].iloc[0]
+    worst = max(anomalies, key=lambda a: abs(a['z']))
+    # The moving baseline adapts after the onset, so the first slow record stands out far beyond the feed's own spikes
+    assert (worst['promptId'], worst['model'], worst['metric']) == (prompt_id, model, 'latencyMs')
+    assert worst['timestamp'] == onset['timestamp'].isoformat()
+    assert worst['value'] == onset['latencyMs']
+    assert worst['z'] > 10
+
+
+def test_missing_metric_does_not_hold_back_the_other():
+    baseline = [0, 0.0, 0.0] * len(DETECTOR_METRICS)
+
+    assert _update(baseline, [None, 50.0], 0.1) == [None, None]
+    assert _update(baseline, [100.0, 60.0], 0.1) == [None, None]
+    # The latency baseline is seeded by its own first value, not the record's
+    assert baseline[:3] == [1, 100.0, 0.0]
+    assert baseline[3:5] == [2, 55.0]
+
+    for value in [100.0, 110.0, 90.0] * 3:
+        _update(baseline, [value, 55.0], 0.1)
+    assert baseline[0] == MIN_SAMPLES
+    z = _update(baseline, [1000.0, 55.0], 0.1)[0]
+    assert z is not None and z > 4
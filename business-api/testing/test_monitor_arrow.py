@@ -0,0 +1,95 @@
+"""
+The Arrow backend against the pandas backend
+
+Both backends analyse the same synthetic monitor CSV; the cube, the sketches
+and their quantiles, the medians and the exported tables must agree up to
+the order in which floating-point sums are taken.
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+from monitor_loader import read_monitor_csv
+from monitor_stats import CUBE_KEYS, SKETCH_KEYS, sketch_quantiles
+from monitor_synth import write_sample_data
+from quantitative_eval_v2 import LLMPerformanceAnalyzer
+
+
+class LoadedSource:
+    """Hides a source's type, so the Arrow backend wraps its loaded frame as it does for S3"""
+
+    def __init__(self, source):
+        self.source = source
+
+    def __str__(self):
+        return str(self.source)
+
+    def load(self, **kwargs):
+        return self.source.load(**kwargs)
+
+
+@pytest.fixture(scope='module')
+def monitor_csv(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('data') / 'monitor.csv')
+    write_sample_data(path, 6000, start=pd.Timestamp('2025-06-02', tz='UTC'), days=10)
+    return path
+
+
+def _load(source, backend, **options):
+    analyzer = LLMPerformanceAnalyzer(source=source, backend=backend, timezone='Europe/Berlin', headless=True,
+                                      **options)
+    assert analyzer.load_data_from_s3()
+    return analyzer
+
+
+def _assert_same_table(left, right, keys):
+    pd.testing.assert_frame_equal(left.sort_values(keys).reset_index(drop=True),
+                                  right.sort_values(keys).reset_index(drop=True),
+                                  check_dtype=False, check_categorical=False, check_exact=False, rtol=1e-9)
+
+
+def test_csv_reader_drops_failed_runs_without_the_success_column(monitor_csv):
+    columns = ['timestamp', 'promptId', 'model', 'latencyMs']
+    everything = read_monitor_csv(monitor_csv, columns=columns + ['success'], successful_only=False)
+    df = read_monitor_csv(monitor_csv, columns=columns)
+
+    assert not everything['success'].all()
+    assert list(df.columns) == columns
+    assert len(df) == everything['success'].sum()
+
+
+@pytest.mark.parametrize('arrow_source', ['file', 'cache', 'loaded'])
+def test_arrow_backend_matches_pandas(monitor_csv, tmp_path, monkeypatch, arrow_source):
+    monkeypatch.setenv('MONITOR_CACHE_DIR', str(tmp_path / 'cache') if arrow_source == 'cache' else '')
+    options = dict(since='2025-06-04', until='2025-06-10')
+    expected = _load(monitor_csv, 'pandas', **options)
+    source = LoadedSource(expected.source) if arrow_source == 'loaded' else monitor_csv
+    analyzer = _load(source, 'arrow', **options)
+
+    assert analyzer.row_count == expected.row_count
+    _assert_same_table(analyzer.cube, expected.cube, CUBE_KEYS)
+    _assert_same_table(analyzer.sketches, expected.sketches, SKETCH_KEYS + ['bucket'])
+    for by in ([], ['promptId'], ['model', 'hour']):
+        pd.testing.assert_frame_equal(sketch_quantiles(analyzer.sketches, by), sketch_quantiles(expected.sketches, by),
+                                      check_dtype=False, check_categorical=False, check_index_type=False)
+    assert analyzer.latency_median() == pytest.approx(expected.latency_median(), rel=1e-12)
+    assert analyzer.response_length_median() == pytest.approx(expected.response_length_median(), rel=1e-12)
+    assert analyzer.generation_counts() == expected.generation_counts()
+
+
+def test_arrow_exports_match_pandas(monitor_csv, tmp_path, monkeypatch):
+    monkeypatch.setenv('MONITOR_CACHE_DIR', '')
+    for backend in ('pandas', 'arrow'):
+        os.makedirs(tmp_path / backend)
+        _load(monitor_csv, backend).export_tables(str(tmp_path / backend))
+
+    names = sorted(os.listdir(tmp_path / 'pandas'))
+    assert names and names == sorted(os.listdir(tmp_path / 'arrow'))
+    for name in names:
+        expected = pd.read_csv(tmp_path / 'pandas' / name)
+        exported = pd.read_csv(tmp_path / 'arrow' / name)
+        assert list(exported.columns) == list(expected.columns), name
+        keys = [col for col in expected.columns if expected[col].dtype != 'float64']
+        _assert_same_table(exported, expected, keys)
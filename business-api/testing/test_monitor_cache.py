@@ -0,0 +1,129 @@
+"""
+Tail ingest of the monitor CSV as api_tester.js rewrites it
+
+Every monitoring run reads the whole CSV back (all values become strings),
+appends its batch and writes everything again. These tests reproduce that
+round trip and check that the cache still only ingests the appended tail, on
+S3 and for a local copy of the file.
+"""
+
+import csv
+import hashlib
+import io
+
+import pandas as pd
+
+from monitor_cache import load_monitor_frame
+from monitor_loader import make_filters, read_monitor_csv
+from monitor_sources import CSVSource
+
+COLUMNS = ['timestamp', 'promptId', 'category', 'model', 'latencyMs', 'success', 'finishReason',
+           'promptTokens', 'completionTokens', 'totalTokens', 'responseLength', 'refusalContent', 'createdAt']
+
+
+class FakeS3:
+    """In-memory stand-in for the S3 calls the cache makes"""
+
+    def __init__(self):
+        self.objects = {}
+
+    def get_object(self, Bucket, Key, Range=None, IfNoneMatch=None, **_):
+        from botocore.exceptions import ClientError
+
+        data = self.objects[Key]
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        if IfNoneMatch == etag:
+            raise ClientError({'Error': {'Code': '304'}, 'ResponseMetadata': {'HTTPStatusCode': 304}}, 'GetObject')
+        if Range:
+            first, _, last = Range[len('bytes='):].partition('-')
+            if int(first) >= len(data):
+                raise ClientError({'Error': {'Code': 'InvalidRange'}, 'ResponseMetadata': {'HTTPStatusCode': 416}},
+                                  'GetObject')
+            data = data[int(first):int(last) + 1 if last else None]
+        return {'Body': io.BytesIO(data), 'ETag': etag, 'LastModified': None}
+
+
+def _cast(value):
+    """csv-stringify's default casts: booleans as 1 or empty, null as empty"""
+    if isinstance(value, bool):
+        return '1' if value else ''
+    return '' if value is None else str(value)
+
+
+def stringify(records):
+    """saveData's output: a header and every field quoted, empty ones included"""
+    out = io.StringIO()
+    writer = csv.writer(out, quoting=csv.QUOTE_ALL, lineterminator='\n')
+    writer.writerow(COLUMNS)
+    for record in records:
+        writer.writerow([_cast(record.get(col)) for col in COLUMNS])
+    return out.getvalue().encode('utf-8')
+
+
+def load_existing(data):
+    """loadExistingData's output: every record with string values"""
+    return list(csv.DictReader(io.StringIO(data.decode('utf-8'))))
+
+
+def batch(start, rows):
+    """Records as formatResult/formatError build them, with numbers, booleans and nulls"""
+    return [{
+        'timestamp': (pd.Timestamp('2025-06-01', tz='UTC') + pd.Timedelta(minutes=start + i))
+        .strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z',
+        'promptId': f'prompt-{i % 3}',
+        'category': 'general',
+        'model': 'gpt-4o-mini',
+        'latencyMs': 400 + 7 * (start + i),
+        'success': i % 5 != 0,
+        'finishReason': 'stop',
+        'promptTokens': 10 + i,
+        'completionTokens': 0,
+        'totalTokens': 10 + i,
+        'responseLength': 100 + i,
+        'refusalContent': '',
+        'createdAt': None,
+    } for i in range(rows)]
+
+
+def test_rewrite_keeps_earlier_bytes():
+    first = stringify(batch(0, 20))
+    second = stringify(load_existing(first) + batch(20, 10))
+
+    assert second.startswith(first)
+
+
+def test_appended_batch_is_ingested_from_the_tail(tmp_path, capsys):
+    s3 = FakeS3()
+    s3.objects['monitor.csv'] = stringify(batch(0, 200))
+    load_monitor_frame(s3, 'bucket', 'monitor.csv', cache_dir=str(tmp_path), max_workers=1)
+    capsys.readouterr()
+
+    s3.objects['monitor.csv'] = stringify(load_existing(s3.objects['monitor.csv']) + batch(200, 30))
+    df = load_monitor_frame(s3, 'bucket', 'monitor.csv', cache_dir=str(tmp_path), max_workers=1)
+
+    output = capsys.readouterr().out
+    assert '➕ Ingested' in output
+    assert 'reloading' not in output
+    expected = read_monitor_csv(io.BytesIO(s3.objects['monitor.csv']))
+    pd.testing.assert_frame_equal(df.reset_index(drop=True), expected.reset_index(drop=True))
+
+
+def test_local_csv_is_ingested_from_the_tail(tmp_path, capsys):
+    path = tmp_path / 'monitor.csv'
+    path.write_bytes(stringify(batch(0, 200)))
+    source = CSVSource(str(path), cache_dir=str(tmp_path / 'cache'))
+    source.load()
+    capsys.readouterr()
+
+    path.write_bytes(stringify(load_existing(path.read_bytes()) + batch(200, 30)))
+    filters = make_filters(since='2025-06-01T03:20:00Z')
+    df = source.load(filters=filters)
+
+    output = capsys.readouterr().out
+    assert '➕ Ingested' in output
+    assert 'reloading' not in output
+    with open(path, 'rb') as f:
+        expected = read_monitor_csv(f, filters=filters)
+    # Only the appended batch is inside the window; every fifth run in it failed
+    assert len(expected) == 24
+    pd.testing.assert_frame_equal(df.reset_index(drop=True), expected.reset_index(drop=True))
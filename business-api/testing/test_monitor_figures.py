@@ -0,0 +1,98 @@
+"""
+Figure files written by render_figure
+
+Paged figures are rendered with a few prompts per page, so a handful of
+synthetic prompts spread over several pages. Every run must leave exactly the
+files of its own pages behind, whatever an earlier run wrote.
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+import monitor_figures
+from monitor_figures import render_figure
+from monitor_sources import SyntheticSource
+from quantitative_eval_v2 import LLMPerformanceAnalyzer
+
+
+def _inputs(name, prompts=6):
+    source = SyntheticSource(600, prompts=[f'prompt-{i}' for i in range(prompts)],
+                             start=pd.Timestamp('2025-06-02', tz='UTC'), days=2)
+    analyzer = LLMPerformanceAnalyzer(source=source, headless=True)
+    assert analyzer.load_data_from_s3()
+    return analyzer.figure_inputs(name)
+
+
+def _render(name, inputs, output_dir, **options):
+    paths = render_figure(name, inputs, profile='draft', output_dir=str(output_dir), **options)
+    return sorted(os.path.basename(path) for path in paths)
+
+
+@pytest.fixture(autouse=True)
+def small_pages(monkeypatch):
+    import matplotlib
+
+    matplotlib.use('Agg')
+    # Two prompts per time-series page, three per comparison matrix page
+    monkeypatch.setattr(monitor_figures, 'PAGE_ROWS', 1)
+    monkeypatch.setattr(monitor_figures, 'MATRIX_ROWS_PER_PAGE', 3)
+
+
+def _page_names(stem, pages):
+    return [f'{stem}_page{n:03d}.png' for n in range(1, pages + 1)]
+
+
+@pytest.mark.parametrize('name,stem,pages', [('per_prompt_time_series', 'per_prompt_latency_time_series', 4),
+                                             ('prompt_comparison_matrix', 'prompt_comparison_matrix', 3)])
+def test_prompts_are_split_into_numbered_pages(tmp_path, name, stem, pages):
+    inputs = _inputs(name, prompts=7)
+
+    split = monitor_figures.figure_pages(name, inputs)
+    assert [page['page'] for page in split] == list(range(1, pages + 1))
+    assert all(page['pages'] == pages for page in split)
+    assert _render(name, inputs, tmp_path) == _page_names(stem, pages)
+    assert sorted(os.listdir(tmp_path)) == _page_names(stem, pages)
+
+
+def test_time_series_pages_hold_every_prompt_once():
+    inputs = _inputs('per_prompt_time_series', prompts=7)
+
+    split = monitor_figures.figure_pages('per_prompt_time_series', inputs)
+    assert [len(page['prompts']) for page in split] == [2, 2, 2, 1]
+    assert [prompt for page in split for prompt in page['prompts']] == list(inputs['prompts'])
+    # Every page keeps the grid of a full page, so the last one is not stretched
+    assert all(page['grid'] == (1, 2) for page in split)
+
+
+def test_shrinking_page_count_removes_stale_pages(tmp_path):
+    stem = 'per_prompt_latency_time_series'
+
+    assert _render('per_prompt_time_series', _inputs('per_prompt_time_series', prompts=7), tmp_path) == \
+        _page_names(stem, 4)
+    assert _render('per_prompt_time_series', _inputs('per_prompt_time_series', prompts=3), tmp_path) == \
+        _page_names(stem, 2)
+    assert sorted(os.listdir(tmp_path)) == _page_names(stem, 2)
+
+    # Down to one page, the figure is written under its usual name
+    assert _render('per_prompt_time_series', _inputs('per_prompt_time_series', prompts=2), tmp_path) == \
+        [f'{stem}.png']
+    assert os.listdir(tmp_path) == [f'{stem}.png']
+
+
+@pytest.mark.parametrize('cache', [False, True])
+def test_switching_page_format_removes_the_other_formats_files(tmp_path, cache):
+    inputs = _inputs('per_prompt_time_series')
+    options = dict(cache_dir=str(tmp_path / 'cache') if cache else None)
+    output_dir = tmp_path / 'out'
+    os.makedirs(output_dir)
+
+    pages = _page_names('per_prompt_latency_time_series', 3)
+    # Twice each way, so with a cache the second renders are copies restored from it
+    for _ in range(2):
+        assert _render('per_prompt_time_series', inputs, output_dir, page_format='png', **options) == pages
+        assert sorted(os.listdir(output_dir)) == pages
+        assert _render('per_prompt_time_series', inputs, output_dir, page_format='pdf', **options) == \
+            ['per_prompt_latency_time_series.pdf']
+        assert os.listdir(output_dir) == ['per_prompt_latency_time_series.pdf']
@@ -0,0 +1,57 @@
+"""
+Reports backed by daily rollups
+
+Once the completed days are rolled up, a report must read them from the store
+and load raw rows only for the current day: the summary, every figure's
+inputs, the trends and the exported tables included.
+"""
+
+import pandas as pd
+import pytest
+
+from monitor_figures import FIGURES
+from monitor_rollups import current_day, day_start
+from monitor_sources import SyntheticSource
+from quantitative_eval_v2 import LLMPerformanceAnalyzer
+
+
+class TodayOnlySource:
+    """Wraps a source and fails on any load that could return rows from before today"""
+
+    def __init__(self, source, today):
+        self.source = source
+        self.today = today
+
+    def __str__(self):
+        # The rollup store is keyed by the source's name
+        return str(self.source)
+
+    def load(self, filters=None, **kwargs):
+        since = (filters or {}).get('since')
+        assert since is not None and since >= self.today, f"raw rows loaded with filters {filters}"
+        df = self.source.load(filters=filters, **kwargs)
+        assert (df['timestamp'] >= self.today).all()
+        return df
+
+
+@pytest.mark.parametrize('backend', ['pandas', 'arrow'])
+def test_rollup_report_reads_only_todays_rows(backend, tmp_path, monkeypatch):
+    monkeypatch.setenv('MONITOR_CACHE_DIR', str(tmp_path / 'cache'))
+    today = day_start(current_day())
+    source = SyntheticSource(4000, start=today - pd.Timedelta(days=6), days=7)
+    options = dict(rollups=str(tmp_path / 'rollups'), backend=backend, headless=True, output_dir=str(tmp_path))
+
+    # The first run rolls up the six completed days
+    assert LLMPerformanceAnalyzer(source=source, **options).load_data_from_s3()
+
+    analyzer = LLMPerformanceAnalyzer(source=TodayOnlySource(source, today), **options)
+    assert analyzer.load_data_from_s3()
+    assert analyzer.from_rollups
+
+    analyzer.generate_summary_stats()
+    analyzer.analyze_trends(str(tmp_path))
+    for name in FIGURES:
+        analyzer.figure_inputs(name)
+    analyzer.export_tables(str(tmp_path))
+
+    assert analyzer.row_count == len(source.load())
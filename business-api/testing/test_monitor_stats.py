@@ -0,0 +1,176 @@
+"""
+Aggregates every chart and summary is drawn from
+
+Each check compares a monitor_stats table with a plain pandas or numpy
+computation on the raw rows of the same synthetic data.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from monitor_stats import (CUBE_KEYS, CUBE_METRICS, SKETCH_KEYS, SKETCH_RELATIVE_ACCURACY, add_calendar_features,
+                           boxplot_stats, build_cube, build_sketches, load_sketches, merge_sketches, minmax_downsample,
+                           pivot, rollup, save_sketches, sketch_boxplot_stats, sketch_quantiles)
+from monitor_synth import generate_sample_data
+
+
+@pytest.fixture(scope='module')
+def rows():
+    df = generate_sample_data(20_000, start=pd.Timestamp('2025-06-02', tz='UTC'), days=14)
+    return add_calendar_features(df[df['success']], 'Europe/Berlin')
+
+
+def test_cube_matches_groupby(rows):
+    cube = build_cube(rows).set_index(CUBE_KEYS).sort_index()
+    expected = rows.groupby(CUBE_KEYS, observed=True)[CUBE_METRICS].agg(['count', 'sum', 'min', 'max'])
+
+    assert len(cube) == len(expected)
+    for m in CUBE_METRICS:
+        for stat in ('count', 'sum', 'min', 'max'):
+            np.testing.assert_allclose(cube[f'{m}_{stat}'], expected[(m, stat)].astype('float64'), rtol=1e-9)
+        sumsq = (rows[m].astype('float64') ** 2).groupby([rows[k] for k in CUBE_KEYS], observed=True).sum()
+        np.testing.assert_allclose(cube[f'{m}_sumsq'], sumsq, rtol=1e-9)
+
+
+@pytest.mark.parametrize('by', [['promptId'], ['hour'], ['day_of_week_num', 'hour'], ['promptId', 'model']])
+def test_rollup_matches_groupby(rows, by):
+    result = rollup(build_cube(rows), by).sort_index()
+    expected = rows.groupby(by, observed=True)[CUBE_METRICS].agg(['count', 'mean', 'std', 'min', 'max'])
+
+    for m in CUBE_METRICS:
+        for stat in ('count', 'mean', 'std', 'min', 'max'):
+            np.testing.assert_allclose(result[f'{m}_{stat}'], expected[(m, stat)].astype('float64'), rtol=1e-9)
+        np.testing.assert_allclose(result[f'{m}_cv'], expected[(m, 'std')] / expected[(m, 'mean')], rtol=1e-9)
+
+
+def test_overall_rollup_and_pivot(rows):
+    cube = build_cube(rows)
+
+    overall = rollup(cube, []).iloc[0]
+    assert overall['latencyMs_count'] == len(rows)
+    assert overall['latencyMs_mean'] == pytest.approx(rows['latencyMs'].mean(), rel=1e-12)
+    assert overall['latencyMs_std'] == pytest.approx(rows['latencyMs'].std(), rel=1e-9)
+
+    matrix = pivot(cube, 'promptId', 'model', 'latencyMs_mean')
+    expected = rows.pivot_table(index='promptId', columns='model', values='latencyMs', aggfunc='mean', observed=True)
+    pd.testing.assert_frame_equal(matrix, expected, check_names=False, check_index_type=False,
+                                  check_column_type=False, check_categorical=False)
+
+
+def _rank_values(values, quantiles):
+    """The values a sketch estimates: the element at rank floor(q * (n - 1)) of the sorted data"""
+    values = np.sort(np.asarray(values, dtype='float64'))
+    return np.array([values[int(np.floor(q * (len(values) - 1)))] for q in quantiles])
+
+
+QUANTILES = (0.01, 0.25, 0.5, 0.9, 0.95, 0.99, 1.0)
+
+
+def test_sketch_quantiles_are_within_relative_accuracy(rows):
+    sketches = build_sketches(rows)
+
+    overall = sketch_quantiles(sketches, [], quantiles=QUANTILES).iloc[0]
+    estimates = overall[[f'p{q * 100:g}' for q in QUANTILES]].to_numpy(dtype='float64')
+    exact = _rank_values(rows['latencyMs'], QUANTILES)
+    assert np.all(np.abs(estimates - exact) <= SKETCH_RELATIVE_ACCURACY * exact * (1 + 1e-9))
+    assert overall['count'] == len(rows)
+
+    per_prompt = sketch_quantiles(sketches, ['promptId'], quantiles=QUANTILES)
+    for prompt_id, group in rows.groupby('promptId', observed=True)['latencyMs']:
+        estimates = per_prompt.loc[prompt_id, [f'p{q * 100:g}' for q in QUANTILES]].to_numpy(dtype='float64')
+        exact = _rank_values(group, QUANTILES)
+        assert np.all(np.abs(estimates - exact) <= SKETCH_RELATIVE_ACCURACY * exact * (1 + 1e-9))
+
+
+def _sorted_table(sketches, by):
+    return sketches.sort_values(by + ['bucket']).reset_index(drop=True)
+
+
+def test_merging_sketches_is_associative(rows):
+    by = ['promptId', 'model']
+    parts = [build_sketches(rows.iloc[part]) for part in np.array_split(np.arange(len(rows)), 3)]
+
+    left = merge_sketches(pd.concat([merge_sketches(pd.concat(parts[:2]), by), parts[2]]), by)
+    right = merge_sketches(pd.concat([parts[0], merge_sketches(pd.concat(parts[1:]), by)]), by)
+    whole = merge_sketches(build_sketches(rows), by)
+
+    pd.testing.assert_frame_equal(_sorted_table(left, by), _sorted_table(right, by))
+    pd.testing.assert_frame_equal(_sorted_table(left, by), _sorted_table(whole, by))
+
+
+def test_sketches_round_trip_through_parquet(rows, tmp_path):
+    sketches = build_sketches(rows)
+    path = str(tmp_path / 'latency_sketches.parquet')
+    save_sketches(sketches, path)
+    loaded = load_sketches(path)
+
+    pd.testing.assert_frame_equal(loaded[SKETCH_KEYS + ['bucket', 'count']], sketches, check_categorical=False)
+    pd.testing.assert_frame_equal(sketch_quantiles(loaded, ['model']), sketch_quantiles(sketches, ['model']),
+                                  check_categorical=False)
+
+
+@pytest.mark.parametrize('by,value', [('hour', 'latencyMs'), ('model', 'latencyMs'), ('model', 'responseLength')])
+def test_boxplot_stats_match_matplotlib(rows, by, value):
+    from matplotlib import cbook
+
+    stats = boxplot_stats(rows, by, value, max_fliers=len(rows))
+    groups = sorted(rows[by].unique())
+    expected = cbook.boxplot_stats([rows.loc[rows[by] == group, value].to_numpy(dtype='float64') for group in groups])
+
+    assert [s['group'] for s in stats] == groups
+    for ours, theirs in zip(stats, expected):
+        for key in ('mean', 'med', 'q1', 'q3', 'iqr', 'whislo', 'whishi'):
+            assert ours[key] == pytest.approx(theirs[key], rel=1e-12), key
+        np.testing.assert_array_equal(np.sort(ours['fliers']), np.sort(theirs['fliers']))
+
+
+def test_boxplot_fliers_are_capped_keeping_the_extremes():
+    values = np.r_[np.linspace(100, 200, 5000), np.linspace(1000, 5000, 300), [0.5]]
+    df = pd.DataFrame({'group': 'a', 'value': values})
+
+    fliers = boxplot_stats(df, 'group', 'value', max_fliers=50)[0]['fliers']
+
+    assert len(fliers) == 50
+    assert fliers.min() == 0.5
+    assert fliers.max() == 5000
+
+
+def test_sketch_boxplot_stats_are_within_relative_accuracy(rows):
+    means = rollup(build_cube(rows), ['hour'])['latencyMs_mean']
+    stats = sketch_boxplot_stats(build_sketches(rows), 'hour', means)
+
+    assert [s['group'] for s in stats] == sorted(rows['hour'].unique())
+    for box in stats:
+        values = rows.loc[rows['hour'] == box['group'], 'latencyMs']
+        assert box['mean'] == pytest.approx(values.mean(), rel=1e-9)
+        exact = _rank_values(values, (0.25, 0.5, 0.75))
+        estimates = np.array([box['q1'], box['med'], box['q3']])
+        assert np.all(np.abs(estimates - exact) <= SKETCH_RELATIVE_ACCURACY * exact * (1 + 1e-9))
+        assert values.min() * (1 - SKETCH_RELATIVE_ACCURACY) <= box['whislo'] <= box['q1']
+        assert box['q3'] <= box['whishi'] <= values.max() * (1 + SKETCH_RELATIVE_ACCURACY)
+
+
+def test_minmax_downsample_keeps_each_buckets_extremes():
+    rng = np.random.default_rng(7)
+    x = np.sort(rng.uniform(0, 1_000, 50_000))
+    y = rng.lognormal(7, 0.4, len(x))
+    y[rng.integers(0, len(x), 30)] *= 20
+
+    keep = minmax_downsample(x, y, max_points=400)
+
+    assert len(keep) <= 400
+    assert np.all(np.diff(keep) > 0)
+    assert keep[0] == 0 and keep[-1] == len(x) - 1
+    # The function splits the x range into max_points / 4 equal-width buckets
+    bucket = np.minimum(((x - x[0]) / (x[-1] - x[0]) * 100).astype(int), 99)
+    kept = np.zeros(len(x), dtype=bool)
+    kept[keep] = True
+    for b in range(100):
+        in_bucket = np.flatnonzero(bucket == b)
+        assert kept[in_bucket[np.argmin(y[in_bucket])]]
+        assert kept[in_bucket[np.argmax(y[in_bucket])]]
+
+
+def test_minmax_downsample_leaves_short_lines_alone():
+    np.testing.assert_array_equal(minmax_downsample(np.arange(10), np.arange(10), max_points=10), np.arange(10))
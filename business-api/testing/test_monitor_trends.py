@@ -0,0 +1,39 @@
+"""
+Change-point detection on seasonal latency series
+
+monitor_synth gives latency an hour-of-day and a day-of-week pattern (slow
+Mondays, lunch and evening peaks) on top of lognormal noise, with no level
+shifts, so every change point it reports on that data is a false positive.
+"""
+
+import pandas as pd
+import pytest
+
+from monitor_synth import generate_sample_data
+from monitor_trends import detect_change_points
+
+START = pd.Timestamp('2025-06-02', tz='UTC')
+
+
+def seasonal_series(days, runs_per_hour=8):
+    """One prompt/model series with only the synthetic daily and weekly cycles"""
+    return generate_sample_data(days * 24 * runs_per_hour, prompts=['medical-qa'], models=['gpt-4o-mini'],
+                                start=START, days=days)
+
+
+@pytest.mark.parametrize('days', [5, 28])
+def test_seasonal_series_has_no_change_points(days):
+    assert detect_change_points(seasonal_series(days)).empty
+
+
+def test_level_shift_on_a_seasonal_series_is_found():
+    df = seasonal_series(28)
+    at = START + pd.Timedelta(days=17, hours=5)
+    df.loc[df['timestamp'] >= at, 'latencyMs'] *= 1.3
+
+    changes = detect_change_points(df)
+
+    assert len(changes) == 1
+    # Hourly cells of eight noisy runs place the split within a few hours
+    assert abs(changes['at'].iloc[0] - at) <= pd.Timedelta(hours=3)
+    assert 20 < changes['shift_pct'].iloc[0] < 40